@@ -0,0 +1,71 @@
+"""
+Multi-document batched prompts
+
+With descriptions on, the 17-tag TAG_DESCRIPTIONS block is often longer than
+a VAERS note, and it was re-sent (and re-prefilled) for every document.
+Here several short documents — or windows of long ones, see chunking.py —
+are packed into one prompt under a token budget, each wrapped in
+<doc id="D3">...</doc>, and the model is asked to tag every keyword with its
+document ID. The returned annotations are split back per document.
+
+    batches = pack_batches(texts, tag_names, tag_descriptions, max_tokens=1500)
+    prompt = build_batch_prompt([(doc_id, text[s:e]) ...], tag_names, tag_descriptions)
+    per_id = split_batch_results(parse_annotations(content), ids)
+
+OllamaClient.annotate_batched runs the whole thing concurrently.
+"""
+
+import re
+
+from chunking import estimate_tokens, make_windows
+from prompt_templates import get_template
+
+DOC_BLOCK = re.compile(r'<doc id="([^"]+)">\n(.*?)\n</doc>', re.DOTALL)
+
+def build_batch_prompt(docs, tag_names, tag_descriptions=None):
+    """[(doc_id, text), ...] → one prompt; same rules as build_prompt plus the doc ID"""
+    return get_template(tag_names, tag_descriptions).render_batch(docs)
+
+def split_batch_prompt(prompt):
+    """[(doc_id, text), ...] back out of a batch prompt (used by the mock server)"""
+    return DOC_BLOCK.findall(prompt.split('Documents:\n', 1)[-1])
+
+def pack_batches(texts, tag_names, tag_descriptions=None, max_tokens=1500, doc_tokens=500,
+                 overlap_tokens=64, max_docs=8):
+    """greedy packing → [[(doc_index, (start, end)), ...], ...]
+
+    Every document is first cut into windows of at most `doc_tokens`,
+    then windows are added to the current batch while the prompt stays under
+    `max_tokens` and has at most `max_docs` parts. The fixed cost (rules +
+    descriptions) is counted once per batch, which is the whole point.
+    """
+    overhead = estimate_tokens(build_batch_prompt([], tag_names, tag_descriptions))
+    per_part = estimate_tokens(build_batch_prompt([('D00', '')], tag_names, tag_descriptions)) - overhead
+    batches, cur, cur_tokens = [], [], overhead
+    for i, text in enumerate(texts):
+        for win in make_windows(text, doc_tokens, overlap_tokens):
+            need = per_part + estimate_tokens(text[win[0]:win[1]])
+            if cur and (cur_tokens + need > max_tokens or len(cur) >= max_docs):
+                batches.append(cur)
+                cur, cur_tokens = [], overhead
+            cur.append((i, win))
+            cur_tokens += need
+    if cur:
+        batches.append(cur)
+    return batches
+
+def split_batch_results(anns, doc_ids):
+    """[{'doc', 'keyword', 'tag'}, ...] → {doc_id: [{'keyword', 'tag'}, ...]}
+
+    An annotation with a missing or unknown doc ID is kept only if the
+    batch has a single document, otherwise it can't be placed and is dropped.
+    """
+    out = {doc_id: [] for doc_id in doc_ids}
+    for ann in anns:
+        doc_id = str(ann.get('doc', '')).strip()
+        if doc_id not in out:
+            if len(doc_ids) != 1:
+                continue
+            doc_id = doc_ids[0]
+        out[doc_id].append({'keyword': ann['keyword'], 'tag': ann['tag']})
+    return out
@@ -0,0 +1,102 @@
+"""
+Benchmark: one document per call vs. multi-document batched prompts
+Dataset: VAERS_20_NOTES (or any folder of MedTator XMLs)
+
+Both modes see the same windows (CHUNK_TOKENS) and the same tag descriptions;
+the batched mode packs windows into prompts of up to --batch-tokens.
+Reported per mode: wall time, docs/s, requests, prompt tokens sent (chars/4)
+and P/R/F1 (span overlap, same tag, gold positive only, no negation filter).
+The response cache is off so every run hits the server.
+
+    python bench_batching.py                         # live Ollama
+    python bench_batching.py --mock --latency 1.0 --prefill 0.002
+"""
+
+import argparse, os, time
+
+from ollama_client import OllamaClient, OLLAMA_URL, build_prompt
+from batching import build_batch_prompt, pack_batches
+from chunking import estimate_tokens, make_windows
+from mock_ollama import MockOllama
+from localizer import dedupe_spans, locate_all
+from gold import load_corpus
+from prompt_templates import SCHEMA_FILE, load_tag_descriptions, load_tag_names
+
+MODEL        = "qwen3:8b"
+CHUNK_TOKENS = 500
+XML_DIR      = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sample', 'VAERS_20_NOTES', 'ann_xml')
+TAG_NAMES    = load_tag_names(SCHEMA_FILE)   # schema order, same as the gold XML
+TAG_DESCRIPTIONS = load_tag_descriptions(SCHEMA_FILE)   # from the schema, the vocabulary where it has none
+
+# ── Gold + scoring ──────────────────────────────────────────────────────
+def localize(llm_anns, text):
+    return dedupe_spans(locate_all(llm_anns, text, TAG_NAMES))
+
+def score(results, docs):
+    tp = fp = fn = 0
+    for llm_anns, doc in zip(results, docs):
+        t, f, n = doc.index().score(localize(llm_anns, doc.text))
+        tp += t; fp += f; fn += n
+    p = tp / (tp + fp) if tp + fp else 0.0
+    r = tp / (tp + fn) if tp + fn else 0.0
+    return p, r, (2 * p * r / (p + r) if p + r else 0.0)
+
+# ── Run ─────────────────────────────────────────────────────────────────
+def prompt_cost(texts, desc, batch_tokens):
+    """(requests, prompt tokens) for both modes"""
+    single = [build_prompt(t[s:e], TAG_NAMES, desc, max_chars=None)
+              for t in texts for s, e in make_windows(t, CHUNK_TOKENS)]
+    batched = [build_batch_prompt([(f"D{k + 1}", texts[i][s:e]) for k, (i, (s, e)) in enumerate(b)],
+                                  TAG_NAMES, desc)
+               for b in pack_batches(texts, TAG_NAMES, desc, batch_tokens, CHUNK_TOKENS)]
+    return ((len(single), sum(map(estimate_tokens, single))),
+            (len(batched), sum(map(estimate_tokens, batched))))
+
+def run(url, args):
+    docs = list(load_corpus(args.xml_dir, args.n_files).values())
+    texts = [doc.text for doc in docs]
+    desc = None if args.no_desc else TAG_DESCRIPTIONS
+    cost = prompt_cost(texts, desc, args.batch_tokens)
+    print(f"{len(texts)} docs, desc={'OFF' if args.no_desc else 'ON'}, model={args.model}, url={url}\n")
+
+    rows = []
+    with OllamaClient(url, concurrency=args.concurrency, timeout=600) as client:
+        for label, fn, (n_req, n_tok) in [
+            ('one doc / call', lambda: client.annotate_chunked(
+                args.model, texts, TAG_NAMES, desc, max_tokens=CHUNK_TOKENS), cost[0]),
+            (f'batched <= {args.batch_tokens} tok', lambda: client.annotate_batched(
+                args.model, texts, TAG_NAMES, desc, max_tokens=args.batch_tokens,
+                doc_tokens=CHUNK_TOKENS), cost[1]),
+        ]:
+            t0 = time.time()
+            results = fn()
+            elapsed = time.time() - t0
+            client.print_metrics()
+            client.metrics.clear()
+            rows.append((label, elapsed, n_req, n_tok) + score(results, docs))
+
+    print(f"\n{'Mode':<24} {'time':>7} {'docs/s':>7} {'reqs':>5} {'prompt tok':>11} {'P':>6} {'R':>6} {'F1':>6}")
+    print("-" * 78)
+    for label, elapsed, n_req, n_tok, p, r, f in rows:
+        print(f"{label:<24} {elapsed:>6.1f}s {len(texts) / elapsed:>7.2f} {n_req:>5} {n_tok:>11} "
+              f"{p:>6.3f} {r:>6.3f} {f:>6.3f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batched vs. single-document prompts')
+    parser.add_argument('--url', default=OLLAMA_URL)
+    parser.add_argument('--model', default=MODEL)
+    parser.add_argument('--xml-dir', default=XML_DIR)
+    parser.add_argument('--n-files', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=4, help='match OLLAMA_NUM_PARALLEL')
+    parser.add_argument('--batch-tokens', type=int, default=1500, help='prompt budget of a batch')
+    parser.add_argument('--no-desc', action='store_true', help='leave out TAG_DESCRIPTIONS')
+    parser.add_argument('--mock', action='store_true', help='run against an in-process mock server')
+    parser.add_argument('--latency', type=float, default=1.0, help='mock: seconds per request')
+    parser.add_argument('--prefill', type=float, default=0.002, help='mock: seconds per prompt token')
+    args = parser.parse_args()
+
+    if args.mock:
+        with MockOllama(port=0, latency=args.latency, prefill=args.prefill, slots=args.concurrency) as mock:
+            run(mock.url, args)
+    else:
+        run(args.url, args)
@@ -0,0 +1,101 @@
+"""
+Overlapping-window chunking for long documents
+
+The prompt used to carry only text[:2000], so every concept past that point
+was lost. Instead, a document is split on sentence boundaries into windows
+under a token budget, with a few sentences of overlap so a concept on a
+window edge is seen whole at least once. The windows of all documents are
+sent concurrently (OllamaClient.annotate_chunked), and the keyword/tag
+results of each document are merged back and deduplicated before
+localisation.
+
+    windows = make_windows(text, max_tokens=500, overlap_tokens=64)
+    anns = merge_window_results(windows, [client.complete_json(...) for w in windows])
+
+Tokens are estimated as chars / 4, close enough for English clinical text.
+"""
+
+import re
+
+CHARS_PER_TOKEN = 4
+
+# end of sentence: .!? (plus closing quotes/brackets) followed by space, or a blank line
+SENT_END = re.compile(r'[.!?]+["\')\]]*\s+|\n\s*\n\s*')
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def split_sentences(text):
+    """[(start, end), ...] covering the whole text, trailing whitespace kept"""
+    spans, start = [], 0
+    for m in SENT_END.finditer(text):
+        spans.append((start, m.end()))
+        start = m.end()
+    if start < len(text):
+        spans.append((start, len(text)))
+    return spans
+
+def _hard_split(text, start, end, max_chars):
+    """a sentence longer than the budget → pieces cut at whitespace"""
+    pieces = []
+    while end - start > max_chars:
+        cut = text.rfind(' ', start + 1, start + max_chars)
+        if cut <= start:
+            cut = start + max_chars
+        pieces.append((start, cut))
+        start = cut
+    pieces.append((start, end))
+    return pieces
+
+def make_windows(text, max_tokens=500, overlap_tokens=64):
+    """[(start, end), ...] of overlapping windows aligned to sentence boundaries"""
+    if not text:
+        return []
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return [(0, len(text))]
+
+    sents = []
+    for s, e in split_sentences(text):
+        sents.extend(_hard_split(text, s, e, max_chars) if e - s > max_chars else [(s, e)])
+
+    windows, i, n = [], 0, len(sents)
+    while i < n:
+        # grow the window sentence by sentence, at least one
+        j = i + 1
+        while j < n and sents[j][1] - sents[i][0] <= max_chars:
+            j += 1
+        windows.append((sents[i][0], sents[j - 1][1]))
+        if j == n:
+            break
+        # step back over the last sentences that fit into the overlap,
+        # as long as the next window still has room for sentence j
+        k = j
+        while k - 1 > i and sents[j - 1][1] - sents[k - 1][0] <= overlap_chars \
+                and sents[j][1] - sents[k - 1][0] <= max_chars:
+            k -= 1
+        i = k
+    return windows
+
+def _norm_keyword(keyword):
+    return ' '.join(keyword.lower().split())
+
+def merge_window_results(windows, results):
+    """per-window [{'keyword', 'tag'}] → one deduplicated list for the document
+
+    Each merged item keeps the offsets of the windows it came from in 'windows',
+    so a hit can be traced back to the part of the text the LLM saw.
+    """
+    merged, seen = [], {}
+    for win, anns in zip(windows, results):
+        for ann in anns or []:
+            key = (_norm_keyword(ann['keyword']), ann['tag'])
+            if key in seen:
+                if win not in seen[key]['windows']:
+                    seen[key]['windows'].append(win)
+                continue
+            item = {'keyword': ann['keyword'], 'tag': ann['tag'], 'windows': [win]}
+            seen[key] = item
+            merged.append(item)
+    return merged
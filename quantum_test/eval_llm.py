@@ -9,259 +9,242 @@ Conditions (2x2):
   C: desc=OFF  neg=ON
   D: desc=ON   neg=ON
 
-LLM outputs are cached per (file, use_descriptions) so that
-neg=OFF vs neg=ON share the exact same LLM predictions — clean ablation.
+The grid (grid.py) runs one LLM job per (model, desc) and scores every
+post-processing cell from it, so neg=OFF vs neg=ON share the exact same LLM
+predictions — clean ablation. LLM jobs run concurrently and every finished
+job / cell is checkpointed under RUN_DIR, an interrupted run resumes.
+Documents are split into overlapping windows (no more text[:2000] cut) and
+all windows are sent concurrently through the shared OllamaClient.
+
+The lexicon annotator (lexicon.py) runs as one more model, LEXICON_MODEL,
+the no-LLM baseline; it ignores the prompt, so the grid runs it once, at the
+first prompt variant. With LEXICON_PREFILTER the notes it covers on its own
+skip the LLM in the other models' jobs too.
+
+With SENTENCE_MODE the notes go to the LLM sentence by sentence, only the
+sentences not seen before (sentence_cache.py), so boilerplate repeated
+across notes is annotated once. A 'triage' axis in PROMPT_GRID (thresholds,
+0 = off) also drops the sentences TRIAGE_SCORER finds irrelevant
+(triage.py), and the summary shows the recall against the tokens saved;
+with the axis every cell runs in sentence mode, so triage=0 is the baseline
+the others are compared with.
+
+FUZZY_LOCALIZE (or a 'fuzzy' axis in POST_GRID) locates the keywords that
+aren't in the note verbatim with the fuzzy fallback of localizer.py; with
+the axis, the summary shows the recall it recovers and the time it adds.
 """
 
-import os, re, json, glob, requests
-from xml.etree import ElementTree as ET
+import os, time
+
+from ollama_client import OllamaClient
+from llm_cache import LLMCache
+from sentence_cache import SentenceCache
+from localizer import dedupe_spans, locate_all
+from negation import is_negated
+from gold import load_corpus
+from lexicon import LEXICON_MODEL, Lexicon
+from triage import EMBED_MODEL, EmbeddingTriage, LexiconTriage
+from grid import Grid, GridRunner, cell_key
+from stage_metrics import StageLog
+from prompt_templates import SCHEMA_FILE, get_template, load_tag_descriptions, load_tag_names
 
 # ── Config ──────────────────────────────────────────────────────────────
 OLLAMA_URL   = "http://localhost:11434"
-MODELS       = ["qwen3:8b"]
+MODELS       = ["qwen3:8b", LEXICON_MODEL]   # LEXICON_MODEL: dictionary baseline, no LLM
+CONCURRENCY  = 4   # match OLLAMA_NUM_PARALLEL
+CHUNK_TOKENS = 500 # window budget, long notes are split into overlapping windows
+RETRIES      = 1   # extra tries after a broken reply (of a batch, only its unfinished parts)
+BATCH_TOKENS = 0   # > 0: pack several notes into one prompt of this budget (batching.py)
+SENTENCE_MODE = False    # per unique sentence, batched and cached by hash (sentence_cache.py)
+DEDUPE_POLICY = 'first'  # overlapping spans of one tag: first | longest | merge (localizer.dedupe_spans)
+MATCH_MODE   = 'overlap' # pred ↔ gold: exact | overlap | iou (scoring.GoldIndex)
+IOU_THRESHOLD = 0.5      # MATCH_MODE = 'iou' only
+FUZZY_LOCALIZE = False   # keywords not in the text verbatim: approximate match (localizer.fuzzy_locate)
+LEXICON_PREFILTER = False  # notes the lexicon covers (Lexicon.covers) take its annotations, no LLM call
 XML_DIR      = r"C:\Users\del\Desktop\Work\MedTator\sample\VAERS_20_NOTES\ann_xml"
-TAG_NAMES    = [
-    "Vaccine","Fever","Pain","Headache","Myalgia","Fatigue",
-    "Nasal_obstruction","Diarrhea","Nausea","Vomiting",
-    "Sore_throat","Dyspnea","Cough","Chill","Delirium","Hypersomnia","Other"
-]
-TAG_DESCRIPTIONS = {
-    "Vaccine":           "COVID-19 vaccine name or identifier (e.g., BNT162b2, Pfizer-BioNTech, Moderna, mRNA-1273, Janssen, J&J, AstraZeneca, vaccine dose)",
-    "Fever":             "fever, high temperature, pyrexia, febrile, temperature elevation",
-    "Pain":              "pain, painful, ache, sore, soreness, discomfort, hurts, tenderness",
-    "Headache":          "headache, head pain, migraine, cephalalgia",
-    "Myalgia":           "muscle pain, myalgia, muscle soreness, muscle ache, body aches, swollen, swelling, inflammation, stiffness",
-    "Fatigue":           "fatigue, tired, tiredness, exhaustion, weakness, lethargy, malaise, low energy",
-    "Nasal_obstruction": "nasal obstruction, stuffy nose, nasal congestion, blocked nose, runny nose, rhinorrhea",
-    "Diarrhea":          "diarrhea, loose stool, loose bowel movements, watery stool",
-    "Nausea":            "nausea, nauseated, stomach upset, queasy, feel sick",
-    "Vomiting":          "vomiting, vomited, threw up, emesis, retching",
-    "Sore_throat":       "sore throat, throat pain, pharyngitis, throat irritation, scratchy throat",
-    "Dyspnea":           "dyspnea, shortness of breath, difficulty breathing, breathlessness, SOB, can't breathe",
-    "Cough":             "cough, coughing, dry cough, productive cough, hacking cough",
-    "Chill":             "chills, rigors, shivering, cold sensation, feeling cold",
-    "Delirium":          "delirium, confusion, disorientation, altered mental status, cognitive impairment, hallucination",
-    "Hypersomnia":       "hypersomnia, excessive sleepiness, drowsiness, somnolence, oversleeping, hard to stay awake",
-    "Other":             "any other adverse event or medical concept not covered by the above tags",
-}
-NEGATION_PRE = re.compile(
-    r'\b(denies?|no |not |doesn\'t have|did not have|without|negative for|no evidence of|absent)\b',
-    re.IGNORECASE
-)
-NEGATION_POST = re.compile(
-    r'\b(absent|not found|not present|none|: none|negative)\b',
-    re.IGNORECASE
-)
-SCOPE_BREAKERS = re.compile(r'[.!?]|\b(but|however|although|except|yet|while)\b', re.IGNORECASE)
-
-# ── Parse gold standard XML ──────────────────────────────────────────────
-def parse_gold(xml_path):
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
-    text_el = root.find('TEXT')
-    text = text_el.text if text_el is not None and text_el.text else ''
-    tags = []
-    for el in root.find('TAGS') or []:
-        spans_str = el.get('spans', '')
-        certainty = el.get('certainty', 'positive').lower()
-        m = re.match(r'(\d+)~(\d+)', spans_str)
-        if m:
-            tags.append({
-                'tag': el.tag,
-                'start': int(m.group(1)),
-                'end': int(m.group(2)),
-                'certainty': certainty,
-            })
-    return text, tags
-
-# ── LLM call ────────────────────────────────────────────────────────────
-def call_llm(model, text, tag_names, use_descriptions):
-    tag_list = ', '.join(tag_names)
-    if use_descriptions:
-        desc_block = 'Tag definitions:\n' + '\n'.join(f'  - {t}: {TAG_DESCRIPTIONS[t]}' for t in tag_names) + '\n\n'
-    else:
-        desc_block = ''
-    prompt = f"""You are a clinical text annotation assistant.
-Identify medical concepts in the following text and classify them using ONLY these exact tag names: {tag_list}
-
-{desc_block}Return JSON only, no explanation. Format:
-{{"annotations": [{{"keyword": "core clinical term", "tag": "TagName"}}]}}
-
-Rules:
-- ONLY use these exact tag names: {tag_list}
-- keyword must be the shortest core clinical term (1-3 words), NOT a full sentence or clause
-- keyword must appear verbatim in the text (exact spelling, case-insensitive)
-- Do NOT include IDs, offsets, or extra fields
-
-Text:
-{text[:2000]}"""
-
-    try:
-        resp = requests.post(
-            f"{OLLAMA_URL}/api/chat",
-            json={"model": model, "messages": [{"role": "user", "content": prompt}],
-                  "stream": False, "format": "json", "options": {"temperature": 0}},
-            timeout=180
-        )
-        resp.raise_for_status()
-        content = resp.json()["message"]["content"]
-        content = re.sub(r'```json\s*|\s*```', '', content).strip()
-        if not content.startswith('{'):
-            m = re.search(r'\{[\s\S]*\}', content)
-            content = m.group(0) if m else '{}'
-        data = json.loads(content)
-        anns = data.get('annotations') or data.get('results') or []
-        return [a for a in anns if isinstance(a.get('keyword'), str) and isinstance(a.get('tag'), str)]
-    except Exception as e:
-        print(f"  [LLM error] {e}")
-        return []
-
-# ── Regex span localization ──────────────────────────────────────────────
-def get_locs(keyword, text):
-    escaped = re.escape(keyword)
-    pattern = escaped.replace(r'\ ', r'\s+')
-    return [(m.start(), m.end()) for m in re.finditer(pattern, text, re.IGNORECASE)]
-
-# ── Negation filter ──────────────────────────────────────────────────────
-def is_negated(start, end, text):
-    pre_text = text[max(0, start - 60):start]
-    breakers = list(SCOPE_BREAKERS.finditer(pre_text))
-    if breakers:
-        pre_text = pre_text[breakers[-1].end():]
-    if NEGATION_PRE.search(pre_text):
-        return True
-    post_text = text[end:end + 30]
-    breakers = list(SCOPE_BREAKERS.finditer(post_text))
-    if breakers:
-        post_text = post_text[:breakers[0].start()]
-    return bool(NEGATION_POST.search(post_text))
-
-# ── Span overlap matching ────────────────────────────────────────────────
-def spans_overlap(a_start, a_end, b_start, b_end):
-    return a_start < b_end and b_start < a_end
-
-def match_predictions(predicted, gold_positive):
-    matched_gold = set()
-    tp = 0
-    for pred in predicted:
-        for i, g in enumerate(gold_positive):
-            if i in matched_gold:
-                continue
-            if pred['tag'] == g['tag'] and spans_overlap(pred['start'], pred['end'], g['start'], g['end']):
-                tp += 1
-                matched_gold.add(i)
-                break
-    fp = len(predicted) - tp
-    fn = len(gold_positive) - tp
-    return tp, fp, fn
-
+TAG_NAMES    = load_tag_names(SCHEMA_FILE)   # schema order, same as the gold XML
+TAG_DESCRIPTIONS = load_tag_descriptions(SCHEMA_FILE)   # from the schema, the vocabulary where it has none
+PROMPT_GRID  = {'desc': [False, True]}     # LLM-dependent axes ('triage': [0, 0.3, 0.5] too), one LLM job per model × value
+TRIAGE_SCORER = 'lexicon'  # sentence triage: lexicon | embedding (EMBED_MODEL on the server)
+POST_GRID    = {'neg': [False, True]}      # post-processing axes ('dedupe', 'match', 'fuzzy' too), share the LLM job
+GRID_WORKERS = 2   # LLM jobs in flight at once
+STAGE_LOG    = "stages_llm.jsonl"   # per-document stage timings (llm, localize), appended
+RUN_DIR      = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.grid_runs', 'eval_llm')   # checkpoints, delete to start over
+
+# ── Scoring ──────────────────────────────────────────────────────────────
 def prf(tp, fp, fn):
     p = tp / (tp + fp) if (tp + fp) > 0 else 0.0
     r = tp / (tp + fn) if (tp + fn) > 0 else 0.0
     f = 2 * p * r / (p + r) if (p + r) > 0 else 0.0
     return p, r, f
 
-# ── Localize + dedup (shared post-processing) ───────────────────────────
-def localize(llm_anns, text):
-    """keyword→tag pairs → deduplicated span predictions"""
-    raw = []
-    for ann in llm_anns:
-        if ann['tag'] not in TAG_NAMES:
-            continue
-        for start, end in get_locs(ann['keyword'], text):
-            raw.append({'tag': ann['tag'], 'start': start, 'end': end})
-    raw.sort(key=lambda x: x['start'])
-    deduped = []
-    for pred in raw:
-        if any(pred['tag'] == k['tag'] and spans_overlap(pred['start'], pred['end'], k['start'], k['end'])
-               for k in deduped):
-            continue
-        deduped.append(pred)
-    return deduped
-
-# ── Main evaluation ──────────────────────────────────────────────────────
-def evaluate(model, use_descriptions, use_negation_filter, llm_cache):
-    xml_files = sorted(glob.glob(os.path.join(XML_DIR, '*.xml')))
+# ── Grid jobs ────────────────────────────────────────────────────────────
+def run_llm(model, prompt):
+    """LLM job: annotate every document once → {'docs': {file name: llm_anns}, 'tokens': {...}}
+    tokens: sentence tokens in total / triaged out, in sentence mode"""
+    docs = load_corpus(XML_DIR)   # parsed once, shared by every cell and model
+    if model == LEXICON_MODEL:
+        return {'docs': {doc.name: lexicon.llm_anns(doc.text) for doc in docs.values()}, 'tokens': {}}
+    outputs, tokens = {}, {}
+    if LEXICON_PREFILTER:
+        outputs = {doc.name: lexicon.llm_anns(doc.text) for doc in docs.values() if lexicon.covers(doc.text)}
+        print(f"  [lexicon] {len(outputs)}/{len(docs)} notes covered, no LLM call for them")
+    todo = [doc for doc in docs.values() if doc.name not in outputs]
+    texts = [doc.text for doc in todo]
+    doc_ids = [doc.name for doc in todo]
+    desc = TAG_DESCRIPTIONS if prompt['desc'] else None
+    threshold = prompt.get('triage', 0)
+    if sentence_mode:
+        outs, counts = client.annotate_sentences(model, texts, TAG_NAMES, desc, RETRIES, cache=sentence_cache,
+                                                 lexicon=lexicon if LEXICON_PREFILTER else None,
+                                                 triage=get_triage() if threshold else None, threshold=threshold,
+                                                 max_tokens=BATCH_TOKENS or 1500, doc_tokens=CHUNK_TOKENS,
+                                                 doc_ids=doc_ids, strict=True)
+        tokens = {'total': counts['tokens'], 'triaged': counts['triaged_tokens']}
+    elif BATCH_TOKENS:
+        outs = client.annotate_batched(model, texts, TAG_NAMES, desc, RETRIES,
+                                       max_tokens=BATCH_TOKENS, doc_tokens=CHUNK_TOKENS, doc_ids=doc_ids,
+                                       strict=True)
+    else:
+        outs = client.annotate_chunked(model, texts, TAG_NAMES, desc, RETRIES, max_tokens=CHUNK_TOKENS,
+                                       doc_ids=doc_ids, strict=True)
+    outputs.update((doc.name, llm_anns) for doc, llm_anns in zip(todo, outs))
+    return {'docs': outputs, 'tokens': tokens}
+
+_triage = {}
+def get_triage():
+    """the TRIAGE_SCORER, built on first use (the embedding one embeds the tag descriptions)"""
+    if 'scorer' not in _triage:
+        _triage['scorer'] = (EmbeddingTriage(client, TAG_DESCRIPTIONS, TAG_NAMES, EMBED_MODEL)
+                             if TRIAGE_SCORER == 'embedding' else LexiconTriage(lexicon))
+    return _triage['scorer']
+
+def score_cell(model, prompt, post, llm_outputs):
+    """post-processing + scoring of one cell, from the shared LLM outputs"""
     total_tp = total_fp = total_fn = 0
     negation_suppressed = 0
     negation_correct    = 0
-
-    for xml_path in xml_files:
-        text, gold_tags = parse_gold(xml_path)
-        gold_positive = [t for t in gold_tags if t['certainty'] != 'negated']
-        gold_negated  = [t for t in gold_tags if t['certainty'] == 'negated']
-
-        # use cached LLM output — same predictions for neg=ON and neg=OFF
-        cache_key = (xml_path, use_descriptions)
-        if cache_key not in llm_cache:
-            print(f"  [LLM] {os.path.basename(xml_path)} desc={'ON' if use_descriptions else 'OFF'}")
-            llm_cache[cache_key] = call_llm(model, text, TAG_NAMES, use_descriptions)
-        llm_anns = llm_cache[cache_key]
-
-        predicted_raw = localize(llm_anns, text)
-
-        if use_negation_filter:
+    files = {}
+    localize_s = 0.0
+    for doc in load_corpus(XML_DIR).values():
+        text = doc.text
+        t0 = time.perf_counter()
+        located = locate_all(llm_outputs['docs'][doc.name], text, TAG_NAMES, fuzzy=post.get('fuzzy', FUZZY_LOCALIZE))
+        seconds = time.perf_counter() - t0
+        localize_s += seconds
+        stage_log.record(doc.name, 'localize', seconds, model=model)
+        predicted_raw = dedupe_spans(located, post.get('dedupe', DEDUPE_POLICY))
+
+        if post['neg']:
             predicted = []
             for pred in predicted_raw:
                 if is_negated(pred['start'], pred['end'], text):
                     negation_suppressed += 1
-                    for gn in gold_negated:
-                        if pred['tag'] == gn['tag'] and spans_overlap(pred['start'], pred['end'], gn['start'], gn['end']):
-                            negation_correct += 1
-                            break
+                    if doc.index('negated').candidates(pred):
+                        negation_correct += 1
                 else:
                     predicted.append(pred)
         else:
             predicted = predicted_raw
 
-        tp, fp, fn = match_predictions(predicted, gold_positive)
+        tp, fp, fn = doc.index().score(predicted, post.get('match', MATCH_MODE), IOU_THRESHOLD)
         total_tp += tp
         total_fp += fp
         total_fn += fn
-
-        fname = os.path.basename(xml_path)
-        p, r, f = prf(tp, fp, fn)
-        print(f"    {fname}: P={p:.2f} R={r:.2f} F1={f:.2f}  (tp={tp} fp={fp} fn={fn})")
-
-    return total_tp, total_fp, total_fn, negation_suppressed, negation_correct
-
-# ── Run 2x2 ──────────────────────────────────────────────────────────────
-CONDITIONS = [
-    ('A', False, False),
-    ('B', True,  False),
-    ('C', False, True),
-    ('D', True,  True),
-]
-
-results = {}
-for model in MODELS:
-    llm_cache = {}  # shared across all 4 conditions for this model
-    for cond, use_desc, use_neg in CONDITIONS:
-        label = f"{cond}: desc={'ON' if use_desc else 'OFF'} | neg={'ON' if use_neg else 'OFF'}"
-        print(f"\n{'='*60}")
-        print(f"  {model} | {label}")
-        print(f"{'='*60}")
-        tp, fp, fn, suppressed, correct = evaluate(model, use_desc, use_neg, llm_cache)
-        p, r, f = prf(tp, fp, fn)
-        results[label] = {'P': p, 'R': r, 'F1': f, 'TP': tp, 'FP': fp, 'FN': fn,
-                          'neg_suppressed': suppressed, 'neg_correct': correct}
+        files[doc.name] = [tp, fp, fn]
+
+    p, r, f = prf(total_tp, total_fp, total_fn)
+    tokens = llm_outputs['tokens']
+    return {'P': p, 'R': r, 'F1': f, 'TP': total_tp, 'FP': total_fp, 'FN': total_fn,
+            'neg_suppressed': negation_suppressed, 'neg_correct': negation_correct, 'files': files,
+            'localize_s': localize_s,
+            'token_savings': tokens['triaged'] / tokens['total'] if tokens.get('total') else 0.0}
+
+# ── Run the grid ─────────────────────────────────────────────────────────
+sentence_mode = SENTENCE_MODE or 'triage' in PROMPT_GRID   # triage cells compare against sentence mode
+stage_log = StageLog(STAGE_LOG)
+client = OllamaClient(OLLAMA_URL, concurrency=CONCURRENCY, timeout=180, cache=LLMCache(), stage_log=stage_log)
+lexicon = Lexicon.from_descriptions(TAG_DESCRIPTIONS, TAG_NAMES)
+sentence_cache = SentenceCache(store=client.cache)
+grid = Grid(MODELS, prompts=PROMPT_GRID, post=POST_GRID, prompt_free=[LEXICON_MODEL])
+runner = GridRunner(RUN_DIR, run_llm, score_cell, workers=GRID_WORKERS, config={
+    'xml': sorted(load_corpus(XML_DIR)), 'tags': TAG_NAMES,
+    'chunk_tokens': CHUNK_TOKENS, 'batch_tokens': BATCH_TOKENS, 'sentence_mode': sentence_mode,
+    'triage_scorer': TRIAGE_SCORER, 'fuzzy': FUZZY_LOCALIZE,
+    'dedupe': DEDUPE_POLICY, 'match': MATCH_MODE, 'iou_threshold': IOU_THRESHOLD,
+    'lexicon_prefilter': LEXICON_PREFILTER,
+    # what the prompts are made of: an edited template or description must not reuse old outputs
+    'prompts': {desc: [template.prefix, template.batch_prefix] for desc, template in
+                [(False, get_template(TAG_NAMES)), (True, get_template(TAG_NAMES, TAG_DESCRIPTIONS))]},
+    'tag_descriptions': TAG_DESCRIPTIONS, 'options': client.options, 'retries': RETRIES,
+})
+cells = runner.run(grid)
+results = {}   # cell key → (model, prompt, post, metrics), every axis kept apart
+for model, prompt, post in grid.cells():
+    key = cell_key(model, prompt, post)
+    if key in cells:
+        results[key] = (model, prompt, post, cells[key])
+
+def lookup(model, prompt, post):
+    return cells.get(cell_key(model, prompt, post))
 
 # ── Summary table ────────────────────────────────────────────────────────
-print(f"\n{'='*75}")
-print(f"{'Condition':<32} {'P':>6} {'R':>6} {'F1':>6} {'TP':>5} {'FP':>5} {'FN':>5}")
-print(f"{'-'*75}")
-for label, m in results.items():
+def on_off(value):
+    return ('ON' if value else 'OFF') if isinstance(value, bool) else value
+
+def label(model, prompt, post):
+    """model | desc=ON | neg=OFF | <every other axis of the grid>"""
+    axes = dict(prompt, **post)
+    parts = [f"desc={on_off(axes.pop('desc'))}", f"neg={on_off(axes.pop('neg'))}"]
+    parts += [f"{k}={on_off(v)}" for k, v in sorted(axes.items())]
+    return ' | '.join([model] + parts)
+
+width = max([42] + [len(label(*r[:3])) for r in results.values()])
+print(f"\n{'='*(width + 43)}")
+print(f"{'Condition':<{width}} {'P':>6} {'R':>6} {'F1':>6} {'TP':>5} {'FP':>5} {'FN':>5}")
+print(f"{'-'*(width + 43)}")
+for model, prompt, post, m in results.values():
     neg_note = f"  (suppressed {m['neg_suppressed']}, {m['neg_correct']} correct)" if m['neg_suppressed'] > 0 else ""
-    print(f"{label:<32} {m['P']:>6.3f} {m['R']:>6.3f} {m['F1']:>6.3f} {m['TP']:>5} {m['FP']:>5} {m['FN']:>5}{neg_note}")
-print(f"{'='*75}")
-
+    print(f"{label(model, prompt, post):<{width}} {m['P']:>6.3f} {m['R']:>6.3f} {m['F1']:>6.3f} "
+          f"{m['TP']:>5} {m['FP']:>5} {m['FN']:>5}{neg_note}")
+print(f"{'='*(width + 43)}")
+
+# the 2x2 is read at the first value of every other axis (triage off)
+base_prompt = {k: v[0] for k, v in PROMPT_GRID.items()}
+if 'triage' in PROMPT_GRID:
+    base_prompt['triage'] = 0
+base_post = {k: v[0] for k, v in POST_GRID.items()}
 print("\nAblation summary:")
-if all(k in results for k in ['A: desc=OFF | neg=OFF', 'B: desc=ON | neg=OFF']):
-    a, b = results['A: desc=OFF | neg=OFF'], results['B: desc=ON | neg=OFF']
-    print(f"  Tag descriptions (B vs A): R {a['R']:.3f} → {b['R']:.3f}  F1 {a['F1']:.3f} → {b['F1']:.3f}")
-if all(k in results for k in ['B: desc=ON | neg=OFF', 'D: desc=ON | neg=ON']):
-    b, d = results['B: desc=ON | neg=OFF'], results['D: desc=ON | neg=ON']
-    print(f"  Negation filter w/ desc (D vs B): F1 {b['F1']:.3f} → {d['F1']:.3f}")
-if all(k in results for k in ['A: desc=OFF | neg=OFF', 'C: desc=OFF | neg=ON']):
-    a, c = results['A: desc=OFF | neg=OFF'], results['C: desc=OFF | neg=ON']
-    print(f"  Negation filter w/o desc (C vs A): F1 {a['F1']:.3f} → {c['F1']:.3f}")
+for model in MODELS:
+    a = lookup(model, dict(base_prompt, desc=False), dict(base_post, neg=False))
+    b = lookup(model, dict(base_prompt, desc=True), dict(base_post, neg=False))
+    c = lookup(model, dict(base_prompt, desc=False), dict(base_post, neg=True))
+    d = lookup(model, dict(base_prompt, desc=True), dict(base_post, neg=True))
+    if a and b:
+        print(f"  {model} tag descriptions (B vs A): R {a['R']:.3f} → {b['R']:.3f}  F1 {a['F1']:.3f} → {b['F1']:.3f}")
+    if b and d:
+        print(f"  {model} negation filter w/ desc (D vs B): F1 {b['F1']:.3f} → {d['F1']:.3f}")
+    if a and c:
+        print(f"  {model} negation filter w/o desc (C vs A): F1 {a['F1']:.3f} → {c['F1']:.3f}")
+
+if len(PROMPT_GRID.get('triage', [])) > 1:
+    print(f"\nTriage ({TRIAGE_SCORER}), recall vs LLM tokens saved:")
+    for model, prompt, post, m in results.values():
+        if model != LEXICON_MODEL and post == dict(base_post, neg=False):
+            print(f"  {model} desc={on_off(prompt['desc'])} triage>={prompt['triage']}: "
+                  f"R {m['R']:.3f}  F1 {m['F1']:.3f}  tokens saved {m.get('token_savings', 0):.1%}")
+
+if len(POST_GRID.get('fuzzy', [])) > 1:
+    print("\nFuzzy localisation, recall recovered and time added:")
+    for model, prompt, post in grid.cells():
+        on, off = lookup(model, prompt, post), lookup(model, prompt, dict(post, fuzzy=False))
+        if post['fuzzy'] and on and off:
+            print(f"  {cell_key(model, prompt, post)}: R {off['R']:.3f} → {on['R']:.3f} "
+                  f"({on['TP'] - off['TP']:+d} TP, {on['FP'] - off['FP']:+d} FP), localize "
+                  f"{off['localize_s'] * 1000:.1f} → {on['localize_s'] * 1000:.1f} ms")
+print(f"\nLLM cache: {client.cache.stats()}")
+if sentence_mode:
+    print(f"Sentence cache: {sentence_cache.stats()}")
+client.print_metrics()
+stage_log.print_summary()
+stage_log.close()
@@ -1,16 +1,16 @@
-import os, re, json, glob, requests, time
+import os, re, glob, time
 from xml.etree import ElementTree as ET
 
+from ollama_client import OllamaClient
+from llm_cache import LLMCache
+from negation import is_negated
+
 OLLAMA_URL = 'http://localhost:11434'
 XML_DIR = r'C:\Users\del\Desktop\Work\MedTator\sample\VAERS_20_NOTES\ann_xml'
 TAG_NAMES = ['Vaccine','Fever','Pain','Headache','Myalgia','Fatigue',
     'Nasal_obstruction','Diarrhea','Nausea','Vomiting',
     'Sore_throat','Dyspnea','Cough','Chill','Delirium','Hypersomnia','Other']
 
-NEGATION_PRE = re.compile(r'\b(denies?|no |not |doesn\'t have|did not have|without|negative for|no evidence of|absent)\b', re.IGNORECASE)
-NEGATION_POST = re.compile(r'\b(absent|not found|not present|none|: none|negative)\b', re.IGNORECASE)
-SCOPE_BREAKERS = re.compile(r'[.!?]|\b(but|however|although|except|yet|while)\b', re.IGNORECASE)
-
 xml_path = sorted(glob.glob(os.path.join(XML_DIR, '*.xml')))[0]
 tree = ET.parse(xml_path)
 root = tree.getroot()
@@ -45,48 +45,29 @@ Rules:
 Text:
 {text[:2000]}"""
 
-print('Calling qwen3:8b...')
-t0 = time.time()
-resp = requests.post(f'{OLLAMA_URL}/api/chat',
-    json={'model': 'qwen3:8b', 'messages': [{'role': 'user', 'content': prompt}],
-          'stream': False, 'format': 'json', 'options': {'temperature': 0}}, timeout=120)
-elapsed = time.time() - t0
-content = resp.json()['message']['content']
-content = re.sub(r'```json\s*|\s*```', '', content).strip()
-if not content.startswith('{'):
-    m = re.search(r'\{[\s\S]*\}', content)
-    content = m.group(0) if m else '{}'
-data = json.loads(content)
-llm_anns = data.get('annotations') or []
-print(f'Elapsed: {elapsed:.1f}s  |  LLM returned {len(llm_anns)} annotations')
-print()
-
 def get_locs(keyword, text):
     pattern = re.escape(keyword).replace(r'\ ', r'\s+')
     return [(m.start(), m.end()) for m in re.finditer(pattern, text, re.IGNORECASE)]
 
-def is_negated(start, end, text):
-    pre = text[max(0, start - 60):start]
-    bks = list(SCOPE_BREAKERS.finditer(pre))
-    if bks: pre = pre[bks[-1].end():]
-    if NEGATION_PRE.search(pre): return True
-    post = text[end:end + 30]
-    bks = list(SCOPE_BREAKERS.finditer(post))
-    if bks: post = post[:bks[0].start()]
-    return bool(NEGATION_POST.search(post))
-
+# stream the reply: each keyword is located and negation-checked as soon as it arrives
 predicted = []
-for ann in llm_anns:
+def on_annotation(ann):
     if ann.get('tag') not in TAG_NAMES:
-        continue
+        return
     for s, e in get_locs(ann['keyword'], text):
         neg = is_negated(s, e, text)
         predicted.append({'tag': ann['tag'], 'start': s, 'end': e, 'negated': neg})
+        print(f'  +{time.time() - t0:5.1f}s [{ann["tag"]}] {repr(text[s:e][:60])}{" [NEGATED]" if neg else ""}')
+
+print('Calling qwen3:8b (streaming)...')
+t0 = time.time()
+client = OllamaClient(OLLAMA_URL, concurrency=1, timeout=120, cache=LLMCache())
+llm_anns, timing = client.stream_json('qwen3:8b', prompt, on_annotation, tag_names=TAG_NAMES)
+first = f"{timing['first_annotation']:.1f}s" if timing['first_annotation'] is not None else '-'
+print(f'First annotation: {first}  |  Elapsed: {timing["total"]:.1f}s  |  LLM returned {len(llm_anns)} annotations')
+print()
 
-print(f'Located spans ({len(predicted)}):')
-for p in predicted:
-    flag = ' [NEGATED]' if p['negated'] else ''
-    print(f'  [{p["tag"]}] {repr(text[p["start"]:p["end"]][:60])}{flag}')
+print(f'Located spans: {len(predicted)}')
 print()
 
 def spans_overlap(a0, a1, b0, b1):
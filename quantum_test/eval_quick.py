@@ -6,106 +6,29 @@ C: desc=OFF neg=ON
 D: desc=ON  neg=ON
 neg=ON/OFF share same LLM cache (clean ablation)
 """
-import os, re, json, glob, requests
-from xml.etree import ElementTree as ET
+import re
+
+from ollama_client import OllamaClient
+from llm_cache import LLMCache
+from localizer import dedupe_spans, locate_all
+from negation import is_negated
+from gold import load_corpus
+from prompt_templates import SCHEMA_FILE, load_tag_descriptions, load_tag_names
 
 OLLAMA_URL = "http://localhost:11434"
 MODEL      = "qwen3:8b"
 XML_DIR    = r"C:\Users\del\Desktop\Work\MedTator\sample\VAERS_20_NOTES\ann_xml"
 N_FILES    = 3   # change to 20 for full run
+CONCURRENCY = 4  # match OLLAMA_NUM_PARALLEL
+CHUNK_TOKENS = 500  # window budget, long notes are split into overlapping windows
+BATCH_TOKENS = 0  # > 0: pack several notes into one prompt of this budget (batching.py)
+STREAM = False  # consume the token stream, localise + negation-check each keyword on arrival
+DEDUPE_POLICY = 'first'  # overlapping spans of one tag: first | longest | merge (localizer.dedupe_spans)
+MATCH_MODE = 'overlap'  # pred ↔ gold: exact | overlap | iou (scoring.GoldIndex)
+IOU_THRESHOLD = 0.5  # MATCH_MODE = 'iou' only
 
-TAG_NAMES = [
-    "Vaccine","Fever","Pain","Headache","Myalgia","Fatigue",
-    "Nasal_obstruction","Diarrhea","Nausea","Vomiting",
-    "Sore_throat","Dyspnea","Cough","Chill","Delirium","Hypersomnia","Other"
-]
-TAG_DESCRIPTIONS = {
-    "Vaccine":           "COVID-19 vaccine name or identifier (e.g., BNT162b2, Pfizer-BioNTech, Moderna, mRNA-1273, Janssen, J&J, AstraZeneca, vaccine dose)",
-    "Fever":             "fever, high temperature, pyrexia, febrile, temperature elevation",
-    "Pain":              "pain, painful, ache, sore, soreness, discomfort, hurts, tenderness",
-    "Headache":          "headache, head pain, migraine, cephalalgia",
-    "Myalgia":           "muscle pain, myalgia, muscle soreness, muscle ache, body aches, swollen, swelling, inflammation, stiffness",
-    "Fatigue":           "fatigue, tired, tiredness, exhaustion, weakness, lethargy, malaise, low energy",
-    "Nasal_obstruction": "nasal obstruction, stuffy nose, nasal congestion, blocked nose, runny nose, rhinorrhea",
-    "Diarrhea":          "diarrhea, loose stool, loose bowel movements, watery stool",
-    "Nausea":            "nausea, nauseated, stomach upset, queasy, feel sick",
-    "Vomiting":          "vomiting, vomited, threw up, emesis, retching",
-    "Sore_throat":       "sore throat, throat pain, pharyngitis, throat irritation, scratchy throat",
-    "Dyspnea":           "dyspnea, shortness of breath, difficulty breathing, breathlessness, SOB, can't breathe",
-    "Cough":             "cough, coughing, dry cough, productive cough, hacking cough",
-    "Chill":             "chills, rigors, shivering, cold sensation, feeling cold",
-    "Delirium":          "delirium, confusion, disorientation, altered mental status, cognitive impairment, hallucination",
-    "Hypersomnia":       "hypersomnia, excessive sleepiness, drowsiness, somnolence, oversleeping, hard to stay awake",
-    "Other":             "any other adverse event or medical concept not covered by the above tags",
-}
-
-NEGATION_PRE  = re.compile(r'\b(denies?|no |not |doesn\'t have|did not have|without|negative for|no evidence of|absent)\b', re.IGNORECASE)
-NEGATION_POST = re.compile(r'\b(absent|not found|not present|none|: none|negative)\b', re.IGNORECASE)
-SCOPE_BREAKERS = re.compile(r'[.!?]|\b(but|however|although|except|yet|while)\b', re.IGNORECASE)
-
-
-def parse_gold(xml_path):
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
-    text_el = root.find('TEXT')
-    text = text_el.text if text_el is not None and text_el.text else ''
-    tags = []
-    for el in root.find('TAGS') or []:
-        m = re.match(r'(\d+)~(\d+)', el.get('spans', ''))
-        if m:
-            tags.append({'tag': el.tag, 'start': int(m.group(1)), 'end': int(m.group(2)),
-                         'certainty': el.get('certainty', 'positive').lower()})
-    return text, tags
-
-
-def call_llm(text, use_descriptions):
-    tag_list = ', '.join(TAG_NAMES)
-    if use_descriptions:
-        desc_block = 'Tag definitions:\n' + '\n'.join(
-            f'  - {t}: {TAG_DESCRIPTIONS[t]}' for t in TAG_NAMES) + '\n\n'
-    else:
-        desc_block = ''
-    prompt = (
-        "You are a clinical text annotation assistant.\n"
-        f"Identify medical concepts in the following text and classify them using ONLY these exact tag names: {tag_list}\n\n"
-        f"{desc_block}"
-        'Return JSON only, no explanation. Format:\n'
-        '{"annotations": [{"keyword": "core clinical term", "tag": "TagName"}]}\n\n'
-        "Rules:\n"
-        f"- ONLY use these exact tag names: {tag_list}\n"
-        "- keyword must be the shortest core clinical term (1-3 words), NOT a full sentence or clause\n"
-        "- keyword must appear verbatim in the text (exact spelling, case-insensitive)\n"
-        "- Do NOT include IDs, offsets, or extra fields\n\n"
-        f"Text:\n{text[:2000]}"
-    )
-    try:
-        resp = requests.post(
-            f"{OLLAMA_URL}/api/chat",
-            json={"model": MODEL, "messages": [{"role": "user", "content": prompt}],
-                  "stream": False, "format": "json", "options": {"temperature": 0}},
-            timeout=300)
-        resp.raise_for_status()
-        content = resp.json()["message"]["content"]
-        content = re.sub(r'```json\s*|\s*```', '', content).strip()
-        if not content.startswith('{'):
-            m = re.search(r'\{[\s\S]*\}', content)
-            content = m.group(0) if m else '{}'
-        data = json.loads(content)
-        anns = data.get('annotations') or data.get('results') or []
-        return [a for a in anns if isinstance(a.get('keyword'), str) and isinstance(a.get('tag'), str)]
-    except Exception as e:
-        print(f"  [LLM error] {e}")
-        return []
-
-
-def call_llm_with_retry(text, use_descriptions, retries=2):
-    for attempt in range(retries):
-        result = call_llm(text, use_descriptions)
-        if result:
-            return result
-        if attempt < retries - 1:
-            print(f"  [retry {attempt+1}] empty result, retrying...")
-    return []
+TAG_NAMES = load_tag_names(SCHEMA_FILE)  # schema order, same as the gold XML
+TAG_DESCRIPTIONS = load_tag_descriptions(SCHEMA_FILE)   # from the schema, the vocabulary where it has none
 
 
 def get_locs(keyword, text):
@@ -113,54 +36,27 @@ def get_locs(keyword, text):
     return [(m.start(), m.end()) for m in re.finditer(pattern, text, re.IGNORECASE)]
 
 
-def is_negated(start, end, text):
-    pre = text[max(0, start - 60):start]
-    bks = list(SCOPE_BREAKERS.finditer(pre))
-    if bks:
-        pre = pre[bks[-1].end():]
-    if NEGATION_PRE.search(pre):
-        return True
-    post = text[end:end + 30]
-    bks = list(SCOPE_BREAKERS.finditer(post))
-    if bks:
-        post = post[:bks[0].start()]
-    return bool(NEGATION_POST.search(post))
+def locate(ann, text):
+    """one keyword/tag → its spans in the text, each with the negation flag"""
+    if ann['tag'] not in TAG_NAMES:
+        return []
+    return [{'tag': ann['tag'], 'start': s, 'end': e, 'negated': is_negated(s, e, text)}
+            for s, e in get_locs(ann['keyword'], text)]
 
 
-def spans_overlap(a0, a1, b0, b1):
-    return a0 < b1 and b0 < a1
+def dedupe(raw):
+    return dedupe_spans(raw, DEDUPE_POLICY)
 
 
 def localize(llm_anns, text):
-    raw = []
-    for ann in llm_anns:
-        if ann['tag'] not in TAG_NAMES:
-            continue
-        for s, e in get_locs(ann['keyword'], text):
-            raw.append({'tag': ann['tag'], 'start': s, 'end': e})
-    raw.sort(key=lambda x: x['start'])
-    deduped = []
-    for pred in raw:
-        if any(pred['tag'] == k['tag'] and spans_overlap(pred['start'], pred['end'], k['start'], k['end'])
-               for k in deduped):
-            continue
-        deduped.append(pred)
-    return deduped
-
-
-def match_prf(predicted, gold_positive):
-    matched = set()
-    tp = 0
-    for pred in predicted:
-        for i, g in enumerate(gold_positive):
-            if i in matched:
-                continue
-            if pred['tag'] == g['tag'] and spans_overlap(pred['start'], pred['end'], g['start'], g['end']):
-                tp += 1
-                matched.add(i)
-                break
-    fp = len(predicted) - tp
-    fn = len(gold_positive) - tp
+    raw = locate_all(llm_anns, text, TAG_NAMES)
+    for p in raw:
+        p['negated'] = is_negated(p['start'], p['end'], text)
+    return dedupe(raw)
+
+
+def match_prf(predicted, doc):
+    tp, fp, fn = doc.index().score(predicted, MATCH_MODE, IOU_THRESHOLD)
     p  = tp / (tp + fp) if (tp + fp) > 0 else 0.0
     r  = tp / (tp + fn) if (tp + fn) > 0 else 0.0
     f  = 2 * p * r / (p + r) if (p + r) > 0 else 0.0
@@ -168,8 +64,9 @@ def match_prf(predicted, gold_positive):
 
 
 # ── Run ──────────────────────────────────────────────────────────────────
-xml_files = sorted(glob.glob(os.path.join(XML_DIR, '*.xml')))[:N_FILES]
-print(f"Files ({len(xml_files)}): {[os.path.basename(f) for f in xml_files]}\n")
+docs = load_corpus(XML_DIR, N_FILES)   # parsed once, shared by all conditions
+xml_files = list(docs)
+print(f"Files ({len(xml_files)}): {[doc.name for doc in docs.values()]}\n")
 
 CONDITIONS = [
     ('A', False, False),
@@ -178,37 +75,54 @@ CONDITIONS = [
     ('D', True,  True),
 ]
 
+client = OllamaClient(OLLAMA_URL, concurrency=CONCURRENCY, timeout=300, cache=LLMCache())
 llm_cache = {}
+located = {}   # (xml_path, use_desc) → spans located while streaming
 results = {}
 
 for cond, use_desc, use_neg in CONDITIONS:
     label = f"{cond}: desc={'ON' if use_desc else 'OFF'} neg={'ON' if use_neg else 'OFF'}"
     total_tp = total_fp = total_fn = neg_sup = 0
-    for xml_path in xml_files:
-        text, gold_tags = parse_gold(xml_path)
-        gold_positive = [t for t in gold_tags if t['certainty'] != 'negated']
-        fname = os.path.basename(xml_path)
+    missing = [p for p in xml_files if (p, use_desc) not in llm_cache]
+    if missing:
+        print(f"  [LLM] {len(missing)} files  desc={'ON' if use_desc else 'OFF'}", flush=True)
+        texts = [docs[p].text for p in missing]
+        desc = TAG_DESCRIPTIONS if use_desc else None
+        if STREAM:
+            streamed = [[] for _ in missing]
+            outs, timings = client.stream_many(
+                MODEL, texts, TAG_NAMES, desc, max_tokens=CHUNK_TOKENS,
+                on_annotation=lambda i, ann: streamed[i].extend(locate(ann, texts[i])))
+            ttfa = [t['first_annotation'] for t in timings if t['first_annotation'] is not None]
+            total = [t['total'] for t in timings if t['total'] is not None]
+            if ttfa:
+                print(f"  [stream] first annotation {sum(ttfa)/len(ttfa):.2f}s avg, "
+                      f"full reply {sum(total)/len(total):.2f}s avg")
+            for xml_path, spans in zip(missing, streamed):
+                located[(xml_path, use_desc)] = spans
+        elif BATCH_TOKENS:
+            outs = client.annotate_batched(MODEL, texts, TAG_NAMES, desc, retries=1,
+                                           max_tokens=BATCH_TOKENS, doc_tokens=CHUNK_TOKENS)
+        else:
+            outs = client.annotate_chunked(MODEL, texts, TAG_NAMES, desc, retries=1,
+                                           max_tokens=CHUNK_TOKENS)
+        for xml_path, llm_anns in zip(missing, outs):
+            llm_cache[(xml_path, use_desc)] = llm_anns
 
+    for xml_path in xml_files:
+        doc = docs[xml_path]
         key = (xml_path, use_desc)
-        if key not in llm_cache:
-            print(f"  [LLM] {fname}  desc={'ON' if use_desc else 'OFF'}", flush=True)
-            llm_cache[key] = call_llm_with_retry(text, use_desc)
-        preds = localize(llm_cache[key], text)
+        preds = dedupe(located[key]) if key in located else localize(llm_cache[key], doc.text)
 
         if use_neg:
-            filtered = [p for p in preds if not is_negated(p['start'], p['end'], text)]
+            filtered = [p for p in preds if not p['negated']]
             neg_sup += len(preds) - len(filtered)
             preds = filtered
 
-        tp, fp, fn, p, r, f = match_prf(preds, gold_positive)
-        print(f"    {fname}: TP={tp} FP={fp} FN={fn}  P={p:.2f} R={r:.2f} F1={f:.2f}")
+        tp, fp, fn, p, r, f = match_prf(preds, doc)
+        print(f"    {doc.name}: TP={tp} FP={fp} FN={fn}  P={p:.2f} R={r:.2f} F1={f:.2f}")
         total_tp += tp; total_fp += fp; total_fn += fn
 
-    _, _, _, P, R, F = match_prf(
-        [{'tag':'x','start':0,'end':1}] * total_tp + [{'tag':'y','start':0,'end':1}] * total_fp,
-        [{'tag':'x','start':0,'end':1}] * (total_tp + total_fn)
-    )
-    # recalc correctly
     P2 = total_tp / (total_tp + total_fp) if (total_tp + total_fp) > 0 else 0.0
     R2 = total_tp / (total_tp + total_fn) if (total_tp + total_fn) > 0 else 0.0
     F2 = 2*P2*R2/(P2+R2) if (P2+R2) > 0 else 0.0
@@ -229,3 +143,5 @@ A, B, C, D = results['A'], results['B'], results['C'], results['D']
 print(f"desc effect  (neg=OFF, B vs A):  R {A['R']:.3f}→{B['R']:.3f}  P {A['P']:.3f}→{B['P']:.3f}  F1 {A['F1']:.3f}→{B['F1']:.3f}")
 print(f"neg  effect  (desc=ON,  D vs B):  R {B['R']:.3f}→{D['R']:.3f}  P {B['P']:.3f}→{D['P']:.3f}  F1 {B['F1']:.3f}→{D['F1']:.3f}")
 print(f"neg  effect  (desc=OFF, C vs A):  R {A['R']:.3f}→{C['R']:.3f}  P {A['P']:.3f}→{C['P']:.3f}  F1 {A['F1']:.3f}→{C['F1']:.3f}")
+print(f"\nLLM cache: {client.cache.stats()}")
+client.print_metrics()
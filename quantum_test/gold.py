@@ -0,0 +1,67 @@
+"""
+Gold-standard corpus parsed once and shared
+
+Every ablation condition used to parse each XML again with ElementTree and
+rebuild gold_positive / gold_negated, and parse_gold kept only the first
+"s~e" of a tag. Here each file is parsed once with scripts/medtator_kits.py
+(all segments of discontinuous spans), split by certainty and indexed per tag
+(scoring.GoldIndex), and the documents are cached for the whole process, so
+every condition, model and scorer reads the same objects.
+
+    corpus = load_corpus(XML_DIR, n_files=3)     # {xml_path: GoldDoc}
+    doc = corpus[xml_path]                       # or load_gold(xml_path)
+    doc.text, doc.positive, doc.negated
+    tp, fp, fn = doc.index().score(predicted)    # against doc.positive
+"""
+
+import functools, glob, os, sys
+
+from scoring import GoldIndex
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import medtator_kits as mtk
+
+class GoldDoc:
+    def __init__(self, path, text, tags):
+        """tags: [{'tag', 'start', 'end', 'spans', 'certainty', 'id', 'text'}, ...] in file order"""
+        self.path = path
+        self.name = os.path.basename(path)
+        self.text = text
+        self.tags = tags
+        self.positive = [t for t in tags if t['certainty'] != 'negated']
+        self.negated = [t for t in tags if t['certainty'] == 'negated']
+        self._index = {}
+
+    def index(self, certainty='positive'):
+        """GoldIndex over the positive (default), negated or all tags, built once"""
+        if certainty not in self._index:
+            tags = {'positive': self.positive, 'negated': self.negated, 'all': self.tags}[certainty]
+            self._index[certainty] = GoldIndex(tags)
+        return self._index[certainty]
+
+def parse_tags(ann):
+    """entity tags of a parsed MedTator ann; relation and document-level tags are skipped"""
+    tags = []
+    for t in ann['tags']:
+        spans = [tuple(sp) for sp in t.get('spans', []) if sp[0] >= 0 and sp[1] > sp[0]]
+        if not spans:
+            continue
+        tags.append({'tag': t['tag'], 'start': spans[0][0], 'end': spans[-1][1], 'spans': spans,
+                     'certainty': t.get('certainty', 'positive').lower(),
+                     'id': t.get('id', ''), 'text': t.get('text', '')})
+    return tags
+
+@functools.lru_cache(maxsize=None)
+def _load(path, mtime):
+    ann = mtk.parse_xml(path)
+    return GoldDoc(path, ann['text'], parse_tags(ann))
+
+def load_gold(xml_path):
+    """the GoldDoc of one file, parsed on first use (again only if the file changed)"""
+    path = os.path.abspath(xml_path)
+    return _load(path, os.path.getmtime(path))
+
+def load_corpus(xml_dir, n_files=None):
+    """{xml_path: GoldDoc} of the first n_files XMLs of the folder, sorted by name"""
+    xml_files = sorted(glob.glob(os.path.join(xml_dir, '*.xml')))[:n_files]
+    return {p: load_gold(p) for p in xml_files}
@@ -0,0 +1,182 @@
+"""
+Parallel, resumable ablation grid
+
+The 2x2 in eval_llm ran model by model, condition by condition, and a crash
+halfway lost everything. Here a grid of
+
+    models × prompt variants × post-processing variants
+
+is expanded into a small DAG: one LLM job per (model, prompt variant) and
+one scoring cell per full combination, depending on its LLM job. Cells that
+differ only in post-processing (negation filter, dedupe policy, match mode)
+share the LLM job. Models whose job doesn't read the prompt (a lexicon
+baseline) are listed in `prompt_free` and get one LLM job, at the first
+prompt variant, instead of identical copies of it. LLM jobs run concurrently on a thread pool, each in its
+own event loop; the client's scheduler slots are process-wide, so they
+still cap the requests of all jobs together. A cell is scored as soon as its LLM
+job is done.
+
+Every finished LLM job and cell is checkpointed under `run_dir`, so running
+the same grid again only does what is missing:
+
+    run_dir/config.json      settings the outputs depend on (checked on resume)
+    run_dir/llm/<key>.json   LLM outputs of one (model, prompt variant)
+    run_dir/cells.jsonl      one line per scored cell
+
+    grid = Grid(MODELS, prompts={'desc': [False, True]}, post={'neg': [False, True]})
+    runner = GridRunner(RUN_DIR, llm_fn, cell_fn, config={...}, workers=2)
+    results = runner.run(grid)    # {cell key: metrics}
+
+llm_fn(model, prompt) → JSON-serialisable outputs
+cell_fn(model, prompt, post, outputs) → JSON-serialisable metrics
+"""
+
+import hashlib, itertools, json, os, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+def _product(axes):
+    """{'a': [1, 2], 'b': [x]} → [{'a': 1, 'b': x}, {'a': 2, 'b': x}]"""
+    names = sorted(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[n] for n in names))]
+
+def _label(settings):
+    return ' '.join(f'{k}={v}' for k, v in sorted(settings.items()))
+
+def llm_key(model, prompt):
+    return f'{model} | {_label(prompt)}'
+
+def cell_key(model, prompt, post):
+    return f'{model} | {_label(prompt)} | {_label(post)}'
+
+class Grid:
+    def __init__(self, models, prompts=None, post=None, prompt_free=()):
+        """prompts / post: {axis: [values]}; each axis is crossed with all the others
+        prompt_free: models run at the first prompt variant only"""
+        self.models = list(models)
+        self.prompts = _product(prompts or {})
+        self.post = _product(post or {})
+        self.prompt_free = set(prompt_free)
+
+    def model_prompts(self, model):
+        return self.prompts[:1] if model in self.prompt_free else self.prompts
+
+    def cells(self):
+        """[(model, prompt, post), ...] in grid order"""
+        return [(m, p, q) for m in self.models for p in self.model_prompts(m) for q in self.post]
+
+    def llm_jobs(self):
+        return [(m, p) for m in self.models for p in self.model_prompts(m)]
+
+class GridRunner:
+    def __init__(self, run_dir, llm_fn, cell_fn, config=None, workers=2):
+        self.run_dir = run_dir
+        self.llm_fn = llm_fn
+        self.cell_fn = cell_fn
+        self.config = config or {}
+        self.workers = workers
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(run_dir, 'llm'), exist_ok=True)
+        self._check_config()
+
+    # ── Checkpoints ─────────────────────────────────────────────────────
+    def _check_config(self):
+        path = os.path.join(self.run_dir, 'config.json')
+        config = json.loads(json.dumps(self.config))   # as it reads back from disk
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved != config:
+                raise ValueError(f"{self.run_dir} was run with other settings {saved}, "
+                                 f"use another run dir for {config}")
+        else:
+            self._write_json(path, config)
+
+    def _write_json(self, path, obj):
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(obj, f, ensure_ascii=False)
+        os.replace(tmp, path)   # atomic, a crash never leaves half a file
+
+    def _llm_path(self, model, prompt):
+        digest = hashlib.sha256(llm_key(model, prompt).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.run_dir, 'llm', f'{digest}.json')
+
+    def load_llm(self, model, prompt):
+        path = self._llm_path(model, prompt)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)['outputs']
+
+    def load_cells(self):
+        """{cell key: metrics} of the cells already scored"""
+        path = os.path.join(self.run_dir, 'cells.jsonl')
+        done = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue   # torn last line of an interrupted run
+                    done[row['key']] = row['metrics']
+        return done
+
+    def _save_cell(self, key, model, prompt, post, metrics):
+        row = {'key': key, 'model': model, 'prompt': prompt, 'post': post, 'metrics': metrics}
+        with self.lock, open(os.path.join(self.run_dir, 'cells.jsonl'), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(row, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    # ── Run ─────────────────────────────────────────────────────────────
+    def _run_llm(self, model, prompt):
+        t0 = time.time()
+        outputs = self.llm_fn(model, prompt)
+        self._write_json(self._llm_path(model, prompt),
+                         {'model': model, 'prompt': prompt, 'outputs': outputs})
+        print(f"  [grid] LLM {llm_key(model, prompt)} done in {time.time() - t0:.1f}s", flush=True)
+        return outputs
+
+    def _run_cell(self, model, prompt, post, outputs):
+        key = cell_key(model, prompt, post)
+        metrics = self.cell_fn(model, prompt, post, outputs)
+        self._save_cell(key, model, prompt, post, metrics)
+        return key, metrics
+
+    def run(self, grid):
+        """score every cell of the grid that isn't checkpointed yet → {cell key: metrics}"""
+        results = self.load_cells()
+        pending = {}
+        for model, prompt, post in grid.cells():
+            if cell_key(model, prompt, post) not in results:
+                pending.setdefault(llm_key(model, prompt), (model, prompt, []))[2].append(post)
+        n_cells = sum(len(posts) for _, _, posts in pending.values())
+        print(f"  [grid] {len(grid.cells())} cells, {len(grid.cells()) - n_cells} checkpointed, "
+              f"{n_cells} to run over {len(pending)} LLM jobs", flush=True)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            llm_futures, cell_futures = {}, []
+            for model, prompt, posts in pending.values():
+                outputs = self.load_llm(model, prompt)
+                if outputs is None:
+                    llm_futures[pool.submit(self._run_llm, model, prompt)] = (model, prompt, posts)
+                else:
+                    cell_futures += [pool.submit(self._run_cell, model, prompt, post, outputs) for post in posts]
+            for fut in as_completed(llm_futures):
+                model, prompt, posts = llm_futures[fut]
+                try:
+                    outputs = fut.result()
+                except Exception as e:
+                    print(f"  [grid] LLM {llm_key(model, prompt)} failed: {e!r}; "
+                          f"{len(posts)} cells left for the next run", flush=True)
+                    continue
+                cell_futures += [pool.submit(self._run_cell, model, prompt, post, outputs) for post in posts]
+            for fut in cell_futures:
+                try:
+                    key, metrics = fut.result()
+                except Exception as e:
+                    print(f"  [grid] cell failed: {e!r}", flush=True)
+                    continue
+                results[key] = metrics
+        return results
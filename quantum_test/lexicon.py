@@ -0,0 +1,134 @@
+"""
+Dictionary pre-annotator from the tag descriptions
+
+TAG_DESCRIPTIONS lists the synonyms of every tag ("fever, high temperature,
+pyrexia, febrile, ...") but they were only pasted into prompts. Here they
+(or a lexicon file) are compiled into one Aho-Corasick automaton
+(scripts/matcher_kits.py) and a document is annotated in a single pass,
+no LLM call:
+
+  - case-insensitive, whole words only ("sore" doesn't hit "soreness")
+  - whitespace-tolerant like localizer.locate_all
+  - overlapping hits: leftmost, then longest wins ("sore throat" over "sore")
+  - every span gets the negation flag of negation.is_negated
+
+Terms come from the comma-separated descriptions; a parenthesised list
+("(e.g., Moderna, Janssen)") counts as terms too, and anything longer than
+MAX_TERM_WORDS words is a definition, not a synonym ("Other" gets none).
+A lexicon file is JSON, {tag: [term, ...]}, merged over the descriptions.
+
+It is the lexicon baseline of the eval grid (model LEXICON_MODEL), and a
+pre-filter: covers() says the lexicon alone explains a text — it found a
+concept and nearly every content word is inside a hit — so that document or
+sentence doesn't need the LLM.
+
+    lex = Lexicon.from_descriptions(TAG_DESCRIPTIONS, TAG_NAMES)   # or Lexicon.load(path, ...)
+    spans = lex.annotate(text)     # [{'tag', 'start', 'end', 'keyword', 'negated'}, ...]
+    lex.covers(text)               # True → skip the LLM for this text
+    llm_anns = lex.llm_anns(text)  # same hits as LLM-style keyword/tag pairs
+"""
+
+import json, os, re, sys
+
+from localizer import collapse_whitespace, normalize_keyword
+from negation import is_negated
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import matcher_kits as mck
+
+LEXICON_MODEL   = 'lexicon'   # model name of the lexicon baseline in the eval grid
+MAX_TERM_WORDS  = 4           # longer description items are definitions, not synonyms
+COVER_THRESHOLD = 0.8         # share of content words inside hits for covers()
+
+# words that carry no concept, left out of the coverage of covers()
+STOPWORDS = set('''
+a an and are as at be been but by day days did do does for from had has have he her his i in is it
+its my of on or patient pt reported reports she so that the then there they this to was were with
+after before also experienced developed started noted since received
+'''.split())
+
+WORD = re.compile(r"[A-Za-z][A-Za-z'-]+")
+DESCRIPTION_SPLIT = re.compile(r'[,;()]|\be\.g\.,?')
+
+def terms_from_description(description):
+    """synonyms listed in one tag description"""
+    terms = []
+    for item in DESCRIPTION_SPLIT.split(description or ''):
+        item = normalize_keyword(item).strip(' .')
+        if item and len(item.split()) <= MAX_TERM_WORDS:
+            terms.append(item)
+    return terms
+
+class Lexicon:
+    def __init__(self, entries):
+        """entries: [(term, tag), ...]; a term may belong to several tags"""
+        self.ac = mck.AhoCorasick(ignore_case=True, word_boundary=True)
+        self.tags = {}
+        for term, tag in entries:
+            key = mck.fold_case(normalize_keyword(term).strip())
+            if not key:
+                continue
+            if key not in self.tags:
+                self.tags[key] = []
+                self.ac.add(key, key)
+            if tag not in self.tags[key]:
+                self.tags[key].append(tag)
+        self.ac.build()
+
+    @classmethod
+    def from_descriptions(cls, tag_descriptions, tag_names=None):
+        tags = tag_names or list(tag_descriptions)
+        return cls([(term, tag) for tag in tags
+                    for term in terms_from_description(tag_descriptions.get(tag, ''))])
+
+    @classmethod
+    def load(cls, path, tag_descriptions=None, tag_names=None):
+        """lexicon file {tag: [term, ...]}, plus the description synonyms if given"""
+        with open(path, encoding='utf-8') as f:
+            extra = json.load(f)
+        entries = []
+        if tag_descriptions:
+            tags = tag_names or list(tag_descriptions)
+            entries += [(term, tag) for tag in tags
+                        for term in terms_from_description(tag_descriptions.get(tag, ''))]
+        entries += [(term, tag) for tag, terms in extra.items()
+                    if tag_names is None or tag in tag_names for term in terms]
+        return cls(entries)
+
+    def __len__(self):
+        return len(self.tags)
+
+    def annotate(self, text):
+        """lexicon hits → [{'tag', 'start', 'end', 'keyword', 'negated'}, ...] by start"""
+        if not text:
+            return []
+        norm, pos_map = collapse_whitespace(text)
+        spans = []
+        for s, e, key in mck.select_longest(self.ac.finditer(norm)):
+            start, end = pos_map[s], pos_map[e - 1] + 1
+            negated = is_negated(start, end, text)
+            spans.extend({'tag': tag, 'start': start, 'end': end, 'keyword': text[start:end],
+                          'negated': negated} for tag in self.tags[key])
+        return spans
+
+    def coverage(self, text, spans=None):
+        """share of the content words of `text` inside lexicon hits (1.0 if it has none)"""
+        spans = self.annotate(text) if spans is None else spans
+        words = [m for m in WORD.finditer(text) if m.group().lower() not in STOPWORDS]
+        if not words:
+            return 1.0
+        inside = sum(any(sp['start'] <= m.start() and m.end() <= sp['end'] for sp in spans)
+                     for m in words)
+        return inside / len(words)
+
+    def covers(self, text, threshold=COVER_THRESHOLD):
+        """True if the lexicon alone explains `text`: a hit, and coverage >= threshold"""
+        spans = self.annotate(text)
+        return bool(spans) and self.coverage(text, spans) >= threshold
+
+    def llm_anns(self, text):
+        """hits as [{'keyword', 'tag'}, ...], the shape call_llm returns, no duplicates"""
+        seen = {}
+        for sp in self.annotate(text):
+            seen.setdefault((sp['keyword'].lower(), sp['tag']), {'keyword': sp['keyword'], 'tag': sp['tag']})
+        return list(seen.values())
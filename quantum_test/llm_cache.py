@@ -0,0 +1,110 @@
+"""
+Persistent on-disk cache of Ollama responses
+
+The key is a SHA-256 of (model, full prompt text, format, generation options),
+so any change to the prompt or options is a miss, while re-running an
+ablation after a scoring-code change costs zero LLM calls.
+
+Entries live in one SQLite file shared by eval_llm, eval_quick, eval_one
+and debug_fp. When the stored bytes exceed `max_bytes`, the least recently
+used entries are evicted. The byte total is kept in memory (summed once on
+open), and summed again only when it says the limit is crossed, since other
+processes may have written to the same file.
+
+    cache = LLMCache()                      # quantum_test/.llm_cache/responses.sqlite
+    client = OllamaClient(cache=cache)
+"""
+
+import hashlib, json, os, sqlite3, threading, time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.llm_cache', 'responses.sqlite')
+DEFAULT_MAX_BYTES  = 512 * 1024 * 1024
+
+def make_key(model, prompt, fmt=None, options=None):
+    payload = json.dumps({'model': model, 'prompt': prompt, 'format': fmt, 'options': options or {}},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class LLMCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = self.misses = self.evictions = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # one connection shared by the client's worker threads
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS responses ('
+                         'key TEXT PRIMARY KEY, model TEXT, value TEXT, size INTEGER, '
+                         'created REAL, accessed REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS idx_accessed ON responses (accessed)')
+        self._db.commit()
+        self._total = self._sum()
+
+    def _sum(self):
+        return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def _size(self, key):
+        row = self._db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def get(self, key):
+        """cached response dict or None"""
+        with self._lock:
+            row = self._db.execute('SELECT value FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute('UPDATE responses SET accessed = ? WHERE key = ?', (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, model, response):
+        value = json.dumps(response, ensure_ascii=False)
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        with self._lock:
+            self._total += size - self._size(key)
+            self._db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                             (key, model, value, size, now, now))
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+        total = self._total = self._sum()
+        if total <= self.max_bytes:
+            return
+        # drop least recently used entries until under the limit
+        for key, size in self._db.execute('SELECT key, size FROM responses ORDER BY accessed').fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            total -= size
+            self.evictions += 1
+        self._total = total
+
+    def delete(self, key):
+        with self._lock:
+            self._total -= self._size(key)
+            self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            n, size = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        return {'entries': n, 'bytes': size, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions}
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM responses')
+            self._db.commit()
+            self._total = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,259 @@
+"""
+Single-pass keyword localisation
+
+get_locs() compiled a regex per LLM keyword and scanned the whole text with
+each of them, so a document was read once per keyword. Here all keywords
+of a document go into one Aho-Corasick automaton (scripts/matcher_kits.py)
+and the text is scanned once.
+
+Same matching rules as get_locs():
+  - case-insensitive
+  - whitespace-tolerant: a space in the keyword matches any run of
+    whitespace in the text (the text is scanned with whitespace runs
+    collapsed, and offsets are mapped back)
+  - substring match, no word boundary ("pain" hits "painful")
+  - occurrences of one keyword don't overlap each other (like re.finditer)
+
+    spans = locate_all(llm_anns, text, TAG_NAMES)
+    # → [{'tag', 'start', 'end', 'keyword'}, ...] in (start, keyword order)
+
+A keyword that isn't in the text verbatim ("diarhea", "headaches" for
+"headache" hits, but "head aches" or "vomitting" don't) was lost. With
+fuzzy=True, the keywords the exact pass found nothing for are searched
+again with Myers' bit-parallel approximate matching: one pass over the text
+per keyword, the pattern's state updated with a few integer bit operations per char,
+giving the ends of substrings within max_errors edits. Each hit is then
+snapped to word boundaries and checked with the edit distance (also Myers).
+Up to FUZZY_MAX_ERRORS edits, one per FUZZY_CHARS_PER_ERROR chars of the
+keyword, so short keywords never match fuzzily. Fuzzy spans carry 'edits'.
+Keywords found verbatim never reach this path, so it costs nothing then.
+
+    spans = locate_all(llm_anns, text, TAG_NAMES, fuzzy=True)
+"""
+
+import os, re, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import matcher_kits as mck
+
+WHITESPACE = re.compile(r'\s+')
+
+def collapse_whitespace(text):
+    """(text with whitespace runs as one space, original offset of each char)"""
+    out, pos_map, last = [], [], 0
+    for m in WHITESPACE.finditer(text):
+        out.append(text[last:m.start()])
+        pos_map.extend(range(last, m.start()))
+        out.append(' ')
+        pos_map.append(m.start())
+        last = m.end()
+    out.append(text[last:])
+    pos_map.extend(range(last, len(text)))
+    return ''.join(out), pos_map
+
+def normalize_keyword(keyword):
+    return WHITESPACE.sub(' ', keyword)
+
+class KeywordLocalizer:
+    def __init__(self, keywords):
+        """keywords: [(keyword, value), ...]; every value of a matched keyword is returned"""
+        self.ac = mck.AhoCorasick(ignore_case=True, word_boundary=False)
+        self.values = {}
+        for keyword, value in keywords:
+            key = mck.fold_case(normalize_keyword(keyword))
+            if key not in self.values:
+                self.values[key] = []
+                self.ac.add(key, key)
+            self.values[key].append(value)
+        self.ac.build()
+
+    def finditer(self, text):
+        """(start, end, key) of every keyword occurrence, in original text offsets"""
+        norm, pos_map = collapse_whitespace(text)
+        last_end = {}
+        for start, end, key in self.ac.finditer(norm):
+            # same keyword: keep non-overlapping occurrences, leftmost first
+            if start < last_end.get(key, 0):
+                continue
+            last_end[key] = end
+            yield pos_map[start], pos_map[end - 1] + 1, key
+
+    def locate(self, text):
+        """[(start, end, value), ...] for every value of every occurrence"""
+        return [(s, e, v) for s, e, key in self.finditer(text) for v in self.values[key]]
+
+def locate_all(llm_anns, text, tag_names=None, fuzzy=False):
+    """LLM keyword/tag pairs → located spans, one automaton pass over the text
+
+    Sorted by start, then by the order of the annotations, which is the
+    order the old per-keyword loop produced after its sort by start.
+    With fuzzy=True, keywords without an exact hit go through fuzzy_locate.
+    """
+    anns = [(i, a) for i, a in enumerate(llm_anns) if tag_names is None or a['tag'] in tag_names]
+    if not anns or not text:
+        return []
+    loc = KeywordLocalizer([(a['keyword'], i) for i, a in anns])
+    found = sorted((s, i, e, None) for s, e, i in loc.locate(text))
+    if fuzzy:
+        hit = {i for _, i, _, _ in found}
+        missed = [(i, a) for i, a in anns if i not in hit]
+        if missed:
+            norm, pos_map = collapse_whitespace(text)
+            folded = mck.fold_case(norm)
+            for i, a in missed:
+                for s, e, d in fuzzy_locate(mck.fold_case(normalize_keyword(a['keyword']).strip()), folded):
+                    found.append((pos_map[s], i, pos_map[e - 1] + 1, d))
+            found.sort(key=lambda f: f[:3])
+    out = []
+    for s, i, e, d in found:
+        span = {'tag': llm_anns[i]['tag'], 'start': s, 'end': e, 'keyword': llm_anns[i]['keyword']}
+        if d is not None:
+            span['edits'] = d
+        out.append(span)
+    return out
+
+# ── Fuzzy fallback ──────────────────────────────────────────────────────
+FUZZY_MAX_ERRORS = 2        # edits at most, whatever the keyword length
+FUZZY_CHARS_PER_ERROR = 5   # one edit allowed per this many keyword chars
+
+def fuzzy_max_errors(keyword):
+    return min(FUZZY_MAX_ERRORS, len(keyword) // FUZZY_CHARS_PER_ERROR)
+
+def _peq(pattern):
+    """bit mask of the positions of each char in the pattern"""
+    peq = {}
+    for i, c in enumerate(pattern):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    return peq
+
+def _myers(pattern, text, search):
+    """Myers (1999) bit-vector edit distance, yields (end, distance) after every char of text
+
+    search=True:  distance of the best substring of text ending there (the
+                  pattern may start anywhere)
+    search=False: distance between the pattern and text[:end]
+    """
+    m = len(pattern)
+    peq, full, high = _peq(pattern), (1 << m) - 1, 1 << (m - 1)
+    pv, mv, score = full, 0, m
+    for j, c in enumerate(text):
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = ((ph << 1) | (0 if search else 1)) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+        yield j + 1, score
+
+def edit_distance(a, b):
+    """Levenshtein distance of two strings"""
+    if not a or not b:
+        return len(a) + len(b)
+    score = len(a)
+    for _, score in _myers(a, b, search=False):
+        pass
+    return score
+
+def fuzzy_locate(keyword, text, max_errors=None):
+    """[(start, end, edits), ...] of word-bounded, non-overlapping substrings of
+    `text` within max_errors edits of `keyword` (both already case-folded)"""
+    k = fuzzy_max_errors(keyword) if max_errors is None else max_errors
+    m = len(keyword)
+    if not k or m <= k:
+        return []
+    # runs of consecutive ends within k edits, each scored at its best end
+    runs, prev = [], None
+    for end, d in _myers(keyword, text, search=True):
+        if d > k:
+            continue
+        if prev is not None and end == prev + 1 and runs:
+            if d < runs[-1][1]:
+                runs[-1] = (end, d)
+        else:
+            runs.append((end, d))
+        prev = end
+
+    cands = []
+    for end, _ in runs:
+        # snap to word boundaries around the hit, keep the closest alignment
+        best = None
+        for e in range(max(1, end - k), min(len(text), end + k) + 1):
+            for s in range(max(0, e - m - k), e - max(1, m - k) + 1):
+                if not mck.is_word_boundary(text, s, e):
+                    continue
+                d = edit_distance(keyword, text[s:e])
+                if d <= k and (best is None or (d, abs(e - s - m), s) < best[0]):
+                    best = ((d, abs(e - s - m), s), (s, e, d))
+        if best is not None:
+            cands.append(best[1])
+
+    out, last_end = [], 0
+    for s, e, d in sorted(set(cands)):
+        if s >= last_end:
+            out.append((s, e, d))
+            last_end = e
+    return out
+
+# ── Dedupe ──────────────────────────────────────────────────────────────
+DEDUPE_POLICIES = ('first', 'longest', 'merge')
+
+def _overlap(a, b):
+    return a['start'] < b['end'] and b['start'] < a['end']
+
+def dedupe_spans(preds, policy='first'):
+    """drop overlapping predictions of the same tag, sorted by start in O(n log n)
+
+    first   — the earliest span wins, later ones overlapping it are dropped
+              (same output as the old any(...) loop over the kept spans)
+    longest — within each run of overlapping spans, the longest ones win
+    merge   — each run of overlapping spans becomes one span covering all
+
+    Kept spans of one tag never overlap, so only the last kept span (the
+    one with the running max end) has to be checked.
+    """
+    if policy not in DEDUPE_POLICIES:
+        raise ValueError(f"unknown dedupe policy {policy!r}, use one of {DEDUPE_POLICIES}")
+    preds = sorted(preds, key=lambda p: p['start'])   # stable: ties keep the input order
+
+    if policy == 'first':
+        last, kept = {}, []
+        for p in preds:
+            k = last.get(p['tag'])
+            if k is not None and _overlap(k, p):
+                continue
+            last[p['tag']] = p
+            kept.append(p)
+        return kept
+
+    # runs of overlapping spans per tag, by the running max end
+    runs, open_run = [], {}
+    for p in preds:
+        run = open_run.get(p['tag'])
+        if run is not None and p['start'] < run['end']:
+            run['spans'].append(p)
+            run['end'] = max(run['end'], p['end'])
+        else:
+            run = {'spans': [p], 'end': p['end']}
+            open_run[p['tag']] = run
+            runs.append(run)
+
+    kept = []
+    for run in runs:
+        spans = run['spans']
+        if policy == 'merge':
+            kept.append(dict(spans[0], end=run['end']))
+            continue
+        picked = []
+        for p in sorted(spans, key=lambda p: p['start'] - p['end']):   # longest first, stable
+            if not any(_overlap(p, q) for q in picked):
+                picked.append(p)
+        kept.extend(sorted(picked, key=lambda p: p['start']))
+    kept.sort(key=lambda p: p['start'])
+    return kept
@@ -0,0 +1,368 @@
+"""
+Local stand-in for the Ollama /api/chat and /api/embed endpoints
+
+Lets the eval scripts run (and be benchmarked) without a GPU or models.
+It listens on the same port as Ollama by default, so the scripts work
+unchanged:
+
+    python mock_ollama.py                                 # heuristic answers
+    python mock_ollama.py --latency 2.0 --jitter 0.5 --slots 4
+    python mock_ollama.py --recorded .llm_cache/responses.sqlite
+    python mock_ollama.py --script answers.json --error-rate 0.05
+    python mock_ollama.py --truncate-rate 0.2      # replies cut off like at num_predict
+
+Where the answer comes from, in order:
+  1. --recorded: a response stored by LLMCache for the same (model, prompt,
+     format, options) key — replays a real run exactly
+  2. --script: a JSON file of {"<keyword in text>": "<tag>"} pairs; every
+     keyword found in the document text is returned
+  3. heuristic: every tag name (underscores as spaces) found in the text
+
+Like Ollama, only `--slots` requests are processed at once (OLLAMA_NUM_PARALLEL);
+the rest wait in a queue, and with `--max-queue` the overflow gets a 503.
+Latency is per request, `latency ± jitter` seconds (seeded for repeatability).
+On top of that, `--prefill` seconds per prompt token, except for the prefix
+shared with a recent prompt, which is free like Ollama's slot cache, and
+`--load-time` whenever the model is not loaded (first use, keep_alive
+expired, or unloaded for another model: with `--max-loaded`, like
+OLLAMA_MAX_LOADED_MODELS, loading a model evicts the least recently used). The timing fields of the reply (load_duration, prompt_eval_count,
+...) are filled in accordingly. A streamed request ("stream": true, Ollama's
+default) gets its first token after a fifth of the latency and the rest of
+the content in NDJSON pieces.
+
+/api/embed answers with hashed bag-of-words vectors (EMBED_DIM buckets,
+L2-normalised), so texts sharing words get a higher cosine, and doesn't
+wait for a slot.
+
+It can also run inside a benchmark script:
+
+    with MockOllama(latency=0.5, slots=4) as mock:
+        client = OllamaClient(mock.url, concurrency=4)
+"""
+
+import argparse, json, math, os, random, re, sqlite3, threading, time, zlib
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from llm_cache import make_key
+from batching import split_batch_prompt
+
+DEFAULT_PORT = 11434
+STREAM_FIRST_TOKEN = 0.2   # share of the latency before the first streamed token
+STREAM_PIECE_CHARS = 8     # content chars per streamed chunk (a few tokens)
+EMBED_DIM = 256            # buckets of the /api/embed vectors
+
+# ── Answers ─────────────────────────────────────────────────────────────
+def prompt_parts(prompt):
+    """(tag names, document text) from a build_prompt() style prompt"""
+    m = re.search(r'ONLY use these exact tag names: (.*)', prompt)
+    tag_names = [t.strip() for t in m.group(1).split(',')] if m else []
+    text = prompt.rsplit('Text:\n', 1)[-1]
+    return tag_names, text
+
+def heuristic_annotations(prompt):
+    tag_names, _ = prompt_parts(prompt)
+    pairs = [(t.replace('_', ' '), t) for t in tag_names]
+    return _annotate_docs(prompt, pairs)
+
+def scripted_annotations(prompt, script):
+    return _annotate_docs(prompt, list(script.items()))
+
+def _annotate_docs(prompt, pairs):
+    """every (keyword, tag) found in the text; per doc ID for a batch prompt"""
+    docs = split_batch_prompt(prompt)
+    if not docs:
+        docs = [(None, prompt_parts(prompt)[1])]
+    anns = []
+    for doc_id, text in docs:
+        low = text.lower()
+        for kw, tag in pairs:
+            if kw.lower() in low:
+                anns.append({"keyword": kw, "tag": tag} if doc_id is None
+                            else {"doc": doc_id, "keyword": kw, "tag": tag})
+    return anns
+
+def hashed_embedding(text, dim=EMBED_DIM):
+    """bag of lower-cased words hashed into `dim` buckets, L2-normalised"""
+    vec = [0.0] * dim
+    for word in re.findall(r'[a-z0-9]+', text.lower()):
+        vec[zlib.crc32(word.encode('utf-8')) % dim] += 1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+class MockResponder:
+    def __init__(self, recorded=None, script=None):
+        self.script = script
+        self._db = None
+        if recorded:
+            self._db = sqlite3.connect(recorded, check_same_thread=False)
+            self._lock = threading.Lock()
+
+    def answer(self, body):
+        """request body → (response JSON, source)"""
+        model = body.get('model', '')
+        prompt = body['messages'][-1]['content']
+        if self._db is not None:
+            key = make_key(model, prompt, body.get('format'), body.get('options'))
+            with self._lock:
+                row = self._db.execute('SELECT value FROM responses WHERE key = ?', (key,)).fetchone()
+            if row:
+                return json.loads(row[0]), 'recorded'
+        if self.script is not None:
+            anns, source = scripted_annotations(prompt, self.script), 'script'
+        else:
+            anns, source = heuristic_annotations(prompt), 'heuristic'
+        content = json.dumps({"annotations": anns})
+        return {"model": model, "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                "message": {"role": "assistant", "content": content},
+                "done": True, "done_reason": "stop",
+                "prompt_eval_count": len(prompt) // 4, "eval_count": len(content) // 4}, source
+
+def parse_keep_alive(value, default=300.0):
+    """Ollama keep_alive ("30m", "90s", "1h", seconds, -1 = forever) → seconds"""
+    if value is None or value == '':
+        return default
+    if isinstance(value, (int, float)):
+        return float('inf') if value < 0 else float(value)
+    m = re.fullmatch(r'(-?\d+(?:\.\d+)?)\s*([smh]?)', str(value).strip())
+    if not m:
+        return default
+    n = float(m.group(1))
+    return float('inf') if n < 0 else n * {'': 1, 's': 1, 'm': 60, 'h': 3600}[m.group(2)]
+
+def stream_chunks(data, duration, piece_chars=STREAM_PIECE_CHARS):
+    """full chat response → NDJSON chunks like a streamed Ollama reply, spread over duration"""
+    content = data["message"]["content"]
+    pieces = [content[i:i + piece_chars] for i in range(0, len(content), piece_chars)] or ['']
+    for piece in pieces:
+        time.sleep(duration / len(pieces))
+        yield {"model": data.get("model", ""), "created_at": data.get("created_at", ""),
+               "message": {"role": "assistant", "content": piece}, "done": False}
+    final = {k: v for k, v in data.items() if k != "message"}
+    final.update({"message": {"role": "assistant", "content": ""}, "done": True})
+    yield final
+
+# ── Server ──────────────────────────────────────────────────────────────
+class MockOllama:
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, latency=0.0, jitter=0.0,
+                 error_rate=0.0, slots=4, max_queue=0, seed=0, recorded=None, script=None,
+                 prefill=0.0, load_time=0.0, max_loaded=0, truncate_rate=0.0):
+        self.latency = latency
+        self.prefill = prefill
+        self.load_time = load_time
+        self.max_loaded = max_loaded
+        self._loaded = {}                       # model → unload time, least recently used first
+        self._recent = deque(maxlen=slots)      # last prompt of each slot, for prefix reuse
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.slots = slots
+        self.max_queue = max_queue
+        self.responder = MockResponder(recorded, script)
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._slot_sem = threading.Semaphore(slots)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "rejected": 0, "loads": 0, "truncated": 0,
+                      "in_flight": 0, "max_in_flight": 0, "waiting": 0, "max_waiting": 0,
+                      "by_source": {}}
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread = None
+
+    def _draw(self):
+        """(latency, fail?, truncate?) for one request"""
+        with self._rng_lock:
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            return delay, self._rng.random() < self.error_rate, self._rng.random() < self.truncate_rate
+
+    def _load(self, model, keep_alive):
+        """seconds spent loading the model; it stays loaded for keep_alive"""
+        now = time.time()
+        with self._lock:
+            load = 0.0 if self._loaded.get(model, 0) > now else self.load_time
+            self._loaded.pop(model, None)
+            if load and self.max_loaded:
+                for other in list(self._loaded)[:max(0, len(self._loaded) - self.max_loaded + 1)]:
+                    del self._loaded[other]     # swapped out
+            self._loaded[model] = now + load + parse_keep_alive(keep_alive)
+            if load:
+                self.stats['loads'] += 1
+        return load
+
+    def _prefill(self, prompt):
+        """(prompt tokens evaluated, seconds); a prefix shared with a recent prompt is free"""
+        with self._lock:
+            cached = max((len(os.path.commonprefix([prompt, p])) for p in self._recent), default=0)
+            self._recent.append(prompt)
+        n_eval = (len(prompt) - cached) // 4
+        return n_eval, n_eval * self.prefill
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self.stats[key] += delta
+            peak = 'max_' + key
+            if peak in self.stats:
+                self.stats[peak] = max(self.stats[peak], self.stats[key])
+
+    def chat(self, body, send_stream=None):
+        """→ (status, response JSON)
+
+        With send_stream, a 200 reply is streamed instead: the slot is held
+        while the content goes out in NDJSON pieces, send_stream(chunks) writes
+        them, and (200, None) is returned.
+        """
+        self._count('requests')
+        with self._lock:
+            queue_full = self.max_queue and self.stats['waiting'] >= self.max_queue \
+                and self.stats['in_flight'] >= self.slots
+        if queue_full:
+            self._count('rejected')
+            return 503, {"error": "server busy, please try again.  maximum pending requests exceeded"}
+
+        self._count('waiting')
+        with self._slot_sem:
+            self._count('waiting', -1)
+            self._count('in_flight')
+            try:
+                t0 = time.time()
+                delay, fail, truncate = self._draw()
+                load = self._load(body.get('model', ''), body.get('keep_alive'))
+                prompt = ''.join(m.get('content', '') for m in body['messages'])
+                n_eval, prefill = self._prefill(prompt)
+                # streamed: a fifth of the latency before the first token
+                time.sleep(load + prefill + (delay if send_stream is None else delay * STREAM_FIRST_TOKEN))
+                if fail:
+                    self._count('errors')
+                    return 500, {"error": "mock: injected failure"}
+                data, source = self.responder.answer(body)
+                if truncate:
+                    # out of tokens halfway through the JSON
+                    content = data["message"]["content"]
+                    data = dict(data, message=dict(data["message"], content=content[:len(content) // 2]),
+                                done_reason="length")
+                    self._count('truncated')
+                data = dict(data, load_duration=int(load * 1e9), prompt_eval_count=n_eval,
+                            prompt_eval_duration=int(prefill * 1e9), eval_duration=int(delay * 1e9),
+                            total_duration=int((time.time() - t0 + (0 if send_stream is None else
+                                                (1 - STREAM_FIRST_TOKEN) * delay)) * 1e9))
+                with self._lock:
+                    self.stats['by_source'][source] = self.stats['by_source'].get(source, 0) + 1
+                if send_stream is None:
+                    return 200, data
+                send_stream(stream_chunks(data, delay * (1 - STREAM_FIRST_TOKEN)))
+                return 200, None
+            finally:
+                self._count('in_flight', -1)
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'   # keep-alive, same as Ollama
+
+            def _send(self, status, data):
+                out = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def _send_stream(self, chunks):
+                # chunked transfer encoding, one NDJSON line per chunk
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for chunk in chunks:
+                    line = (json.dumps(chunk) + '\n').encode('utf-8')
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+                    self.wfile.flush()
+                self.wfile.write(b'0\r\n\r\n')
+
+            def do_GET(self):
+                if self.path == '/api/version':
+                    self._send(200, {"version": "mock"})
+                elif self.path == '/api/tags':
+                    self._send(200, {"models": []})
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if self.path == '/api/embed':
+                    mock._count('requests')
+                    texts = body.get('input') or []
+                    texts = [texts] if isinstance(texts, str) else texts
+                    self._send(200, {"model": body.get('model', ''),
+                                     "embeddings": [hashed_embedding(t) for t in texts]})
+                elif self.path != '/api/chat':
+                    self._send(404, {"error": "not found"})
+                elif not body.get('messages'):
+                    self._send(400, {"error": "messages is required"})
+                else:
+                    # Ollama streams unless told otherwise
+                    status, data = mock.chat(body, self._send_stream if body.get('stream', True) else None)
+                    if data is not None:
+                        self._send(status, data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+# ── Main ────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mock Ollama /api/chat server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='± seconds added to the latency')
+    parser.add_argument('--prefill', type=float, default=0.0, help='seconds per prompt token not in the prefix cache')
+    parser.add_argument('--load-time', type=float, default=0.0, help='seconds to load a model that is not loaded')
+    parser.add_argument('--max-loaded', type=int, default=0, help='models loaded at once, 0 = unlimited')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 500')
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help='fraction of replies cut off halfway')
+    parser.add_argument('--slots', type=int, default=4, help='parallel requests, like OLLAMA_NUM_PARALLEL')
+    parser.add_argument('--max-queue', type=int, default=0, help='waiting requests before 503, 0 = unlimited')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--recorded', default=None, help='LLMCache SQLite file to replay')
+    parser.add_argument('--script', default=None, help='JSON file of {keyword: tag}')
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script, encoding='utf-8') as f:
+            script = json.load(f)
+
+    mock = MockOllama(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                      args.slots, args.max_queue, args.seed, args.recorded, script, args.prefill, args.load_time,
+                      args.max_loaded, args.truncate_rate)
+    print(f"Mock Ollama on {mock.url}  (latency={args.latency}±{args.jitter}s, "
+          f"slots={args.slots}, error_rate={args.error_rate})")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        s = mock.stats
+        print(f"\n{s['requests']} requests, {s['errors']} errors, {s['rejected']} rejected, {s['loads']} loads, "
+              f"max in flight {s['max_in_flight']}, max waiting {s['max_waiting']}, by source {s['by_source']}")
+        mock.server.server_close()
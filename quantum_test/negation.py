@@ -0,0 +1,128 @@
+"""
+Negation scopes precomputed once per document
+
+is_negated() sliced a 60-char window before and a 30-char window after every
+predicted span and re-ran the breaker and trigger regexes on it, so the same
+text was scanned again for every span. Here a document is scanned once for
+triggers and scope breakers, ConText/NegEx style, and the scopes become two
+sorted interval lists; checking a span is a bisect.
+
+Rule types (ConText):
+  forward   — trigger before the concept ("denies", "no ", "negative for");
+              its scope runs from the trigger to the next breaker, at most
+              `forward_window` chars after the trigger start
+  backward  — trigger after the concept ("absent", "not found"); its scope
+              runs back to the previous breaker, at most `backward_window`
+              chars before the trigger end
+  pseudo    — looks like a trigger but isn't ("no change", "not only");
+              triggers inside a pseudo match are ignored
+  terminate — scope breaker (sentence end, "but", "however", ...)
+
+A forward scope is not cut by commas, so "No fever, chills, or cough." negates
+all three concepts. The old window check missed "fever" there, because
+"\\bno \\b" can't match at the end of the pre-window.
+
+    engine = NegationEngine()                   # or NegationEngine(rules=[...])
+    neg = engine.scan(text)                     # once per document, cached
+    neg.is_negated(start, end)
+"""
+
+import bisect, functools, re
+
+DEFAULT_RULES = [
+    (r"\bdenies?\b",        'forward'),
+    (r"\bno \b",            'forward'),
+    (r"\bnot \b",           'forward'),
+    (r"\bdoesn't have\b",   'forward'),
+    (r"\bdid not have\b",   'forward'),
+    (r"\bwithout\b",        'forward'),
+    (r"\bnegative for\b",   'forward'),
+    (r"\bno evidence of\b", 'forward'),
+    (r"\babsent\b",         'forward'),
+    (r"\babsent\b",         'backward'),
+    (r"\bnot found\b",      'backward'),
+    (r"\bnot present\b",    'backward'),
+    (r"\bnone\b",           'backward'),
+    (r"\b: none\b",         'backward'),
+    (r"\bnegative\b",       'backward'),
+    (r"[.!?]",              'terminate'),
+    (r"\b(?:but|however|although|except|yet|while)\b", 'terminate'),
+]
+RULE_TYPES = ('forward', 'backward', 'pseudo', 'terminate')
+
+def _union(patterns):
+    if not patterns:
+        return None
+    # longest first, so "no evidence of" wins over "no " at the same start
+    return re.compile('|'.join(f'(?:{p})' for p in sorted(patterns, key=len, reverse=True)), re.IGNORECASE)
+
+def _merge(intervals):
+    """[(start, end), ...] → sorted, non-overlapping (starts, ends)"""
+    starts, ends = [], []
+    for s, e in sorted(intervals):
+        if e <= s:
+            continue
+        if ends and s <= ends[-1]:
+            ends[-1] = max(ends[-1], e)
+        else:
+            starts.append(s)
+            ends.append(e)
+    return starts, ends
+
+def _covers(intervals, pos):
+    starts, ends = intervals
+    i = bisect.bisect_right(starts, pos) - 1
+    return i >= 0 and pos < ends[i]
+
+class NegationMap:
+    def __init__(self, forward, backward):
+        self.forward = _merge(forward)     # positions a concept may start at
+        self.backward = _merge(backward)   # positions a concept may end at
+
+    def is_negated(self, start, end):
+        return _covers(self.forward, start) or _covers(self.backward, end)
+
+class NegationEngine:
+    def __init__(self, rules=DEFAULT_RULES, forward_window=60, backward_window=30):
+        """rules: [(regex, type), ...] with type in RULE_TYPES"""
+        by_type = {t: [] for t in RULE_TYPES}
+        for pattern, rule_type in rules:
+            if rule_type not in by_type:
+                raise ValueError(f"unknown rule type {rule_type!r}, use one of {RULE_TYPES}")
+            by_type[rule_type].append(pattern)
+        self.patterns = {t: _union(p) for t, p in by_type.items()}
+        self.forward_window = forward_window
+        self.backward_window = backward_window
+        self.scan = functools.lru_cache(maxsize=64)(self._scan)
+
+    def _find(self, rule_type, text):
+        rx = self.patterns[rule_type]
+        return [m.span() for m in rx.finditer(text)] if rx else []
+
+    def _scan(self, text):
+        pseudo = _merge(self._find('pseudo', text))
+        breaks = self._find('terminate', text)
+        break_starts = [s for s, _ in breaks]
+        break_ends = sorted(e for _, e in breaks)
+
+        def real(spans):
+            return [(s, e) for s, e in spans if not (_covers(pseudo, s) or _covers(pseudo, e - 1))]
+
+        forward = []
+        for s, e in real(self._find('forward', text)):
+            # up to the first breaker after the trigger
+            i = bisect.bisect_left(break_starts, e)
+            stop = break_starts[i] if i < len(break_starts) else len(text)
+            forward.append((e, min(s + self.forward_window + 1, stop)))
+        backward = []
+        for s, e in real(self._find('backward', text)):
+            # back to the last breaker before the trigger
+            i = bisect.bisect_right(break_ends, s) - 1
+            lo = break_ends[i] if i >= 0 else 0
+            backward.append((max(e - self.backward_window, lo), s + 1))
+        return NegationMap(forward, backward)
+
+NEGATION = NegationEngine()
+
+def is_negated(start, end, text, engine=NEGATION):
+    return engine.scan(text).is_negated(start, end)
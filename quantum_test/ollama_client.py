@@ -0,0 +1,707 @@
+"""
+Shared Ollama client for the LLM evaluation scripts
+
+Every eval script used to call /api/chat with a blocking requests.post,
+one document at a time, so the parallel slots of the local server were idle.
+This client keeps one pooled HTTP session (connection reuse), runs the
+requests in a bounded thread pool, and collects the results in the same
+order as the input documents. The number of requests in flight is capped
+by the scheduler below, for every event loop that uses the client.
+
+    client = OllamaClient(concurrency=4, timeout=180)
+    results = client.annotate_many(model, texts, TAG_NAMES, TAG_DESCRIPTIONS)
+
+The concurrency should match OLLAMA_NUM_PARALLEL on the server side;
+more in-flight requests than slots only queue on the server.
+
+Documents longer than one prompt go through `annotate_chunked`, which
+splits them into overlapping sentence windows (see chunking.py).
+
+`annotate_batched` packs several short documents into one prompt so the
+tag descriptions are sent once per batch (see batching.py).
+
+`annotate_sentences` sends only sentences not seen before, batched, and
+caches the results by sentence hash (see sentence_cache.py); with `triage`
+(triage.py) sentences scored below `threshold` are not sent at all.
+
+Prompts come from templates compiled once per tag set (prompt_templates.py),
+so all documents share one static prefix and the server can reuse its KV
+cache; `keep_alive` stops the model from being unloaded between documents,
+and the load / prompt-eval times reported by Ollama are kept in `metrics`.
+
+Pass `cache=LLMCache()` to answer repeated (model, prompt, options)
+requests from disk instead of the server.
+
+Server requests go through a ModelScheduler (scheduler.py), which holds the
+in-flight limit and drains one model's requests before letting another
+model in, so several models don't make the server swap weights back and
+forth. Pass one `scheduler` to several clients to share it.
+
+Replies are constrained to the template's JSON schema (`structured=True`,
+Ollama's `format`), so they parse with one json.loads and are validated
+against the tag names, streamed ones too. A reply that still breaks (cut
+off, server error) is sent again up to `retries` more times (RETRIES by
+default), and of a batch prompt only the parts it didn't finish; a valid
+empty reply is final. Malformed replies, retries and the generated tokens
+thrown away are counted in `output_stats`. With `strict=True` the
+annotate_* calls raise instead of returning what was salvaged when any
+request still failed, so a caller that stores results (the eval grid)
+doesn't keep a half-failed run.
+
+With `stage_log=StageLog(...)` (stage_metrics.py) every request is also
+logged per document: queue wait, load, prompt eval and generation time and
+token counts. The annotate_* calls take `doc_ids` to label the records.
+"""
+
+import asyncio, json, re, threading, time, weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from llm_cache import make_key
+from prompt_templates import get_template
+from chunking import estimate_tokens, make_windows, merge_window_results
+from batching import build_batch_prompt, pack_batches, split_batch_results
+from scheduler import LOAD_THRESHOLD_NS, ModelScheduler
+from sentence_cache import SentenceCache, segment, sentence_key
+
+OLLAMA_URL = "http://localhost:11434"
+KEEP_ALIVE = "30m"
+EMBED_BATCH = 32   # texts per /api/embed request
+RETRIES = 1        # extra tries after a broken reply
+
+# timing fields of an Ollama response, in nanoseconds
+METRIC_FIELDS = ["total_duration", "load_duration", "prompt_eval_duration", "eval_duration"]
+COUNT_FIELDS  = ["prompt_eval_count", "eval_count"]
+
+# ── Prompt ──────────────────────────────────────────────────────────────
+def build_prompt(text, tag_names, tag_descriptions=None, max_chars=2000):
+    """keyword/tag extraction prompt; descriptions block only when given, max_chars=None sends all text"""
+    return get_template(tag_names, tag_descriptions).render(text[:max_chars])
+
+def decode_annotations(content, tag_names=None, doc_ids=None):
+    """LLM message content → (annotations, {'ok', 'invalid', 'wasted_chars'})
+
+    A schema-constrained reply is plain JSON, one json.loads; a fenced or
+    chatty one is cleaned first. If it still doesn't parse (cut off, broken),
+    the annotation objects completed before the break are kept and the reply
+    is not ok. Items without a keyword, or with a tag / doc ID outside the
+    given ones, are dropped and counted as invalid.
+    """
+    info = {'ok': True, 'invalid': 0, 'wasted_chars': 0}
+    try:
+        data = json.loads(content)
+    except ValueError:
+        cleaned = re.sub(r'```json\s*|\s*```', '', content).strip()
+        if not cleaned.startswith('{'):
+            m = re.search(r'\{[\s\S]*\}', cleaned)
+            cleaned = m.group(0) if m else ''
+        try:
+            data = json.loads(cleaned)
+        except ValueError:
+            data = None
+    if isinstance(data, dict):
+        items = data.get('annotations') or data.get('results') or []
+    else:
+        parser = AnnotationStreamParser()
+        items = parser.feed(content)
+        info.update(ok=False, wasted_chars=len(content) - parser.end)
+    anns = []
+    for a in items if isinstance(items, list) else []:
+        if not (isinstance(a, dict) and isinstance(a.get('keyword'), str) and a['keyword'].strip()
+                and isinstance(a.get('tag'), str)) \
+                or (tag_names and a['tag'] not in tag_names) \
+                or (doc_ids and len(doc_ids) > 1 and str(a.get('doc', '')).strip() not in doc_ids):
+            info['invalid'] += 1
+            continue
+        anns.append(a)
+    return anns, info
+
+def parse_annotations(content):
+    """LLM message content → [{'keyword', 'tag'}, ...]"""
+    return decode_annotations(content)[0]
+
+def _unique(anns):
+    """annotations without repeats, e.g. after a retry answered part of them again"""
+    seen = {}
+    for a in anns:
+        seen.setdefault((str(a.get('doc', '')), a['keyword'].lower(), a['tag']), a)
+    return list(seen.values())
+
+def _check_failed(n_failed, n_total, strict, what='requests'):
+    """with `strict`, raise if any request still had no valid reply after its retries"""
+    if strict and n_failed:
+        raise RuntimeError(f"{n_failed} of {n_total} {what} got no valid reply")
+
+class AnnotationStreamParser:
+    """incremental parser for a streamed {"annotations": [{...}, ...]} reply
+
+    feed() takes the next piece of message content and returns the annotation
+    objects completed by it, so each one can be used before the reply ends.
+    With `tag_names`, objects with another tag are dropped and counted in
+    `invalid`.
+    """
+    def __init__(self, tag_names=None):
+        self.tag_names = tag_names
+        self.invalid = 0
+        self.buf = ''
+        self.pos = 0            # next char to scan
+        self.depth = 0          # {} / [] nesting outside strings
+        self.in_str = False
+        self.escape = False
+        self.obj_start = None   # start of the current object at depth 3
+        self.end = 0            # end of the last complete annotation object
+
+    def feed(self, piece):
+        self.buf += piece
+        done = []
+        buf = self.buf
+        for i in range(self.pos, len(buf)):
+            c = buf[i]
+            if self.in_str:
+                if self.escape:
+                    self.escape = False
+                elif c == '\\':
+                    self.escape = True
+                elif c == '"':
+                    self.in_str = False
+            elif c == '"':
+                self.in_str = True
+            elif c in '{[':
+                self.depth += 1
+                # top object → annotations array → annotation object
+                if self.depth == 3 and c == '{':
+                    self.obj_start = i
+            elif c in '}]':
+                if self.depth == 3 and c == '}' and self.obj_start is not None:
+                    try:
+                        ann = json.loads(buf[self.obj_start:i + 1])
+                    except ValueError:
+                        ann = None
+                    if isinstance(ann, dict) and isinstance(ann.get('keyword'), str) \
+                            and isinstance(ann.get('tag'), str):
+                        if self.tag_names and ann['tag'] not in self.tag_names:
+                            self.invalid += 1
+                        else:
+                            done.append(ann)
+                        self.end = i + 1
+                    self.obj_start = None
+                self.depth -= 1
+        self.pos = len(buf)
+        return done
+
+# ── Client ──────────────────────────────────────────────────────────────
+class OllamaClient:
+    def __init__(self, base_url=OLLAMA_URL, concurrency=4, timeout=180, options=None, cache=None,
+                 keep_alive=KEEP_ALIVE, scheduler=None, stage_log=None, structured=True):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.options = options if options is not None else {"temperature": 0}
+        self.cache = cache
+        # keep the model loaded between documents (Ollama unloads after 5m idle)
+        self.keep_alive = keep_alive
+        # at most `concurrency` requests on the server, one model at a time
+        self.scheduler = scheduler or ModelScheduler(slots=concurrency)
+        self.stage_log = stage_log
+        # send the reply's JSON schema as `format` (Ollama >= 0.5), else plain 'json'
+        self.structured = structured
+        self.metrics = []
+        self.output_stats = {"replies": 0, "malformed": 0, "invalid": 0, "retries": 0,
+                             "retried_parts": 0, "wasted_tokens": 0}
+        self._metrics_lock = threading.Lock()
+
+        # one session for all requests → keep-alive connections are reused
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # one thread pool per event loop (grid jobs run side by side, each in
+        # its own asyncio.run): a job waiting in the scheduler for another
+        # model then never takes threads away from the active model's job
+        self._executors = weakref.WeakKeyDictionary()
+        self._executors_lock = threading.Lock()
+
+    def close(self):
+        with self._executors_lock:
+            executors = list(self._executors.values())
+        for executor in executors:
+            executor.shutdown(wait=False)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ── blocking ──
+    def chat(self, model, prompt, fmt='json', options=None, doc=None, queued_at=None):
+        """one /api/chat call, returns the full response JSON (from cache if present)
+
+        `queued_at` (perf_counter) is when an async call handed the request
+        to the thread pool; the queue wait runs from there to the slot.
+        """
+        options = options or self.options
+        t0 = time.perf_counter() if queued_at is None else queued_at
+        key = None
+        if self.cache is not None:
+            key = make_key(model, prompt, fmt, options)
+            cached = self.cache.get(key)
+            if cached is not None:
+                cached['_cached'] = True
+                self._log_cached(doc, t0)
+                return cached
+        with self.scheduler.slot(model):
+            queue_s = time.perf_counter() - t0
+            resp = self.session.post(
+                f"{self.base_url}/api/chat",
+                json={"model": model, "messages": [{"role": "user", "content": prompt}],
+                      "stream": False, "format": fmt, "options": options, "keep_alive": self.keep_alive},
+                timeout=self.timeout)
+        resp.raise_for_status()
+        data = resp.json()
+        self._record(model, data, doc, time.perf_counter() - t0, queue_s)
+        if key is not None:
+            self.cache.put(key, model, data)
+        return data
+
+    def embed(self, model, texts):
+        """texts → embedding vectors (/api/embed), cached per (model, text) like chat replies"""
+        vectors, todo = [None] * len(texts), []
+        for i, text in enumerate(texts):
+            cached = self.cache.get(make_key(model, text, 'embed')) if self.cache is not None else None
+            if cached is not None:
+                vectors[i] = cached['embedding']
+            else:
+                todo.append(i)
+        for k in range(0, len(todo), EMBED_BATCH):
+            part = todo[k:k + EMBED_BATCH]
+            with self.scheduler.slot(model):
+                resp = self.session.post(
+                    f"{self.base_url}/api/embed",
+                    json={"model": model, "input": [texts[i] for i in part], "keep_alive": self.keep_alive},
+                    timeout=self.timeout)
+            resp.raise_for_status()
+            for i, vec in zip(part, resp.json()["embeddings"]):
+                vectors[i] = vec
+                if self.cache is not None:
+                    self.cache.put(make_key(model, texts[i], 'embed'), model, {'embedding': vec})
+        return vectors
+
+    def chat_stream(self, model, prompt, fmt='json', options=None, doc=None, queued_at=None):
+        """streamed /api/chat call, yields the message content piece by piece
+
+        A cached reply is yielded as one piece; a finished stream is cached
+        in the same shape as a chat() response.
+        """
+        options = options or self.options
+        t0 = time.perf_counter() if queued_at is None else queued_at
+        key = None
+        if self.cache is not None:
+            key = make_key(model, prompt, fmt, options)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._log_cached(doc, t0)
+                yield cached["message"]["content"]
+                return
+        with self.scheduler.slot(model):
+            queue_s = time.perf_counter() - t0
+            resp = self.session.post(
+                f"{self.base_url}/api/chat",
+                json={"model": model, "messages": [{"role": "user", "content": prompt}],
+                      "stream": True, "format": fmt, "options": options, "keep_alive": self.keep_alive},
+                timeout=self.timeout, stream=True)
+            with resp:
+                resp.raise_for_status()
+                pieces = []
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise RuntimeError(chunk["error"])
+                    piece = chunk.get("message", {}).get("content", "")
+                    if piece:
+                        pieces.append(piece)
+                        yield piece
+                    if chunk.get("done"):
+                        final = chunk
+                        self._record(model, final, doc, time.perf_counter() - t0, queue_s)
+                        break
+                else:
+                    raise RuntimeError("stream ended before done")
+        if key is not None:
+            final = dict(final, message={"role": "assistant", "content": ''.join(pieces)})
+            self.cache.put(key, model, final)
+
+    def stream_json(self, model, prompt, on_annotation=None, options=None, doc=None, tag_names=None,
+                    queued_at=None):
+        """streamed prompt → (annotations, timing)
+
+        on_annotation(ann) is called as soon as each annotation object is
+        complete; with `tag_names` the reply is constrained to the template's
+        schema and objects with another tag are dropped. timing has seconds to the first token, to the first
+        annotation and to the end of the reply (None if never reached).
+        """
+        t0 = time.time()
+        timing = {"first_token": None, "first_annotation": None, "total": None}
+        parser, anns = AnnotationStreamParser(tag_names), []
+        try:
+            for piece in self.chat_stream(model, prompt, self._format(tag_names), options, doc, queued_at):
+                if timing["first_token"] is None:
+                    timing["first_token"] = time.time() - t0
+                for ann in parser.feed(piece):
+                    if timing["first_annotation"] is None:
+                        timing["first_annotation"] = time.time() - t0
+                    anns.append(ann)
+                    if on_annotation is not None:
+                        on_annotation(ann)
+        except Exception as e:
+            print(f"  [LLM error] {e}")
+        timing["total"] = time.time() - t0
+        if parser.invalid:
+            self._count_output(invalid=parser.invalid)
+        return anns, timing
+
+    # ── server metrics ──
+    def _record(self, model, data, doc=None, seconds=None, queue_s=0.0):
+        """keep the load / prompt-eval / eval metrics of one server response"""
+        m = {k: data.get(k) or 0 for k in METRIC_FIELDS + COUNT_FIELDS}
+        m["model"] = model
+        with self._metrics_lock:
+            self.metrics.append(m)
+        self.scheduler.record(model, data)
+        if self.stage_log is not None:
+            self.stage_log.record(doc, "llm", seconds, model=model, queue_s=queue_s,
+                                  **{k.replace('_duration', '_s'): m[k] / 1e9 for k in METRIC_FIELDS[1:]},
+                                  **{k: m[k] for k in COUNT_FIELDS})
+
+    def _log_cached(self, doc, t0):
+        if self.stage_log is not None:
+            self.stage_log.record(doc, "llm_cache", time.perf_counter() - t0)
+
+    def metrics_summary(self, model=None):
+        """totals over all server responses so far (cached answers not included), seconds"""
+        with self._metrics_lock:
+            ms = [m for m in self.metrics if model is None or m["model"] == model]
+        out = {"requests": len(ms)}
+        for k in METRIC_FIELDS:
+            out[k.replace('_duration', '_s')] = sum(m[k] for m in ms) / 1e9
+        for k in COUNT_FIELDS:
+            out[k] = sum(m[k] for m in ms)
+        # a prompt whose prefix was cached on the server reports fewer evaluated tokens
+        out["prompt_tokens_per_s"] = out["prompt_eval_count"] / out["prompt_eval_s"] if out["prompt_eval_s"] else 0.0
+        out["loads"] = sum(1 for m in ms if m["load_duration"] > LOAD_THRESHOLD_NS)
+        return out
+
+    def _count_output(self, **deltas):
+        with self._metrics_lock:
+            for k, v in deltas.items():
+                self.output_stats[k] += v
+
+    def output_summary(self):
+        with self._metrics_lock:
+            return dict(self.output_stats)
+
+    def print_metrics(self):
+        s = self.metrics_summary()
+        if s["requests"]:
+            print(f"  [server] {s['requests']} requests: load {s['load_s']:.1f}s ({s['loads']} model loads), "
+                  f"prompt eval {s['prompt_eval_s']:.1f}s / {s['prompt_eval_count']} tok, "
+                  f"generation {s['eval_s']:.1f}s / {s['eval_count']} tok")
+        o = self.output_summary()
+        if o["replies"]:
+            print(f"  [output] {o['replies']} replies: {o['malformed']} malformed "
+                  f"({o['wasted_tokens']} generated tok thrown away), {o['invalid']} invalid items dropped, "
+                  f"{o['retries']} retries ({o['retried_parts']} batch parts re-sent)")
+        if len({m["model"] for m in self.metrics}) > 1:
+            self.scheduler.print_summary()
+
+    def _format(self, tag_names=None, doc_ids=None):
+        """`format` of a request: the reply schema, or plain 'json' without tag names / structured"""
+        if not (self.structured and tag_names):
+            return 'json'
+        template = get_template(tag_names)
+        return template.batch_schema(doc_ids) if doc_ids else template.schema
+
+    def _complete(self, model, prompt, options=None, doc=None, tag_names=None, doc_ids=None, queued_at=None):
+        """one request → (validated annotations, ok); errors are printed and give ([], False)"""
+        fmt = self._format(tag_names, doc_ids)
+        try:
+            content = self.chat(model, prompt, fmt, options, doc, queued_at)["message"]["content"]
+        except Exception as e:
+            print(f"  [LLM error] {e}")
+            return [], False
+        anns, info = decode_annotations(content, tag_names, doc_ids)
+        wasted = info['wasted_chars']
+        self._count_output(replies=1, malformed=0 if info['ok'] else 1, invalid=info['invalid'],
+                           wasted_tokens=estimate_tokens(content[len(content) - wasted:]) if wasted else 0)
+        if not info['ok'] and self.cache is not None:
+            # a broken reply must not be replayed to the retry
+            self.cache.delete(make_key(model, prompt, fmt, options or self.options))
+        return anns, info['ok']
+
+    def complete_json(self, model, prompt, options=None, doc=None, tag_names=None):
+        """prompt → parsed annotations (what could be salvaged of a broken reply)"""
+        return self._complete(model, prompt, options, doc, tag_names)[0]
+
+    # ── async ──
+    def _executor(self, loop):
+        """the `concurrency` worker threads of one event loop"""
+        with self._executors_lock:
+            executor = self._executors.get(loop)
+            if executor is None:
+                executor = self._executors[loop] = ThreadPoolExecutor(max_workers=self.concurrency)
+                weakref.finalize(loop, executor.shutdown, wait=False)
+        return executor
+
+    async def _run(self, fn, *args):
+        """fn(*args, queued_at) in the loop's threads; the queue wait starts here
+
+        The in-flight limit is the scheduler's slot, taken in the thread, so
+        it holds across every event loop that uses the client.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor(loop), fn, *args, time.perf_counter())
+
+    async def acomplete_json(self, model, prompt, retries=RETRIES, options=None, doc=None, tag_names=None):
+        """bounded async call; a broken reply is sent again up to `retries` times, a valid empty one is final"""
+        return (await self._acomplete(model, prompt, retries, options, doc, tag_names))[0]
+
+    async def _acomplete(self, model, prompt, retries=RETRIES, options=None, doc=None, tag_names=None):
+        """acomplete_json → (annotations, ok); not ok if no try got a valid reply"""
+        anns = []
+        for attempt in range(retries + 1):
+            got, ok = await self._run(self._complete, model, prompt, options, doc, tag_names, None)
+            anns += got
+            if ok:
+                break
+            if attempt < retries:
+                self._count_output(retries=1)
+                print(f"  [retry {attempt+1}] malformed reply, retrying...")
+        return _unique(anns), ok
+
+    async def _abatch(self, model, parts, tag_names, tag_descriptions=None, retries=RETRIES, doc=None):
+        """one batch prompt over [(doc_id, text), ...] → (annotations with their doc IDs, failed doc IDs)
+
+        After a broken reply only the parts it didn't finish are sent again:
+        the last part it answered (its list may be cut off) and the ones after.
+        Those still unfinished after the last try are the failed ones.
+        """
+        anns, todo = [], parts
+        for attempt in range(retries + 1):
+            ids = [doc_id for doc_id, _ in todo]
+            got, ok = await self._run(self._complete, model, build_batch_prompt(todo, tag_names, tag_descriptions),
+                                      None, doc, tag_names, ids)
+            anns += got
+            if ok:
+                break
+            answered = [ids.index(d) for d in (str(a.get('doc', '')).strip() for a in got) if d in ids]
+            todo = todo[max(answered, default=0):]
+            if attempt < retries:
+                self._count_output(retries=1, retried_parts=len(todo))
+                print(f"  [retry {attempt+1}] malformed batch reply, re-sending {len(todo)}/{len(parts)} parts")
+        return _unique(anns), [] if ok else [doc_id for doc_id, _ in todo]
+
+    async def astream_json(self, model, prompt, on_annotation=None, options=None, doc=None, tag_names=None):
+        return await self._run(self.stream_json, model, prompt, on_annotation, options, doc, tag_names)
+
+    def stream_many(self, model, texts, tag_names, tag_descriptions=None, on_annotation=None,
+                    max_tokens=500, overlap_tokens=64, doc_ids=None):
+        """streamed annotate_chunked → (results, timings), both in input order
+
+        on_annotation(doc_index, ann) runs in the worker threads as soon as a
+        new keyword/tag of that document arrives from any of its windows,
+        so it must be thread-safe. A document's timing takes the earliest
+        first token/annotation and the latest end over its windows.
+        """
+        doc_windows = [make_windows(t, max_tokens, overlap_tokens) for t in texts]
+        jobs = [(i, win) for i, wins in enumerate(doc_windows) for win in wins]
+        seen, lock = [set() for _ in texts], threading.Lock()
+
+        def notify(i, ann):
+            key = (' '.join(ann['keyword'].lower().split()), ann['tag'])
+            with lock:
+                if key in seen[i]:
+                    return
+                seen[i].add(key)
+            on_annotation(i, ann)
+
+        async def run():
+            return await asyncio.gather(*[
+                self.astream_json(model, build_prompt(texts[i][s:e], tag_names, tag_descriptions, max_chars=None),
+                                  None if on_annotation is None else (lambda ann, i=i: notify(i, ann)),
+                                  doc=doc_ids[i] if doc_ids else i, tag_names=tag_names)
+                for i, (s, e) in jobs])
+
+        t0 = time.time()
+        outs = asyncio.run(run())
+        per_doc = [[] for _ in texts]
+        for (i, _), out in zip(jobs, outs):
+            per_doc[i].append(out)
+        results, timings = [], []
+        for wins, doc_outs in zip(doc_windows, per_doc):
+            results.append(merge_window_results(wins, [anns for anns, _ in doc_outs]))
+            timing = {}
+            for k, pick in [("first_token", min), ("first_annotation", min), ("total", max)]:
+                vals = [t[k] for _, t in doc_outs if t[k] is not None]
+                timing[k] = pick(vals) if vals else None
+            timings.append(timing)
+        firsts = [t["first_annotation"] for t in timings if t["first_annotation"] is not None]
+        print(f"  [LLM] {len(texts)} docs / {len(jobs)} windows streamed in {time.time() - t0:.1f}s "
+              f"(concurrency={self.concurrency})"
+              + (f", mean first annotation {sum(firsts) / len(firsts):.2f}s" if firsts else ""))
+        return results, timings
+
+    async def aannotate_many(self, model, texts, tag_names, tag_descriptions=None, retries=RETRIES, doc_ids=None,
+                             strict=False):
+        prompts = [build_prompt(t, tag_names, tag_descriptions) for t in texts]
+        outs = await asyncio.gather(*[self._acomplete(model, p, retries, doc=doc_ids[i] if doc_ids else i,
+                                                      tag_names=tag_names)
+                                      for i, p in enumerate(prompts)])
+        _check_failed(sum(not ok for _, ok in outs), len(outs), strict)
+        return [anns for anns, _ in outs]
+
+    def annotate_many(self, model, texts, tag_names, tag_descriptions=None, retries=RETRIES, doc_ids=None,
+                      strict=False):
+        """fan all documents out, results come back in input order"""
+        t0 = time.time()
+        results = asyncio.run(self.aannotate_many(model, texts, tag_names, tag_descriptions, retries, doc_ids,
+                                                  strict))
+        print(f"  [LLM] {len(texts)} docs in {time.time() - t0:.1f}s (concurrency={self.concurrency})")
+        return results
+
+    async def aannotate_chunked(self, model, texts, tag_names, tag_descriptions=None, retries=RETRIES,
+                                max_tokens=500, overlap_tokens=64, doc_ids=None, strict=False):
+        doc_windows = [make_windows(t, max_tokens, overlap_tokens) for t in texts]
+        prompts = [(doc_ids[i] if doc_ids else i, build_prompt(t[s:e], tag_names, tag_descriptions, max_chars=None))
+                   for i, (t, wins) in enumerate(zip(texts, doc_windows)) for s, e in wins]
+        outs = await asyncio.gather(*[self._acomplete(model, p, retries, doc=doc, tag_names=tag_names)
+                                      for doc, p in prompts])
+        _check_failed(sum(not ok for _, ok in outs), len(outs), strict)
+        flat = [anns for anns, _ in outs]
+        results, i = [], 0
+        for wins in doc_windows:
+            results.append(merge_window_results(wins, flat[i:i + len(wins)]))
+            i += len(wins)
+        return results
+
+    def annotate_chunked(self, model, texts, tag_names, tag_descriptions=None, retries=RETRIES,
+                         max_tokens=500, overlap_tokens=64, doc_ids=None, strict=False):
+        """like annotate_many, but every window of every document is a request"""
+        t0 = time.time()
+        results = asyncio.run(self.aannotate_chunked(model, texts, tag_names, tag_descriptions, retries,
+                                                     max_tokens, overlap_tokens, doc_ids, strict))
+        n_windows = sum(len(make_windows(t, max_tokens, overlap_tokens)) for t in texts)
+        print(f"  [LLM] {len(texts)} docs / {n_windows} windows in {time.time() - t0:.1f}s "
+              f"(concurrency={self.concurrency})")
+        return results
+
+    async def aannotate_batched(self, model, texts, tag_names, tag_descriptions=None, retries=RETRIES,
+                                max_tokens=1500, doc_tokens=500, max_docs=8, doc_ids=None, strict=False):
+        batches = pack_batches(texts, tag_names, tag_descriptions, max_tokens, doc_tokens, max_docs=max_docs)
+        jobs = []
+        for batch in batches:
+            parts = [(f"D{k + 1}", texts[i][s:e]) for k, (i, (s, e)) in enumerate(batch)]
+            # a batch request is logged under all the documents in it
+            label = '+'.join(str(doc_ids[i] if doc_ids else i) for i in dict.fromkeys(i for i, _ in batch))
+            jobs.append(self._abatch(model, parts, tag_names, tag_descriptions, retries, label))
+        outs = await asyncio.gather(*jobs)
+
+        # per document: the windows it was cut into, and what came back for each
+        doc_parts = [([], []) for _ in texts]
+        failed = set()   # documents with a window no valid reply answered
+        for batch, (anns, failed_ids) in zip(batches, outs):
+            per_id = split_batch_results(anns, [f"D{k + 1}" for k in range(len(batch))])
+            for k, (i, win) in enumerate(batch):
+                doc_parts[i][0].append(win)
+                doc_parts[i][1].append(per_id[f"D{k + 1}"])
+                if f"D{k + 1}" in failed_ids:
+                    failed.add(i)
+        _check_failed(len(failed), len(texts), strict, 'documents')
+        return [merge_window_results(wins, results) for wins, results in doc_parts], len(batches), failed
+
+    def annotate_batched(self, model, texts, tag_names, tag_descriptions=None, retries=RETRIES,
+                         max_tokens=1500, doc_tokens=500, max_docs=8, doc_ids=None, strict=False):
+        """like annotate_chunked, but several documents share one prompt"""
+        t0 = time.time()
+        results, n_batches, _ = asyncio.run(self.aannotate_batched(
+            model, texts, tag_names, tag_descriptions, retries, max_tokens, doc_tokens, max_docs, doc_ids, strict))
+        print(f"  [LLM] {len(texts)} docs in {n_batches} batches, {time.time() - t0:.1f}s "
+              f"(concurrency={self.concurrency})")
+        return results
+
+    async def aannotate_sentences(self, model, texts, tag_names, tag_descriptions=None, retries=RETRIES, cache=None,
+                                  lexicon=None, triage=None, threshold=0.0,
+                                  max_tokens=1500, doc_tokens=500, max_sents=16, doc_ids=None, strict=False):
+        cache = SentenceCache() if cache is None else cache
+        doc_sents = [segment(t) for t in texts]
+        doc_keys = [[sentence_key(model, t[s:e], tag_names, tag_descriptions) for s, e in sents]
+                    for t, sents in zip(texts, doc_sents)]
+        unique = {}   # hash → (first document, sentence text)
+        for i, (t, sents, keys) in enumerate(zip(texts, doc_sents, doc_keys)):
+            for (s, e), key in zip(sents, keys):
+                unique.setdefault(key, (i, t[s:e]))
+        counts = {'sentences': sum(map(len, doc_sents)), 'unique': len(unique), 'triaged': 0,
+                  'tokens': sum(estimate_tokens(s) for _, s in unique.values()), 'triaged_tokens': 0,
+                  'cached': 0, 'lexicon': 0, 'llm': 0, 'failed': 0, 'batches': 0}
+
+        # triage before the cache, so the result doesn't depend on what was cached before
+        known = {}
+        if triage is not None:
+            keys = list(unique)
+            for key, score in zip(keys, triage.scores([unique[k][1] for k in keys])):
+                if score < threshold:
+                    known[key] = []
+                    counts['triaged'] += 1
+                    counts['triaged_tokens'] += estimate_tokens(unique[key][1])
+        known.update((key, cache.get(key)) for key in unique if key not in known)
+        todo = [key for key, anns in known.items() if anns is None]
+        counts['cached'] = len(unique) - counts['triaged'] - len(todo)
+
+        if lexicon is not None:
+            # sentences the lexicon explains on its own don't need the LLM; not
+            # cached, the key stands for the model's answer (and the lexicon is cheap)
+            for key in [k for k in todo if lexicon.covers(unique[k][1])]:
+                known[key] = lexicon.llm_anns(unique[key][1])
+                counts['lexicon'] += 1
+            todo = [key for key in todo if known[key] is None]
+        if todo:
+            labels = [doc_ids[unique[k][0]] if doc_ids else unique[k][0] for k in todo]
+            outs, counts['batches'], failed = await self.aannotate_batched(
+                model, [unique[k][1] for k in todo], tag_names, tag_descriptions, retries,
+                max_tokens, doc_tokens, max_sents, labels)
+            for j, (key, anns) in enumerate(zip(todo, outs)):
+                known[key] = [{'keyword': a['keyword'], 'tag': a['tag']} for a in anns]
+                if j not in failed:   # no valid reply: used this time, asked again next time
+                    cache.put(key, model, known[key])
+            counts['llm'] = len(todo)
+            counts['failed'] = len(failed)
+            _check_failed(len(failed), len(todo), strict, 'sentences')
+
+        # sentence results → one list per document, with the sentence offsets in 'windows'
+        results = [merge_window_results(sents, [known[k] for k in keys])
+                   for sents, keys in zip(doc_sents, doc_keys)]
+        return results, counts
+
+    def annotate_sentences(self, model, texts, tag_names, tag_descriptions=None, retries=RETRIES, cache=None,
+                           lexicon=None, triage=None, threshold=0.0,
+                           max_tokens=1500, doc_tokens=500, max_sents=16, doc_ids=None, strict=False):
+        """like annotate_batched, but per unique sentence → (results, counts)
+
+        Cached sentences are not sent again, nor those the lexicon covers or
+        triage scores below `threshold`; `counts` says how many went where.
+        Only sentences answered by a valid reply are cached ('failed' counts
+        the others).
+        """
+        t0 = time.time()
+        results, c = asyncio.run(self.aannotate_sentences(
+            model, texts, tag_names, tag_descriptions, retries, cache, lexicon, triage, threshold,
+            max_tokens, doc_tokens, max_sents, doc_ids, strict))
+        print(f"  [LLM] {len(texts)} docs / {c['sentences']} sentences, {c['unique']} unique, "
+              f"{c['triaged']} triaged out ({c['triaged_tokens']}/{c['tokens']} tok), "
+              f"{c['cached']} cached, {c['lexicon']} lexicon, {c['llm']} to the LLM in {c['batches']} batches ({c['failed']} failed), "
+              f"{time.time() - t0:.1f}s (concurrency={self.concurrency})")
+        return results, c
@@ -0,0 +1,134 @@
+"""
+Prompt templates compiled once per schema
+
+The extraction prompt is a long static prefix (intro, tag list, tag
+definitions, output format, rules) followed by the document. The prefix is
+built once per (tag names, descriptions) and every request only appends the
+text, so prompts for different documents share a byte-identical prefix and
+Ollama can reuse the KV cache of the slot instead of re-evaluating it.
+
+Tag names come from the MedTator schema (.yaml / .dtd / .json, loaded with
+scripts/schema_kits.py), in schema order. The schema has no description of
+each tag, so the vocabulary below is used unless the schema provides one.
+
+    template = get_template(load_tag_names(SCHEMA_FILE), load_tag_descriptions(SCHEMA_FILE))
+    prompt = template.render(text)
+
+Each template also carries the JSON schema of the reply, sent as Ollama's
+structured-output `format`: the tag is an enum of the tag names (and the
+doc an enum of the batch IDs), so the model can't answer in another shape.
+
+    client.chat(model, prompt, fmt=template.schema)
+"""
+
+import functools, os, sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'scripts'))
+import schema_kits as sck
+
+SCHEMA_FILE = os.path.join(HERE, '..', 'sample', 'VAERS_20_NOTES', 'COVID-19.yaml')
+
+TAG_DESCRIPTIONS = {
+    "Vaccine":           "COVID-19 vaccine name or identifier (e.g., BNT162b2, Pfizer-BioNTech, Moderna, mRNA-1273, Janssen, J&J, AstraZeneca, vaccine dose)",
+    "Fever":             "fever, high temperature, pyrexia, febrile, temperature elevation",
+    "Pain":              "pain, painful, ache, sore, soreness, discomfort, hurts, tenderness",
+    "Headache":          "headache, head pain, migraine, cephalalgia",
+    "Myalgia":           "muscle pain, myalgia, muscle soreness, muscle ache, body aches, swollen, swelling, inflammation, stiffness",
+    "Fatigue":           "fatigue, tired, tiredness, exhaustion, weakness, lethargy, malaise, low energy",
+    "Nasal_obstruction": "nasal obstruction, stuffy nose, nasal congestion, blocked nose, runny nose, rhinorrhea",
+    "Diarrhea":          "diarrhea, loose stool, loose bowel movements, watery stool",
+    "Nausea":            "nausea, nauseated, stomach upset, queasy, feel sick",
+    "Vomiting":          "vomiting, vomited, threw up, emesis, retching",
+    "Sore_throat":       "sore throat, throat pain, pharyngitis, throat irritation, scratchy throat",
+    "Dyspnea":           "dyspnea, shortness of breath, difficulty breathing, breathlessness, SOB, can't breathe",
+    "Cough":             "cough, coughing, dry cough, productive cough, hacking cough",
+    "Chill":             "chills, rigors, shivering, cold sensation, feeling cold",
+    "Delirium":          "delirium, confusion, disorientation, altered mental status, cognitive impairment, hallucination",
+    "Hypersomnia":       "hypersomnia, excessive sleepiness, drowsiness, somnolence, oversleeping, hard to stay awake",
+    "Other":             "any other adverse event or medical concept not covered by the above tags",
+}
+
+# ── Schema ──────────────────────────────────────────────────────────────
+@functools.lru_cache(maxsize=None)
+def load_schema(schema_file=SCHEMA_FILE):
+    return sck.load_schema(schema_file)
+
+def load_tag_names(schema_file=SCHEMA_FILE):
+    """entity tag names of the schema, in schema order"""
+    return [t['name'] for t in load_schema(schema_file)['etags']]
+
+def load_tag_descriptions(schema_file=SCHEMA_FILE, fallback=TAG_DESCRIPTIONS):
+    """schema description of each tag, or the fallback vocabulary"""
+    return {t['name']: t.get('description') or fallback.get(t['name'], '')
+            for t in load_schema(schema_file)['etags']}
+
+# ── Templates ───────────────────────────────────────────────────────────
+def annotation_schema(item_properties):
+    """JSON schema of {"annotations": [{<item_properties>}, ...]}, every property required"""
+    return {"type": "object", "required": ["annotations"],
+            "properties": {"annotations": {"type": "array", "items": {
+                "type": "object", "properties": item_properties, "required": list(item_properties)}}}}
+
+class PromptTemplate:
+    def __init__(self, tag_names, tag_descriptions=None):
+        self.tag_names = list(tag_names)
+        self.tag_descriptions = dict(tag_descriptions) if tag_descriptions else None
+        tag_list = ', '.join(self.tag_names)
+        if self.tag_descriptions:
+            desc_block = 'Tag definitions:\n' + '\n'.join(
+                f'  - {t}: {self.tag_descriptions[t]}' for t in self.tag_names) + '\n\n'
+        else:
+            desc_block = ''
+
+        # everything before the document text is static
+        self.prefix = (
+            "You are a clinical text annotation assistant.\n"
+            f"Identify medical concepts in the following text and classify them using ONLY these exact tag names: {tag_list}\n\n"
+            f"{desc_block}"
+            'Return JSON only, no explanation. Format:\n'
+            '{"annotations": [{"keyword": "core clinical term", "tag": "TagName"}]}\n\n'
+            "Rules:\n"
+            f"- ONLY use these exact tag names: {tag_list}\n"
+            "- keyword must be the shortest core clinical term (1-3 words), NOT a full sentence or clause\n"
+            "- keyword must appear verbatim in the text (exact spelling, case-insensitive)\n"
+            "- Do NOT include IDs, offsets, or extra fields\n\n"
+            "Text:\n"
+        )
+        self.batch_prefix = (
+            "You are a clinical text annotation assistant.\n"
+            f"Identify medical concepts in each of the following documents and classify them using ONLY these exact tag names: {tag_list}\n\n"
+            f"{desc_block}"
+            'Return JSON only, no explanation. Format:\n'
+            '{"annotations": [{"doc": "D1", "keyword": "core clinical term", "tag": "TagName"}]}\n\n'
+            "Rules:\n"
+            f"- ONLY use these exact tag names: {tag_list}\n"
+            "- keyword must be the shortest core clinical term (1-3 words), NOT a full sentence or clause\n"
+            "- keyword must appear verbatim in the text (exact spelling, case-insensitive)\n"
+            "- doc must be the id of the <doc> the keyword appears in; annotate every document\n"
+            "- Do NOT include offsets or extra fields\n\n"
+            "Documents:\n"
+        )
+        self.item_properties = {"keyword": {"type": "string"},
+                                "tag": {"type": "string", "enum": self.tag_names}}
+        self.schema = annotation_schema(self.item_properties)
+
+    def batch_schema(self, doc_ids):
+        """reply schema of a batch prompt over these doc IDs"""
+        return annotation_schema(dict({"doc": {"type": "string", "enum": list(doc_ids)}}, **self.item_properties))
+
+    def render(self, text):
+        return self.prefix + text
+
+    def render_batch(self, docs):
+        """[(doc_id, text), ...] → one prompt"""
+        return self.batch_prefix + '\n\n'.join(f'<doc id="{doc_id}">\n{text}\n</doc>' for doc_id, text in docs)
+
+@functools.lru_cache(maxsize=64)
+def _compiled(tag_names, desc_items):
+    return PromptTemplate(tag_names, dict(desc_items) if desc_items else None)
+
+def get_template(tag_names, tag_descriptions=None):
+    """the compiled template for these tags, built once and reused"""
+    desc_items = tuple((t, tag_descriptions[t]) for t in tag_names) if tag_descriptions else None
+    return _compiled(tuple(tag_names), desc_items)
@@ -0,0 +1,109 @@
+"""
+Model-affinity request scheduling
+
+With several models in flight (MODELS in eval_llm, LLM jobs of the grid
+running side by side), requests for different models interleave and Ollama
+unloads one model's weights to load the other's — tens of seconds per swap
+on a CPU-only box. The scheduler lets only one model talk to the server at
+a time: requests for the active model go straight through (up to `slots`
+at once), requests for other models wait until the active model's queue
+has drained, then the model that has waited longest takes over.
+
+A drained model is held for `linger` seconds before switching, so a job
+that submits its next window a moment after the previous one finished
+doesn't lose the model in between.
+
+Per-model warm state is kept from Ollama's own response metrics: requests,
+loads (load_duration above LOAD_THRESHOLD_NS), load seconds and how often
+the scheduler switched to the model.
+
+    scheduler = ModelScheduler(slots=4)
+    with scheduler.slot(model):
+        resp = session.post(...)
+    scheduler.record(model, resp.json())
+"""
+
+import threading, time
+from contextlib import contextmanager
+
+LOAD_THRESHOLD_NS = 100_000_000   # load_duration above 0.1s means the model was (re)loaded
+
+class ModelScheduler:
+    def __init__(self, slots=4, linger=0.5):
+        self.slots = slots
+        self.linger = linger
+        self.cond = threading.Condition()
+        self.active = None
+        self.in_flight = 0
+        self.idle_since = 0.0
+        self.waiting = {}     # model → requests waiting for it, in arrival order of the models
+        self.state = {}       # model → warm state / counters
+
+    def _state(self, model):
+        if model not in self.state:
+            self.state[model] = {"requests": 0, "loads": 0, "load_s": 0.0, "switches": 0,
+                                 "wait_s": 0.0, "last_used": None}
+        return self.state[model]
+
+    def _next_model(self):
+        return next((m for m, n in self.waiting.items() if n), None)
+
+    def _wait_time(self, model):
+        """0 if `model` may start now, else seconds to wait (None = until notified)"""
+        if self.in_flight >= self.slots:
+            return None
+        if self.active in (None, model):
+            return 0
+        if self.in_flight or self.waiting.get(self.active) or self._next_model() != model:
+            return None
+        left = self.idle_since + self.linger - time.time()
+        return 0 if left <= 0 else left
+
+    @contextmanager
+    def slot(self, model):
+        """hold one server slot for a request to `model`"""
+        t0 = time.time()
+        with self.cond:
+            self.waiting[model] = self.waiting.get(model, 0) + 1
+            while True:
+                wait = self._wait_time(model)
+                if wait == 0:
+                    break
+                self.cond.wait(wait)
+            self.waiting[model] -= 1
+            if not self.waiting[model]:
+                del self.waiting[model]   # a later request queues behind models already waiting
+            state = self._state(model)
+            if self.active != model:
+                self.active = model
+                state["switches"] += 1
+            state["wait_s"] += time.time() - t0
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.in_flight -= 1
+                state["requests"] += 1
+                state["last_used"] = time.time()
+                if not self.in_flight:
+                    self.idle_since = time.time()
+                self.cond.notify_all()
+
+    def record(self, model, data):
+        """take the load time of one server response into the model's warm state"""
+        load_ns = data.get("load_duration") or 0
+        with self.cond:
+            state = self._state(model)
+            state["load_s"] += load_ns / 1e9
+            if load_ns > LOAD_THRESHOLD_NS:
+                state["loads"] += 1
+
+    def summary(self):
+        with self.cond:
+            return {m: dict(s) for m, s in self.state.items()}
+
+    def print_summary(self):
+        for model, s in self.summary().items():
+            print(f"  [model] {model}: {s['requests']} requests, {s['switches']} switches, "
+                  f"{s['loads']} loads / {s['load_s']:.1f}s, waited {s['wait_s']:.1f}s")
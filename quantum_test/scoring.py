@@ -0,0 +1,178 @@
+"""
+Span scoring with an interval index and optimal one-to-one matching
+
+match_predictions() walked every gold tag for every prediction (O(P×G)) and
+matched greedily, so a prediction that came first could take the gold span
+a later, better-overlapping prediction needed — the score depended on
+prediction order. Here gold spans are indexed per tag (sorted starts +
+bisect), candidate pairs come from the index, and each connected group of
+candidates is solved as a maximum-weight bipartite matching: as many
+matches as possible, then the largest total overlap.
+
+Modes:
+  exact   — same tag, same start and end
+  overlap — same tag, spans share at least one character (the old rule)
+  iou     — same tag, intersection / union >= iou_threshold
+
+    index = GoldIndex(gold_positive)           # once per document
+    tp, fp, fn = index.score(predicted, mode='overlap')
+    pairs = index.match(predicted)             # [(pred_idx, gold_idx), ...]
+"""
+
+import bisect
+
+MATCH_MODES = ('exact', 'overlap', 'iou')
+
+def segments(span):
+    """[(start, end), ...] of a span; gold tags from gold.py may be discontinuous"""
+    return span.get('spans') or [(span['start'], span['end'])]
+
+def overlap(pred, gold):
+    """characters of `pred` inside `gold`, summed over gold segments"""
+    return sum(max(0, min(pred['end'], e) - max(pred['start'], s)) for s, e in segments(gold))
+
+def iou(pred, gold):
+    inter = overlap(pred, gold)
+    if inter <= 0:
+        return 0.0
+    return inter / (pred['end'] - pred['start'] + sum(e - s for s, e in segments(gold)) - inter)
+
+# ── Index ───────────────────────────────────────────────────────────────
+class GoldIndex:
+    def __init__(self, gold):
+        """gold: [{'tag', 'start', 'end', ['spans'], ...}, ...]; indices refer to this list
+
+        Every segment of a gold tag is indexed, so a prediction hitting any
+        part of a discontinuous annotation finds it. Exact mode compares
+        with (start, end), the outer bounds.
+        """
+        self.gold = list(gold)
+        segs = {}
+        for i, g in enumerate(self.gold):
+            for s, e in segments(g):
+                segs.setdefault(g['tag'], []).append((s, e, i))
+        self.by_tag, self.starts, self.max_len = {}, {}, {}
+        for tag, items in segs.items():
+            items.sort()
+            self.by_tag[tag] = [i for _, _, i in items]
+            self.starts[tag] = [s for s, _, _ in items]
+            self.max_len[tag] = max(e - s for s, e, _ in items)
+        self.exact = {}
+        for i, g in enumerate(self.gold):
+            self.exact.setdefault((g['tag'], g['start'], g['end']), []).append(i)
+
+    def candidates(self, pred, mode='overlap', iou_threshold=0.5):
+        """[(gold_idx, overlap chars), ...] that `pred` may be matched to"""
+        tag, s, e = pred['tag'], pred['start'], pred['end']
+        if mode == 'exact':
+            return [(i, e - s) for i in self.exact.get((tag, s, e), [])]
+        if tag not in self.by_tag:
+            return []
+        # a segment overlapping [s, e) starts before e and after s - max_len
+        starts = self.starts[tag]
+        lo = bisect.bisect_right(starts, s - self.max_len[tag])
+        hi = bisect.bisect_left(starts, e)
+        out = []
+        for i in dict.fromkeys(self.by_tag[tag][lo:hi]):
+            g = self.gold[i]
+            inter = overlap(pred, g)
+            if inter <= 0:
+                continue
+            if mode == 'iou' and iou(pred, g) < iou_threshold:
+                continue
+            out.append((i, inter))
+        return out
+
+    def match(self, predicted, mode='overlap', iou_threshold=0.5):
+        """optimal one-to-one [(pred_idx, gold_idx), ...], sorted by pred_idx"""
+        if mode not in MATCH_MODES:
+            raise ValueError(f"unknown match mode {mode!r}, use one of {MATCH_MODES}")
+        edges = {}
+        for p, pred in enumerate(predicted):
+            for g, w in self.candidates(pred, mode, iou_threshold):
+                edges[p, g] = w
+        pairs = []
+        for comp in _components(edges):
+            pairs.extend(_max_weight_matching(comp))
+        return sorted(pairs)
+
+    def score(self, predicted, mode='overlap', iou_threshold=0.5):
+        """(tp, fp, fn)"""
+        tp = len(self.match(predicted, mode, iou_threshold))
+        return tp, len(predicted) - tp, len(self.gold) - tp
+
+def match_predictions(predicted, gold, mode='overlap', iou_threshold=0.5):
+    """(tp, fp, fn) of one document, drop-in for the old greedy loop"""
+    return GoldIndex(gold).score(predicted, mode, iou_threshold)
+
+# ── Matching ────────────────────────────────────────────────────────────
+def _components(edges):
+    """split {(p, g): w} into connected groups, each again {(p, g): w}"""
+    parent = {}
+    def find(x):
+        while parent.setdefault(x, x) != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    for p, g in edges:
+        parent[find(('p', p))] = find(('g', g))
+    comps = {}
+    for (p, g), w in edges.items():
+        comps.setdefault(find(('p', p)), {})[p, g] = w
+    return comps.values()
+
+def _max_weight_matching(edges):
+    """[(p, g), ...] with the most matches, then the largest total weight"""
+    ps = sorted({p for p, _ in edges})
+    gs = sorted({g for _, g in edges})
+    if len(ps) == 1 or len(gs) == 1:
+        # a single prediction or a single gold span: take the heaviest edge
+        (p, g), _ = max(edges.items(), key=lambda kv: (kv[1], -kv[0][0], -kv[0][1]))
+        return [(p, g)]
+    # every real edge outweighs any sum of overlaps, so cardinality comes first
+    big = sum(edges.values()) + 1
+    n = max(len(ps), len(gs))
+    cost = [[0] * n for _ in range(n)]
+    for (p, g), w in edges.items():
+        cost[ps.index(p)][gs.index(g)] = -(big + w)
+    assign = _hungarian(cost)
+    return [(ps[r], gs[c]) for r, c in enumerate(assign)
+            if r < len(ps) and c < len(gs) and (ps[r], gs[c]) in edges]
+
+def _hungarian(cost):
+    """min-cost assignment of a square matrix → column of each row"""
+    n = len(cost)
+    INF = float('inf')
+    u, v = [0] * (n + 1), [0] * (n + 1)
+    p, way = [0] * (n + 1), [0] * (n + 1)
+    for i in range(1, n + 1):
+        p[0], j0 = i, 0
+        minv, used = [INF] * (n + 1), [False] * (n + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = p[j0], INF, 0
+            for j in range(1, n + 1):
+                if used[j]:
+                    continue
+                cur = cost[i0 - 1][j - 1] - u[i0] - v[j]
+                if cur < minv[j]:
+                    minv[j], way[j] = cur, j0
+                if minv[j] < delta:
+                    delta, j1 = minv[j], j
+            for j in range(n + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    assign = [0] * n
+    for j in range(1, n + 1):
+        assign[p[j] - 1] = j - 1
+    return assign
@@ -0,0 +1,85 @@
+"""
+Sentence-level pre-annotation with a cross-corpus duplicate-sentence cache
+
+VAERS-style reports repeat the same boilerplate sentences from note to note,
+but every note was sent whole (or in windows), so nothing could be reused.
+Here notes are cut into sentences (scripts/sentence_kits.py, pySBD; the
+regex splitter of chunking.py if pySBD isn't installed), each sentence is
+normalised (case, whitespace) and hashed with the model and tag set, and
+only sentences not seen before go to the LLM — packed several to a prompt
+by batching.py. The keyword/tag results are cached by hash, so a sentence
+repeated across the corpus costs one LLM call per run, and with a
+persistent `store` (an LLMCache) none on the next run.
+
+The results of a note's sentences are merged like windows
+(chunking.merge_window_results): each item keeps the document offsets of
+the sentences it came from in 'windows', and the keywords are located in
+the note afterwards as in every other mode.
+
+    cache = SentenceCache(store=LLMCache())
+    outs = client.annotate_sentences(MODEL, texts, TAG_NAMES, TAG_DESCRIPTIONS, cache=cache)
+    print(cache.stats())
+"""
+
+import hashlib, json, os, re, sys, threading
+
+from chunking import split_sentences
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+try:
+    import sentence_kits as stk   # needs pysbd and spacy
+except ImportError:
+    stk = None
+
+WHITESPACE = re.compile(r'\s+')
+
+def segment(text):
+    """[(start, end), ...] of the sentences of `text`, whitespace-only pieces dropped"""
+    if stk is not None:
+        spans = [(s.start, s.end) for s in stk.get_sentences(text)]
+    else:
+        spans = split_sentences(text)
+    return [(s, e) for s, e in spans if text[s:e].strip()]
+
+def normalize_sentence(sentence):
+    return WHITESPACE.sub(' ', sentence).strip().lower()
+
+def sentence_key(model, sentence, tag_names, tag_descriptions=None):
+    """hash of one normalised sentence under one model / prompt"""
+    payload = json.dumps({'model': model, 'tags': list(tag_names), 'desc': tag_descriptions or {},
+                          'sentence': normalize_sentence(sentence)}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class SentenceCache:
+    def __init__(self, store=None):
+        """in-memory {hash: annotations}, backed by `store` (an LLMCache) if given"""
+        self.store = store
+        self.results = {}
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            anns = self.results.get(key)
+        if anns is None and self.store is not None:
+            cached = self.store.get(f'sentence:{key}')
+            if cached is not None:
+                anns = cached['annotations']
+                with self._lock:
+                    self.results[key] = anns
+        with self._lock:
+            if anns is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return anns
+
+    def put(self, key, model, anns):
+        with self._lock:
+            self.results[key] = anns
+        if self.store is not None:
+            self.store.put(f'sentence:{key}', model, {'annotations': anns})
+
+    def stats(self):
+        with self._lock:
+            return {'sentences': len(self.results), 'hits': self.hits, 'misses': self.misses}
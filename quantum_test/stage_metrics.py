@@ -0,0 +1,121 @@
+"""
+Per-stage latency and token throughput of the pre-annotation pipeline
+
+The eval scripts only printed one wall time around the LLM calls. Here every
+stage of every document is a JSONL record:
+
+    {"doc": "059823.txt.xml", "stage": "llm", "s": 3.21, "queue_s": 0.40,
+     "prompt_eval_s": 1.10, "eval_s": 1.65, "prompt_eval_count": 612, "eval_count": 88, ...}
+    {"doc": "059823.txt.xml", "stage": "localize", "s": 0.0004}
+
+Stages written by OllamaClient (pass stage_log=StageLog(...)):
+  llm        one server request: total / queue wait (from the client's
+             thread pool to a scheduler slot, before the request is sent) /
+             load / prompt eval / generation, from Ollama's *_duration and
+             *_count fields
+  llm_cache  a request answered by the LLMCache
+and by the eval scripts around their own steps (localize, negation, score).
+
+summarize() gives n / mean / p50 / p90 / p99 / total per stage, and the
+prompt-eval and generation token rates of the llm stage, to check against
+what the hardware should do:
+
+    log = StageLog('stages.jsonl')
+    client = OllamaClient(..., stage_log=log)
+    with log.stage(doc.name, 'localize'):
+        preds = locate_all(...)
+    log.print_summary()
+
+    python stage_metrics.py stages.jsonl      # summary of an earlier run
+"""
+
+import argparse, json, math, threading, time
+from contextlib import contextmanager
+
+PERCENTILES = (50, 90, 99)
+
+def percentile(values, q):
+    """nearest-rank percentile of a sorted list"""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+class StageLog:
+    def __init__(self, path=None):
+        """records are kept in memory, and appended to `path` as JSONL if given"""
+        self.path = path
+        self.records = []
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8') if path else None
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def record(self, doc, stage, seconds, **fields):
+        rec = dict({'doc': doc, 'stage': stage, 's': seconds}, **fields)
+        with self._lock:
+            self.records.append(rec)
+            if self._file:
+                self._file.write(json.dumps(rec, ensure_ascii=False) + '\n')
+                self._file.flush()
+
+    @contextmanager
+    def stage(self, doc, stage, **fields):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(doc, stage, time.perf_counter() - t0, **fields)
+
+    def summary(self):
+        return summarize(self.records)
+
+    def print_summary(self):
+        print_summary(self.summary())
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _stats(values):
+    values = sorted(values)
+    out = {'n': len(values), 'mean': sum(values) / len(values) if values else 0.0, 'total': sum(values)}
+    for q in PERCENTILES:
+        out[f'p{q}'] = percentile(values, q)
+    return out
+
+def summarize(records):
+    """{stage: {n, mean, p50, p90, p99, total}}, plus llm sub-timings and token rates"""
+    by_stage = {}
+    for r in records:
+        by_stage.setdefault(r['stage'], []).append(r)
+    out = {stage: _stats([r['s'] for r in rs]) for stage, rs in by_stage.items()}
+    llm = by_stage.get('llm', [])
+    for k in ('queue_s', 'load_s', 'prompt_eval_s', 'eval_s'):
+        if llm:
+            out[f'llm.{k}'] = _stats([r.get(k, 0.0) for r in llm])
+    # tokens per second of each request, and over the whole run
+    for count, dur, name in (('prompt_eval_count', 'prompt_eval_s', 'prompt_tok/s'),
+                             ('eval_count', 'eval_s', 'gen_tok/s')):
+        rates = [r[count] / r[dur] for r in llm if r.get(dur)]
+        if rates:
+            out[f'llm.{name}'] = dict(_stats(rates), overall=sum(r[count] for r in llm) /
+                                      (sum(r.get(dur, 0.0) for r in llm) or 1))
+    return out
+
+def print_summary(summary):
+    print(f"  {'stage':<20} {'n':>5} {'mean':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'total':>9}")
+    for stage, s in summary.items():
+        if stage.endswith('tok/s'):
+            print(f"  {stage:<20} {s['n']:>5} {s['mean']:>9.1f} {s['p50']:>9.1f} {s['p90']:>9.1f} "
+                  f"{s['p99']:>9.1f} {s['overall']:>7.1f}/s")
+        else:
+            print(f"  {stage:<20} {s['n']:>5} {s['mean']:>8.3f}s {s['p50']:>8.3f}s {s['p90']:>8.3f}s "
+                  f"{s['p99']:>8.3f}s {s['total']:>8.2f}s")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-stage latency summary of a StageLog JSONL file')
+    parser.add_argument('path')
+    print_summary(summarize(load(parser.parse_args().path)))
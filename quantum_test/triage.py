@@ -0,0 +1,61 @@
+"""
+Sentence triage before the LLM
+
+Headers, lab tables and signatures hold none of the schema's concepts, but
+sentence mode still sent them to the LLM. A triage scorer gives every
+sentence a relevance to the schema's tags in [0, 1], and only sentences at
+or above the threshold are sent (OllamaClient.annotate_sentences(triage=...));
+the others count as annotated with nothing.
+
+  LexiconTriage    1.0 for a lexicon hit (lexicon.py), otherwise half the
+                   share of content words that appear in any synonym —
+                   no server call at all
+  EmbeddingTriage  highest cosine between the sentence and each tag's
+                   "name: description", embedded by a local Ollama model
+                   (/api/embed); vectors are cached in the client's LLMCache
+
+    triage = LexiconTriage(lexicon)          # or EmbeddingTriage(client, TAG_DESCRIPTIONS, TAG_NAMES)
+    outs, counts = client.annotate_sentences(MODEL, texts, TAG_NAMES, triage=triage, threshold=0.3)
+    counts['triaged_tokens'] / counts['tokens']   # share of sentence tokens not sent
+
+The recall lost for those tokens is what the eval_llm grid shows with a
+'triage' axis in PROMPT_GRID.
+"""
+
+import math
+
+from lexicon import STOPWORDS, WORD
+
+EMBED_MODEL = "nomic-embed-text"
+
+def _normalize(vec):
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+class LexiconTriage:
+    def __init__(self, lexicon):
+        self.lexicon = lexicon
+        self.vocab = {w for term in lexicon.tags for w in WORD.findall(term)} - STOPWORDS
+
+    def scores(self, sentences):
+        out = []
+        for sentence in sentences:
+            if self.lexicon.annotate(sentence):
+                out.append(1.0)
+                continue
+            words = [w.lower() for w in WORD.findall(sentence) if w.lower() not in STOPWORDS]
+            out.append(0.5 * sum(w in self.vocab for w in words) / len(words) if words else 0.0)
+        return out
+
+class EmbeddingTriage:
+    def __init__(self, client, tag_descriptions, tag_names=None, model=EMBED_MODEL):
+        self.client = client
+        self.model = model
+        tags = tag_names or list(tag_descriptions)
+        texts = [f"{t.replace('_', ' ')}: {tag_descriptions.get(t, '')}" for t in tags]
+        self.tag_vectors = [_normalize(v) for v in client.embed(model, texts)]
+
+    def scores(self, sentences):
+        vectors = [_normalize(v) for v in self.client.embed(self.model, sentences)] if sentences else []
+        return [max(0.0, max(sum(a * b for a, b in zip(vec, t)) for t in self.tag_vectors))
+                for vec in vectors]
@@ -0,0 +1,282 @@
+'''
+A command line tool for converting MedTagger outputs to MedTator XML files
+
+MedTagger output files (`.ann`) don't contain the text,
+so each `.ann` file is paired with its source text file by file name.
+Same as the converter in MedTator, the `.ann` file of `doc_01.txt`
+should be `doc_01.txt.ann` (`doc_01.ann` is also accepted).
+
+The offsets of each tag are checked against the text,
+the tags out of range or with a different text are skipped.
+If a schema is given, the tags not defined in the schema are skipped,
+the missing attrs are set by the default values,
+and the tag IDs use the same prefix as MedTator.
+
+The pairs are converted by a pool of workers,
+and the XMLs are written out in batches.
+The output XML file is named as `doc_01.txt.xml`,
+so that the outputs of NLP systems can be compared with the gold standard
+in the IAA and error analysis of MedTator.
+
+Usage:
+
+```bash
+python convert_medtagger_to_medtator.py ./medtagger_output/ ../sample/VAERS_20_NOTES/raw_txt/ --schema ../sample/VAERS_20_NOTES/COVID-19.yaml --output ../../medtagger_xmls/
+```
+
+The saving XML function requires lxml, please check `medtator_kits.py`.
+'''
+
+import os
+import time
+import argparse
+from multiprocessing import Pool
+
+import medtator_kits as mtk
+import medtagger_kits as mgk
+import schema_kits as sck
+
+
+def build_text_index(path, exts=('.txt', )):
+    '''
+    Build an index of the text files by file name
+
+    Return a dict of file name -> full path and the duplicated names
+    '''
+    index = {}
+    duplicates = []
+    for root, dirs, files in os.walk(path):
+        for fn in files:
+            if not fn.lower().endswith(exts):
+                continue
+            if fn in index:
+                duplicates.append(fn)
+                continue
+            index[fn] = os.path.join(root, fn)
+    return index, duplicates
+
+
+def find_text_file(ann_fn, index):
+    '''
+    Find the text file for the given `.ann` file name
+    '''
+    # doc_01.txt.ann -> doc_01.txt
+    name = os.path.basename(ann_fn)[:-len('.ann')]
+    if name in index:
+        return index[name]
+    # doc_01.ann -> doc_01.txt
+    if name + '.txt' in index:
+        return index[name + '.txt']
+    return None
+
+
+def validate_tag(tag, text):
+    '''
+    Check the offsets of a MedTagger tag against the text
+
+    Return None if valid, otherwise the reason
+    '''
+    start, end = tag['spans'][0]
+    if start < 0 or end > len(text) or start >= end:
+        return 'out_of_range'
+
+    if tag['text'] != '' and \
+       ' '.join(text[start:end].split()).lower() != ' '.join(tag['text'].split()).lower():
+        return 'text_mismatch'
+
+    return None
+
+
+def to_medtator_ann(mt_ann, text, txt_fn, schema=None, root='MEDTAGGER'):
+    '''
+    Convert a parsed MedTagger ann to a MedTator ann
+
+    Return the new ann and the stat of this ann
+    '''
+    ann = {
+        "_filename": os.path.basename(txt_fn) + '.xml',
+        "root": schema['name'] if schema else root,
+        "text": text,
+        "meta": {},
+        "tags": []
+    }
+    stat = {
+        "n_tags": 0,
+        "out_of_range": 0,
+        "text_mismatch": 0,
+        "unknown_tag": 0
+    }
+
+    # the next id number of each tag
+    id_nums = {}
+    for mt_tag in mt_ann['tags']:
+        reason = validate_tag(mt_tag, text)
+        if reason is not None:
+            stat[reason] += 1
+            continue
+
+        tag_def = None
+        if schema is not None:
+            if mt_tag['tag'] not in schema['tag_dict']:
+                # this is possible that the normed term may not be available
+                stat['unknown_tag'] += 1
+                continue
+            tag_def = schema['tag_dict'][mt_tag['tag']]
+
+        id_prefix = tag_def['id_prefix'] if tag_def else 'T'
+        n = id_nums.get(id_prefix, 0)
+        id_nums[id_prefix] = n + 1
+
+        start, end = mt_tag['spans'][0]
+        tag = {
+            "tag": mt_tag['tag'],
+            "spans": [[start, end]],
+            "text": text[start:end],
+            "id": '%s%s' % (id_prefix, n)
+        }
+        if tag_def is not None:
+            # the MedTagger output won't contain attrs defined in the schema
+            tag.update(sck.get_default_attrs(tag_def))
+            for attr in tag_def['attrs']:
+                if attr['name'] in mt_tag:
+                    tag[attr['name']] = mt_tag[attr['name']]
+        else:
+            # just copy all the attrs of MedTagger
+            for k in mt_tag:
+                if k not in tag:
+                    tag[k] = mt_tag[k]
+
+        ann['tags'].append(tag)
+        stat['n_tags'] += 1
+
+    return ann, stat
+
+
+# the schema in each worker process
+_worker_schema = None
+_worker_root = None
+
+def _init_worker(schema, root):
+    global _worker_schema, _worker_root
+    _worker_schema = schema
+    _worker_root = root
+
+
+def _convert_pair(pair):
+    ann_fn, txt_fn = pair
+    mt_ann = mgk.parse_ann(ann_fn)
+    with open(txt_fn, encoding='utf8') as f:
+        text = f.read()
+    ann, stat = to_medtator_ann(mt_ann, text, txt_fn, _worker_schema, _worker_root)
+    return ann['_filename'], mtk.dump_xml(ann), stat
+
+
+def convert_files(
+    ann_path,
+    txt_path,
+    output_path,
+    schema=None,
+    root='MEDTAGGER',
+    n_workers=None,
+    chunksize=32,
+    batch_size=256
+):
+    '''
+    Convert all MedTagger outputs in the given path to MedTator XML files
+
+    Return the stat of all files
+    '''
+    index, duplicates = build_text_index(txt_path)
+
+    ret = {
+        "total_ann_files": 0,
+        "total_converted_files": 0,
+        "total_unpaired_files": 0,
+        "total_duplicated_texts": len(duplicates),
+        "total_tags": 0,
+        "total_out_of_range": 0,
+        "total_text_mismatch": 0,
+        "total_unknown_tag": 0
+    }
+
+    # pair the ann files with text files by name
+    pairs = []
+    for ann_fn in mgk.find_ann_files(ann_path):
+        ret['total_ann_files'] += 1
+        txt_fn = find_text_file(ann_fn, index)
+        if txt_fn is None:
+            ret['total_unpaired_files'] += 1
+            continue
+        pairs.append((ann_fn, txt_fn))
+
+    if not os.path.exists(output_path):
+        os.makedirs(output_path)
+
+    batch = []
+    with Pool(n_workers, initializer=_init_worker, initargs=(schema, root)) as pool:
+        for fn, xml, stat in pool.imap_unordered(_convert_pair, pairs, chunksize=chunksize):
+            ret['total_converted_files'] += 1
+            ret['total_tags'] += stat['n_tags']
+            for k in ['out_of_range', 'text_mismatch', 'unknown_tag']:
+                ret['total_' + k] += stat[k]
+
+            batch.append((fn, xml))
+            if len(batch) >= batch_size:
+                mtk.save_xml_bytes(batch, output_path)
+                batch = []
+
+    # the last batch
+    mtk.save_xml_bytes(batch, output_path)
+
+    return ret
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert MedTagger outputs to MedTator XML files')
+    parser.add_argument('ann_path',
+                        help='the path to the folder that contains MedTagger output files')
+    parser.add_argument('txt_path',
+                        help='the path to the folder that contains the source text files')
+    parser.add_argument('--output', required=True,
+                        help='the path to the folder for saving XML files')
+    parser.add_argument('--schema', default=None,
+                        help='the schema file (.dtd, .yaml, or .json) for checking tags')
+    parser.add_argument('--root', default='MEDTAGGER',
+                        help='the root name of XML if no schema is given')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='the number of worker processes, default is the number of CPUs')
+    parser.add_argument('--batch_size', type=int, default=256,
+                        help='the number of files for each batch of writing')
+
+    # update the args
+    args = parser.parse_args()
+
+    schema = None
+    if args.schema is not None:
+        schema = sck.load_schema(args.schema)
+        print('* loaded schema %s' % schema['name'])
+
+    t0 = time.time()
+    ret = convert_files(
+        args.ann_path,
+        args.txt_path,
+        args.output,
+        schema,
+        args.root,
+        args.workers,
+        batch_size=args.batch_size
+    )
+
+    print('* converted %s/%s ANN files in %.2fs' % (
+        ret['total_converted_files'],
+        ret['total_ann_files'],
+        time.time() - t0
+    ))
+    print('* skipped %s ANN files without text' % ret['total_unpaired_files'])
+    if ret['total_duplicated_texts'] > 0:
+        print('* found %s duplicated text file names, used the first one' % ret['total_duplicated_texts'])
+    print('* saved %s tags' % ret['total_tags'])
+    print('* skipped %s tags out of range' % ret['total_out_of_range'])
+    print('* skipped %s tags with mismatched text' % ret['total_text_mismatch'])
+    print('* skipped %s tags not in schema' % ret['total_unknown_tag'])
+    print('* saved to %s' % args.output)
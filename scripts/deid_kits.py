@@ -0,0 +1,247 @@
+'''
+De-identification Toolkits
+
+This module is for masking the PHI-like text in MedTator XML files
+before sharing the corpus, such as names, dates, and MRNs.
+
+The PHI are defined in a JSON config file by literal terms and regex patterns:
+
+```json
+{
+    "terms": {
+        "NAME": ["John Smith", "Jane Doe"]
+    },
+    "term_files": {
+        "NAME": "local_names.txt"
+    },
+    "patterns": {
+        "DATE": ["\\\\d{1,2}/\\\\d{1,2}/\\\\d{2,4}", "\\\\d{1,2}[A-Z][a-z]{2}\\\\d{4}"],
+        "MRN": ["MRN[:#\\\\s]*\\\\d{6,10}"]
+    },
+    "surrogates": {
+        "NAME": "##NAME##"
+    }
+}
+```
+
+All the literal terms are compiled into one Aho-Corasick automaton and
+all the regex patterns are compiled into one combined regex,
+so each document is scanned once no matter how many terms there are.
+Each term file contains one term per line.
+If no surrogate is defined for a category, `##CATEGORY##` is used.
+
+The matched text is replaced by the surrogate token,
+and the spans of the existing tags are remapped to the new text.
+The tags which are completely covered by PHI are dropped.
+
+Usage:
+
+```bash
+python deid_kits.py ../sample/VAERS_20_NOTES/ann_xml/ --config deid.json --output ../../deid_xmls/ --workers 8
+```
+
+The saving XML function requires lxml, please check `medtator_kits.py`.
+'''
+
+import os
+import json
+import time
+import argparse
+from multiprocessing import Pool
+
+import medtator_kits as mtk
+import matcher_kits as mck
+import offset_kits as ofk
+
+
+class Deidentifier:
+    '''
+    The compiled scanners for a de-identification config
+    '''
+    def __init__(self, terms=None, patterns=None, surrogates=None):
+        self.surrogates = surrogates or {}
+
+        # all literal terms -> one automaton
+        self.automaton = mck.AhoCorasick(ignore_case=True, word_boundary=True)
+        for category, ts in (terms or {}).items():
+            for t in ts:
+                self.automaton.add(t, category)
+        self.automaton.build()
+
+        # all regex patterns -> one regex
+        self.scanner = mck.RegexScanner()
+        for category, ps in (patterns or {}).items():
+            for p in ps:
+                self.scanner.add(p, category)
+        self.scanner.build()
+
+    @classmethod
+    def from_config(cls, config, config_path='.'):
+        '''
+        Create a Deidentifier from a config dict
+
+        The term files are relative to the folder of the config file.
+        '''
+        terms = {}
+        for category, ts in config.get('terms', {}).items():
+            terms.setdefault(category, []).extend(ts)
+
+        for category, fn in config.get('term_files', {}).items():
+            full_fn = os.path.join(config_path, fn)
+            with open(full_fn, encoding='utf8') as f:
+                for line in f:
+                    t = line.strip()
+                    if t == '' or t.startswith('#'):
+                        continue
+                    terms.setdefault(category, []).append(t)
+
+        return cls(
+            terms,
+            config.get('patterns', {}),
+            config.get('surrogates', {})
+        )
+
+    def get_surrogate(self, category):
+        return self.surrogates.get(category, '##%s##' % category)
+
+    def find_phi(self, text):
+        '''
+        Find all PHI in the text
+
+        Return a list of (start, end, category) without overlapping
+        '''
+        matches = self.automaton.findall(text) + self.scanner.findall(text)
+        return mck.select_longest(matches)
+
+    def deid_text(self, text):
+        '''
+        Replace the PHI in the text with surrogates
+
+        Return the new text, the offset map, and the found PHI
+        '''
+        phis = self.find_phi(text)
+        es = ofk.EditScript(text)
+        for start, end, category in phis:
+            es.replace(start, end, self.get_surrogate(category))
+
+        return es.apply(), es.offset_map(), phis
+
+    def deid_ann(self, ann):
+        '''
+        De-identify an ann and remap the spans of its tags
+
+        Return the new ann and the stat of this ann
+        '''
+        new_text, omap, phis = self.deid_text(ann['text'])
+        kept_tags, dropped_tags = ofk.remap_tags(ann['tags'], omap, new_text)
+
+        new_ann = {
+            "_filename": ann['_filename'],
+            "root": ann['root'],
+            "text": new_text,
+            "meta": ann['meta'],
+            "tags": kept_tags
+        }
+
+        stat = {
+            "n_phi": len(phis),
+            "n_phi_by_category": {},
+            "n_dropped_tags": len(dropped_tags),
+            "offset_delta": omap.dst_len - omap.src_len
+        }
+        for _, _, category in phis:
+            stat['n_phi_by_category'][category] = \
+                stat['n_phi_by_category'].get(category, 0) + 1
+
+        return new_ann, stat
+
+
+def load_config(config_fn):
+    '''
+    Load the de-identification config from a JSON file
+    '''
+    with open(config_fn, encoding='utf8') as f:
+        config = json.load(f)
+    return config
+
+
+# the Deidentifier in each worker process.
+# it's created once by the initializer instead of sent with each file
+_worker_deid = None
+
+def _init_worker(config, config_path):
+    global _worker_deid
+    _worker_deid = Deidentifier.from_config(config, config_path)
+
+
+def _deid_file(args):
+    full_fn, path, output_path = args
+    ann = mtk.parse_xml(full_fn)
+    new_ann, stat = _worker_deid.deid_ann(ann)
+    mtk.save_xml(new_ann, os.path.join(output_path, mtk.get_output_fn(full_fn, path, new_ann['_filename'])))
+    return stat
+
+
+def deid_files(path, output_path, config, config_path='.', n_workers=None, chunksize=16):
+    '''
+    De-identify all XML files in the given path with a pool of workers
+
+    The sub folders of the files in `path` are kept in `output_path`.
+    Return the stat of all files
+    '''
+    xml_fns = mtk.find_xml_files(path)
+    if not os.path.exists(output_path):
+        os.makedirs(output_path)
+
+    ret = {
+        "total_files": 0,
+        "total_phi": 0,
+        "total_phi_by_category": {},
+        "total_dropped_tags": 0,
+        "total_offset_delta": 0
+    }
+    jobs = [(fn, path, output_path) for fn in xml_fns]
+
+    with Pool(n_workers, initializer=_init_worker, initargs=(config, config_path)) as pool:
+        for stat in pool.imap_unordered(_deid_file, jobs, chunksize=chunksize):
+            ret['total_files'] += 1
+            ret['total_phi'] += stat['n_phi']
+            ret['total_dropped_tags'] += stat['n_dropped_tags']
+            ret['total_offset_delta'] += stat['offset_delta']
+            for category, n in stat['n_phi_by_category'].items():
+                ret['total_phi_by_category'][category] = \
+                    ret['total_phi_by_category'].get(category, 0) + n
+
+    return ret
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='De-identification Kits')
+    parser.add_argument('path',
+                        help='the path to the folder that contains annotation files')
+    parser.add_argument('--config', required=True,
+                        help='the JSON config file of the PHI terms and patterns')
+    parser.add_argument('--output', required=True,
+                        help='the path to the folder for saving de-identified files')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='the number of worker processes, default is the number of CPUs')
+
+    # update the args
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    t0 = time.time()
+    ret = deid_files(
+        args.path,
+        args.output,
+        config,
+        os.path.dirname(os.path.abspath(args.config)),
+        args.workers
+    )
+
+    print('* de-identified %s files in %.2fs' % (ret['total_files'], time.time() - t0))
+    print('* found %s PHI' % ret['total_phi'])
+    for category, n in sorted(ret['total_phi_by_category'].items()):
+        print('  - %s: %s' % (category, n))
+    print('* dropped %s tags covered by PHI' % ret['total_dropped_tags'])
+    print('* changed %s chars in total' % ret['total_offset_delta'])
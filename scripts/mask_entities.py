@@ -0,0 +1,262 @@
+'''
+A command line tool for masking entities in MedTator XML files
+
+This is the batch version of `demo_mask_entities.py`.
+The masked and kept tags are defined in a config file (JSON or YAML):
+
+```json
+{
+    "mask_tags": {
+        "AE": "##AE##",
+        "DATE": "##DT##"
+    },
+    "kept_tags": ["SVRT"]
+}
+```
+
+Same as the demo, the text of masked tags is replaced by the mask,
+the kept tags are shifted to the new text,
+and any tag which is not defined in the config is DROPPED.
+If a kept tag is completely covered by masked tags, it's dropped too.
+
+The files are processed by a pool of workers,
+and the masked XMLs are written out in batches.
+Instead of the output for each tag, a summary is printed at last.
+
+Usage:
+
+```bash
+python mask_entities.py ../sample/ENTITY_RELATION_TASK/ann_xml/Annotator_A/ --config mask.json --output ../../masked_xmls/
+```
+
+The saving XML function requires lxml, please check `medtator_kits.py`.
+For the YAML config, PyYAML is needed.
+'''
+
+import os
+import json
+import time
+import argparse
+from multiprocessing import Pool
+
+import medtator_kits as mtk
+import offset_kits as ofk
+
+
+def load_config(config_fn):
+    '''
+    Load the mask config from a JSON or YAML file
+
+    The `mask_tags` can be a dict of tag -> mask,
+    or a list of [tag, mask] pairs like the `MASK_TAGS` in the demo.
+    '''
+    with open(config_fn, encoding='utf8') as f:
+        if config_fn.lower().endswith(('.yaml', '.yml')):
+            import yaml
+            config = yaml.safe_load(f)
+        else:
+            config = json.load(f)
+
+    mask_tags = config.get('mask_tags', {})
+    if isinstance(mask_tags, list):
+        mask_tags = dict(mask_tags)
+
+    return {
+        "mask_tags": mask_tags,
+        "kept_tags": list(config.get('kept_tags', []))
+    }
+
+
+def mask_ann(ann, mask_tags, kept_tags):
+    '''
+    Mask the entities in an ann
+
+    Return the masked ann and the stat of this ann
+    '''
+    stat = {
+        "n_masked_by_tag": {},
+        "n_kept": 0,
+        "n_shifted": 0,
+        "n_dropped_covered": 0,
+        "n_dropped_by_tag": {},
+        "offset_delta": 0
+    }
+
+    # find the regions to be masked and the tags to be kept
+    regions = []
+    k_tags = []
+    for tag in ann['tags']:
+        if tag['tag'] in mask_tags:
+            stat['n_masked_by_tag'][tag['tag']] = \
+                stat['n_masked_by_tag'].get(tag['tag'], 0) + 1
+            for sp in tag.get('spans', []):
+                if sp[0] < 0 or sp[0] >= sp[1]:
+                    # no need to mask DOCUMENT level tags
+                    continue
+                regions.append([sp[0], sp[1], mask_tags[tag['tag']]])
+
+        elif tag['tag'] in kept_tags:
+            k_tags.append(tag)
+
+        else:
+            # just drop this undefined tags
+            stat['n_dropped_by_tag'][tag['tag']] = \
+                stat['n_dropped_by_tag'].get(tag['tag'], 0) + 1
+
+    # the masked tags may overlap with each other,
+    # so merge them and use the mask of the first one
+    regions.sort(key=lambda r: (r[0], -r[1]))
+    merged = []
+    for r in regions:
+        if len(merged) > 0 and r[0] < merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], r[1])
+        else:
+            merged.append(r)
+
+    es = ofk.EditScript(ann['text'])
+    for start, end, mask in merged:
+        es.replace(start, end, mask)
+    new_text = es.apply()
+    omap = es.offset_map()
+
+    # save the old spans for counting the shifted tags
+    old_spans = dict([
+        (id(tag), [list(sp) for sp in tag.get('spans', [])]) for tag in k_tags
+    ])
+    k_tags, dropped_tags = ofk.remap_tags(k_tags, omap, new_text)
+    stat['n_kept'] = len(k_tags)
+    stat['n_dropped_covered'] = len(dropped_tags)
+    for tag in k_tags:
+        if tag.get('spans', []) != old_spans[id(tag)]:
+            stat['n_shifted'] += 1
+
+    stat['offset_delta'] = omap.dst_len - omap.src_len
+
+    masked_ann = {
+        "_filename": 'masked_' + ann['_filename'],
+        "root": ann['root'],
+        "text": new_text,
+        "meta": ann['meta'],
+        "tags": k_tags
+    }
+    return masked_ann, stat
+
+
+def merge_stat(ret, stat):
+    '''
+    Merge the stat of an ann into the total stat
+    '''
+    ret['total_files'] += 1
+    ret['total_kept'] += stat['n_kept']
+    ret['total_shifted'] += stat['n_shifted']
+    ret['total_dropped_covered'] += stat['n_dropped_covered']
+    ret['total_offset_delta'] += stat['offset_delta']
+    for key in ['masked_by_tag', 'dropped_by_tag']:
+        for tag_name, n in stat['n_' + key].items():
+            ret['total_' + key][tag_name] = \
+                ret['total_' + key].get(tag_name, 0) + n
+
+
+# the config in each worker process
+_worker_config = None
+
+def _init_worker(config):
+    global _worker_config
+    _worker_config = config
+
+
+def _mask_file(args):
+    full_fn, path = args
+    ann = mtk.parse_xml(full_fn)
+    masked_ann, stat = mask_ann(
+        ann,
+        _worker_config['mask_tags'],
+        _worker_config['kept_tags']
+    )
+    # the XML is converted in the worker,
+    # so the main process only needs to write the bytes
+    return mtk.get_output_fn(full_fn, path, masked_ann['_filename']), mtk.dump_xml(masked_ann), stat
+
+
+def mask_files(path, output_path, config, n_workers=None, chunksize=32, batch_size=256):
+    '''
+    Mask all XML files in the given path with a pool of workers
+
+    The sub folders of the files in `path` are kept in `output_path`.
+    Return the stat of all files
+    '''
+    xml_fns = mtk.find_xml_files(path)
+    if not os.path.exists(output_path):
+        os.makedirs(output_path)
+
+    ret = {
+        "total_files": 0,
+        "total_masked_by_tag": {},
+        "total_kept": 0,
+        "total_shifted": 0,
+        "total_dropped_covered": 0,
+        "total_dropped_by_tag": {},
+        "total_offset_delta": 0
+    }
+
+    batch = []
+    with Pool(n_workers, initializer=_init_worker, initargs=(config, )) as pool:
+        for fn, xml, stat in pool.imap_unordered(_mask_file, [(fn, path) for fn in xml_fns],
+                                                  chunksize=chunksize):
+            merge_stat(ret, stat)
+            batch.append((fn, xml))
+            if len(batch) >= batch_size:
+                mtk.save_xml_bytes(batch, output_path)
+                batch = []
+
+    # the last batch
+    mtk.save_xml_bytes(batch, output_path)
+
+    return ret
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mask entities in MedTator XML files')
+    parser.add_argument('path',
+                        help='the path to the folder that contains annotation files')
+    parser.add_argument('--config', required=True,
+                        help='the JSON or YAML config file of the masked and kept tags')
+    parser.add_argument('--output', required=True,
+                        help='the path to the folder for saving masked files')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='the number of worker processes, default is the number of CPUs')
+    parser.add_argument('--batch_size', type=int, default=256,
+                        help='the number of files for each batch of writing')
+
+    # update the args
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    print('* defined MASK tags:')
+    for tag_name, mask in config['mask_tags'].items(): print('  - %s -> %s' % (tag_name, mask))
+    print('* defined KEPT tags:')
+    for tag_name in config['kept_tags']: print('  - %s ' % (tag_name))
+
+    t0 = time.time()
+    ret = mask_files(
+        args.path,
+        args.output,
+        config,
+        args.workers,
+        batch_size=args.batch_size
+    )
+
+    print('* masked %s files in %.2fs' % (ret['total_files'], time.time() - t0))
+    print('* masked tags:')
+    for tag_name, n in sorted(ret['total_masked_by_tag'].items()):
+        print('  - %s: %s' % (tag_name, n))
+    print('* kept %s tags, %s of them are shifted, %s chars changed in total' % (
+        ret['total_kept'],
+        ret['total_shifted'],
+        ret['total_offset_delta']
+    ))
+    print('* dropped %s kept tags covered by masks' % ret['total_dropped_covered'])
+    print('* dropped undefined tags:')
+    for tag_name, n in sorted(ret['total_dropped_by_tag'].items()):
+        print('  - %s: %s' % (tag_name, n))
+    print('* saved to %s' % args.output)
@@ -0,0 +1,242 @@
+'''
+Multi-pattern Matching Toolkits
+
+This module is for finding many patterns in a text in one pass.
+
+- `AhoCorasick`: an Aho-Corasick automaton for thousands of literal terms,
+  such as a list of names or a dictionary of clinical concepts.
+- `RegexScanner`: a scanner which combines many regex patterns
+  into a single regex, such as the patterns of dates and MRNs.
+
+Both of them return the matches as (start, end, value) tuples,
+where the value is what was given when adding the pattern.
+
+```python
+import matcher_kits as mck
+
+ac = mck.AhoCorasick()
+ac.add('John Smith', 'NAME')
+ac.add('Rochester', 'LOCATION')
+ac.build()
+for start, end, value in ac.finditer(text):
+    print(text[start:end], value)
+```
+
+The automaton is pure Python, so no extra package is needed.
+'''
+
+import re
+
+
+def fold_case(text):
+    '''
+    Lower the case of a text without changing the length
+
+    Some chars change the length after lower(), e.g., `İ`,
+    for them we just keep the original char so that the offsets still work.
+    '''
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return ''.join([
+        c.lower() if len(c.lower()) == 1 else c for c in text
+    ])
+
+
+def is_word_char(c):
+    return c.isalnum() or c == '_'
+
+
+def is_word_boundary(text, start, end):
+    '''
+    Check whether text[start:end] is not a part of a longer word
+    '''
+    if start > 0 and is_word_char(text[start - 1]) and is_word_char(text[start]):
+        return False
+    if end < len(text) and is_word_char(text[end]) and is_word_char(text[end - 1]):
+        return False
+    return True
+
+
+class AhoCorasick:
+    '''
+    An Aho-Corasick automaton for literal terms
+
+    Each state is a dict of the next chars, and the states are
+    saved in lists, so the automaton can be pickled and sent to workers.
+    '''
+    def __init__(self, ignore_case=True, word_boundary=True):
+        self.ignore_case = ignore_case
+        self.word_boundary = word_boundary
+
+        # the goto function of each state
+        self.goto = [{}]
+        # the failure link of each state
+        self.fail = [0]
+        # the terms ending at each state, a list of (term_length, value)
+        self.terms = [[]]
+        # the output of each state, its terms plus those of its failure states
+        self.outputs = [[]]
+
+        self.n_terms = 0
+        self.is_built = False
+
+    def add(self, term, value=None):
+        '''
+        Add a literal term with a value
+        '''
+        if term == '':
+            return
+        if self.ignore_case:
+            term = fold_case(term)
+
+        state = 0
+        for c in term:
+            nxt = self.goto[state].get(c)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][c] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.terms.append([])
+                self.outputs.append([])
+            state = nxt
+
+        self.terms[state].append((len(term), term if value is None else value))
+        self.n_terms += 1
+        self.is_built = False
+
+    def build(self):
+        '''
+        Build the failure links by BFS
+
+        The outputs are rebuilt from the terms, so building again
+        after more add() calls doesn't repeat the merged outputs.
+        '''
+        self.outputs = [list(terms) for terms in self.terms]
+        queue = []
+        for c, nxt in self.goto[0].items():
+            self.fail[nxt] = 0
+            queue.append(nxt)
+
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for c, nxt in self.goto[state].items():
+                queue.append(nxt)
+
+                # follow the failure links until we find a state with c
+                f = self.fail[state]
+                while f > 0 and c not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(c, 0)
+
+                # the outputs of the failure state are also the outputs
+                self.outputs[nxt] = self.outputs[nxt] + self.outputs[self.fail[nxt]]
+
+        self.is_built = True
+        return self
+
+    def finditer(self, text):
+        '''
+        Find all matches in the text in one pass
+
+        The overlapped matches are all returned,
+        ordered by the end offset.
+        '''
+        if not self.is_built:
+            self.build()
+
+        scan_text = fold_case(text) if self.ignore_case else text
+        goto = self.goto
+        fail = self.fail
+        outputs = self.outputs
+
+        state = 0
+        for i, c in enumerate(scan_text):
+            while state > 0 and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+
+            if outputs[state]:
+                end = i + 1
+                for length, value in outputs[state]:
+                    start = end - length
+                    if self.word_boundary and \
+                       not is_word_boundary(text, start, end):
+                        continue
+                    yield start, end, value
+
+    def findall(self, text):
+        return list(self.finditer(text))
+
+
+class RegexScanner:
+    '''
+    A scanner which combines many regex patterns into one regex
+
+    Each pattern is put into a named group, so that we can know
+    which pattern is matched by the name of the last group.
+    '''
+    def __init__(self, flags=re.IGNORECASE):
+        self.flags = flags
+        self.patterns = []
+        self.values = {}
+        self.regex = None
+
+    def add(self, pattern, value=None):
+        '''
+        Add a regex pattern with a value
+        '''
+        # check the pattern first, so the error is easy to find
+        re.compile(pattern, self.flags)
+
+        group_name = '_p%s' % len(self.patterns)
+        self.patterns.append('(?P<%s>%s)' % (group_name, pattern))
+        self.values[group_name] = pattern if value is None else value
+        self.regex = None
+
+    def build(self):
+        if len(self.patterns) == 0:
+            self.regex = None
+        else:
+            self.regex = re.compile('|'.join(self.patterns), self.flags)
+        return self
+
+    def finditer(self, text):
+        '''
+        Find all matches in the text in one pass
+
+        As it's a single regex, the matches are not overlapped.
+        '''
+        if self.regex is None:
+            self.build()
+        if self.regex is None:
+            return
+
+        for m in self.regex.finditer(text):
+            if m.start() == m.end():
+                # skip empty matches
+                continue
+            yield m.start(), m.end(), self.values[m.lastgroup]
+
+    def findall(self, text):
+        return list(self.finditer(text))
+
+
+def select_longest(matches):
+    '''
+    Select the non-overlapped matches from the given matches
+
+    The leftmost match is selected first,
+    and for the matches at the same start, the longest one wins.
+    '''
+    matches = sorted(matches, key=lambda m: (m[0], -(m[1] - m[0])))
+    selected = []
+    last_end = -1
+    for m in matches:
+        if m[0] >= last_end:
+            selected.append(m)
+            last_end = m[1]
+    return selected
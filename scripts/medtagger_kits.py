@@ -6,16 +6,35 @@ You can use this module to create JSON format output files.
 '''
 
 import os
+import re
 import argparse
+from multiprocessing import Pool
+
+# each part of a line is a key="value" pair
+REGEX_KEY_AND_VALUE = re.compile(r'^\s*([^\s=]+)="(.*)"\s*$')
 
 def parse_ann(full_fn):
     '''
     Parse a given MedTagger ann file
+
+    The file is read line by line, so a large file won't be loaded at once.
+    Each tag is converted to the same format as `medtator_kits.parse_xml`:
+
+        {
+            'tag': 'FEVER',
+            'spans': [[10, 15]],
+            'text': 'fever',
+            'id': 'T0',
+            'certainty': 'Positive',
+            ...
+        }
     '''
     fn = os.path.basename(full_fn)
     ann = {
         # about the file itself
         "_filename": fn,
+        # there is no root for MedTagger output
+        "root": "",
         # for MedTagger output, there is no text
         "text": "",
         # meta information
@@ -24,23 +43,27 @@ def parse_ann(full_fn):
         "tags": []
     }
 
-    # read the content first
-    lines = open(full_fn).readlines()
+    # read the content line by line
+    with open(full_fn, encoding='utf8') as f:
+        for line in f:
+            # first remove the blanks
+            ln = line.strip()
 
-    # then parse each line
-    for line in lines:
-        # first remove the blanks
-        ln = line.strip()
+            # skip empty line
+            if ln == '': 
+                continue
 
-        # skip empty line
-        if ln == '': 
-            continue
-
-        # skip comment line??
-        if ln.startswith('#'):
-            continue
+            # skip comment line??
+            if ln.startswith('#'):
+                continue
 
+            tag = _parse_line(ln)
+            if tag is None:
+                # this line may be incomplete
+                continue
 
+            tag['id'] = 'T%s' % len(ann['tags'])
+            ann['tags'].append(tag)
 
     return ann
 
@@ -49,73 +72,101 @@ def _parse_line(ln):
     '''
     Parse each line in an ANN file
 
-    Each line in an ANN file is a tab-seperated 
-    '''
+    Each line in an ANN file is a tab-seperated list of key="value", e.g.,
 
+        text="fever"	norm="FEVER"	start="10"	end="15"	certainty="Positive"
+
+    The `norm` is used as the tag name,
+    and the `start` and `end` are converted to the spans.
+    If any of them is missing, return None.
+    '''
     # then split into parts by tab
     parts = ln.split('\t')
 
+    # r is record or result
+    r = {}
+    for p in parts:
+        m = REGEX_KEY_AND_VALUE.match(p)
+        if m is None:
+            # must be something wrong??
+            continue
+        r[m.group(1)] = m.group(2)
+
+    if 'norm' not in r or 'start' not in r or 'end' not in r:
+        return None
 
-def parse_anns(path):
+    try:
+        spans = [[int(r['start']), int(r['end'])]]
+    except ValueError:
+        return None
+
+    tag = {
+        "tag": r['norm'],
+        "spans": spans,
+        "text": r.get('text', '')
+    }
+    # copy other attributes, such as certainty, status, and experiencer
+    for k in r:
+        if k in ['norm', 'start', 'end', 'text']:
+            continue
+        tag[k] = r[k]
+
+    return tag
+
+
+def find_ann_files(path):
     '''
-    Parse the given path which contains the MedTagger outputs
+    Get all the ANN files in the given path
     '''
-    print('* checking path %s' % path)
+    if os.path.isfile(path):
+        return [path] if path.lower().endswith('.ann') else []
 
-    anns = []
+    ann_fns = []
+    for root, dirs, files in os.walk(path):
+        for fn in files:
+            if fn.lower().endswith('.ann'):
+                ann_fns.append(os.path.join(root, fn))
+    return sorted(ann_fns)
 
-    # count files
-    cnt_total = 0
-    cnt_other = 0
-    cnt_ann = 0
-    cnt_tags = 0
 
+def count_files(path):
     if os.path.isfile(path):
-        cnt_total += 1
-        if path.lower().endswith('.ann'): 
-            cnt_ann += 1
+        return 1
+    return sum([len(files) for root, dirs, files in os.walk(path)])
 
-            # parse this ann
-            ann = parse_ann(path)
 
-            # update stats
-            cnt_tags += len(ann['tags'])
-
-            # save this
-            anns.append(ann)
-            print('* parsed ANN file %s' % path)
+def parse_anns(path, n_workers=None, chunksize=64):
+    '''
+    Parse the given path which contains the MedTagger outputs
 
-        else:
-            cnt_other += 1
+    The path can be a file, a folder, or a list of them.
+    The files are parsed by a pool of workers,
+    and the anns are returned in the order of the file names.
+    '''
+    paths = path if isinstance(path, (list, tuple)) else [path]
 
+    # count files
+    cnt_total = 0
+    ann_fns = []
+    for p in paths:
+        print('* checking path %s' % p)
+        cnt_total += count_files(p)
+        ann_fns += find_ann_files(p)
+    cnt_ann = len(ann_fns)
+    cnt_other = cnt_total - cnt_ann
+
+    if n_workers == 1 or cnt_ann < 2:
+        anns = [parse_ann(fn) for fn in ann_fns]
     else:
-        for root, dirs, files in os.walk(path):
-            for fn in files:
-                cnt_total += 1
-                # check file
-                if not fn.lower().endswith('.xml'): 
-                    cnt_other += 1
-                    continue
-
-                # ok, this is a XML
-                cnt_ann += 1
-                
-                # ok, this is a XML file
-                full_fn = os.path.join(root, fn)
-
-                # parse this ann
-                ann = parse_ann(full_fn)
-
-                # update the number of tags
-                cnt_tags += len(ann['tags'])
-                
-                # finally, save this ann
-                anns.append(ann)
-                print('* parsed XML file %s' % full_fn)
+        with Pool(n_workers) as pool:
+            anns = pool.map(parse_ann, ann_fns, chunksize=chunksize)
+
+    cnt_tags = sum([len(ann['tags']) for ann in anns])
 
     print('* checked %s files' % cnt_total)
     print('* found %s ANN files' % cnt_ann)
     print('* skipped %s non-ANN files' % cnt_other)
+    print('* parsed %s tags' % cnt_tags)
 
     ret = {
         "anns": anns,
@@ -133,13 +184,15 @@ def parse_anns(path):
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='MedTagger ANN Kits')
-    parser.add_argument('path',
-                        help='the path to the folder that contains MedTagger output files')
+    parser.add_argument('path', nargs='+',
+                        help='the path to the folders that contain MedTagger output files')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='the number of worker processes, default is the number of CPUs')
 
     # update the args
     args = parser.parse_args()
 
     # get the files 
-    ret = parse_anns(args.path)
+    ret = parse_anns(args.path, args.workers)
 
-    print(ret)
\ No newline at end of file
+    print(ret['stat'])
\ No newline at end of file
@@ -102,6 +102,34 @@ def parse_xml(full_fn):
     return ann
 
 
+def find_xml_files(path):
+    '''
+    Get all the XML files in the given path
+    '''
+    if os.path.isfile(path):
+        return [path] if path.lower().endswith('.xml') else []
+
+    xml_fns = []
+    for root, dirs, files in os.walk(path):
+        for fn in files:
+            if fn.lower().endswith('.xml'):
+                xml_fns.append(os.path.join(root, fn))
+    return sorted(xml_fns)
+
+
+def get_output_fn(full_fn, path, fn):
+    '''
+    Get the output file name of `full_fn`, which is found in `path`
+
+    The sub folder of `full_fn` in `path` is kept in the output file name,
+    so the files with the same name in different sub folders
+    don't overwrite each other in the output folder.
+    '''
+    if os.path.isfile(path):
+        return fn
+    return os.path.join(os.path.dirname(os.path.relpath(full_fn, path)), fn)
+
+
 def parse_xmls(path):
     '''
     Parse the given path which contains the MedTator XML files.
@@ -177,9 +205,9 @@ def parse_xmls(path):
     return ret
 
 
-def save_xml(ann, full_path):
+def _build_xml_tree(ann):
     '''
-    Save the given ann as a XML file to specific path
+    Build the XML element tree of the given ann
     '''
     from lxml import etree as ET
 
@@ -209,11 +237,12 @@ def save_xml(ann, full_path):
         attrs = deepcopy(tag)
         # remove the tag attr
         del attrs['tag']
-        # convert spans
-        spans = []
-        for sp in attrs['spans']:
-            spans.append('%s~%s' % (sp[0], sp[1]))
-        attrs['spans'] = ','.join(spans)
+        # convert spans, the relation tags don't have spans
+        if 'spans' in attrs:
+            spans = []
+            for sp in attrs['spans']:
+                spans.append('%s~%s' % (sp[0], sp[1]))
+            attrs['spans'] = ','.join(spans)
 
         # create a new node
         elem = ET.SubElement(
@@ -222,16 +251,54 @@ def save_xml(ann, full_path):
             attrib=attrs
         )
 
-    # save the xml file
     # No indent saving
     tree = ET.ElementTree(root)
     ET.indent(tree, space='', level=0)
-    tree.write(
-        full_path,
-        encoding='utf8',
+    return tree
+
+
+def dump_xml(ann):
+    '''
+    Convert the given ann to the bytes of a XML file
+    '''
+    from lxml import etree as ET
+
+    tree = _build_xml_tree(ann)
+    return ET.tostring(
+        tree,
+        encoding='UTF8',
         xml_declaration=True
     )
 
+
+def save_xml(ann, full_path):
+    '''
+    Save the given ann as a XML file to specific path
+    '''
+    # save the xml file, the sub folder may not exist yet
+    folder = os.path.dirname(full_path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder, exist_ok=True)
+    with open(full_path, 'wb') as f:
+        f.write(dump_xml(ann))
+
+
+def save_xml_bytes(items, output_path):
+    '''
+    Save a batch of XML bytes from `dump_xml` to the output path
+
+    Each item is a tuple of (file name, XML bytes),
+    and the file name may have a sub folder from `get_output_fn`
+    '''
+    for fn, xml in items:
+        full_path = os.path.join(output_path, fn)
+        folder = os.path.dirname(full_path)
+        if not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        with open(full_path, 'wb') as f:
+            f.write(xml)
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Annotation XML Kits')
     parser.add_argument('path',
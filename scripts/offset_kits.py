@@ -0,0 +1,399 @@
+'''
+Text Offset Toolkits
+
+This module is for tracking the changes of a text and remapping
+the spans of annotations after the text is changed.
+
+Many corpus transformations change the length of a text, for example,
+masking (`fever` -> `##AE##`), whitespace normalization,
+de-identification, or fixing encodings.
+After any of them, the spans of the kept tags must be shifted.
+Instead of writing the shifting logic for each transformation,
+we can record the edits in an `EditScript`, get an `OffsetMap` from it,
+and remap all the spans in one pass:
+
+```python
+import offset_kits as ofk
+
+es = ofk.EditScript(ann['text'])
+es.replace(4, 9, '##AE##')
+es.delete(42, 46)
+new_text = es.apply()
+
+omap = es.offset_map()
+kept_tags, dropped_tags = ofk.remap_tags(ann['tags'], omap, new_text)
+```
+
+The offset maps of several steps can be composed into one map,
+so that a chain of transformations only needs one remapping pass.
+The composed map gives the same spans as mapping through each step in turn,
+including the spans whose edges touch the edited text:
+
+```python
+omap = omap_step1.compose(omap_step2).compose(omap_step3)
+```
+
+All positions are character offsets and all spans are half-open,
+which is the same as the `spans` in MedTator XML (`4~9` is `text[4:9]`).
+'''
+
+from bisect import bisect_right
+
+
+class EditScript:
+    '''
+    A list of edits on a source text
+
+    Each edit is recorded in the coordinates of the source text,
+    so the edits can be added in any order.
+    However, the edits should not overlap with each other.
+    '''
+    def __init__(self, text):
+        self.text = text
+        # each edit is [start, end, new_str] on the source text
+        self.edits = []
+
+    def insert(self, pos, s):
+        '''
+        Insert a string `s` before the character at `pos`
+        '''
+        return self.replace(pos, pos, s)
+
+    def delete(self, start, end):
+        '''
+        Delete the characters in `text[start:end]`
+        '''
+        return self.replace(start, end, '')
+
+    def replace(self, start, end, s):
+        '''
+        Replace the characters in `text[start:end]` with `s`
+        '''
+        if start < 0 or end > len(self.text) or start > end:
+            raise ValueError('invalid edit range %s~%s for text length %s' % (
+                start, end, len(self.text)
+            ))
+        self.edits.append([start, end, s])
+        return self
+
+    def _sorted_edits(self):
+        '''
+        Get the sorted edits, and merge the insertions at the same position
+        '''
+        # the insertions are put before the replacement at the same start
+        edits = sorted(
+            enumerate(self.edits),
+            key=lambda v: (v[1][0], v[1][1] > v[1][0], v[0])
+        )
+        merged = []
+        for _, (start, end, s) in edits:
+            if len(merged) > 0:
+                last = merged[-1]
+                if last[0] == last[1] == start:
+                    # the last one is an insertion at this position,
+                    # so just put them together
+                    merged[-1] = [start, end, last[2] + s]
+                    continue
+                if start < last[1]:
+                    raise ValueError('overlapped edits %s~%s and %s~%s' % (
+                        last[0], last[1], start, end
+                    ))
+            merged.append([start, end, s])
+        return merged
+
+    def apply(self):
+        '''
+        Apply all edits and get the new text
+        '''
+        # cut the full text into pieces and join the original and replaced.
+        pieces = []
+        pos = 0
+        for start, end, s in self._sorted_edits():
+            pieces.append(self.text[pos:start])
+            pieces.append(s)
+            pos = end
+        pieces.append(self.text[pos:])
+        return ''.join(pieces)
+
+    def offset_map(self):
+        '''
+        Get the offset map from the source text to the new text
+        '''
+        blocks = []
+        src_pos = 0
+        dst_pos = 0
+        for start, end, s in self._sorted_edits():
+            if start > src_pos:
+                # the text before this edit is copied as is
+                blocks.append((src_pos, dst_pos, start - src_pos))
+            dst_pos += start - src_pos + len(s)
+            src_pos = end
+        if len(self.text) > src_pos:
+            blocks.append((src_pos, dst_pos, len(self.text) - src_pos))
+        dst_pos += len(self.text) - src_pos
+
+        return OffsetMap(blocks, len(self.text), dst_pos)
+
+
+class OffsetMap:
+    '''
+    A mapping of character offsets from a source text to a new text
+
+    The map is saved as the blocks of characters which are copied
+    from the source text to the new text without any change.
+    Each block is a tuple of (src_start, dst_start, length).
+    The characters between blocks are edited (inserted, deleted, or replaced).
+
+    For example, masking `fever` in `The fever broke` with `##AE##` is:
+
+        blocks = [(0, 0, 4), (9, 10, 6)]
+
+    So, the offset 10 (`b` in `broke`) is mapped to 11.
+
+    The edited characters are saved as gaps, each is a tuple of
+    (src_start, src_end, right, left): where an edited character is
+    snapped to on the right and on the left (see `map_char`).
+    For a map from one `EditScript`, they are the nearest blocks.
+    After `compose`, the characters of one gap may be snapped to
+    other places, so the gaps are kept for the composed map.
+    The last gap is from `src_len` to the infinity, for the offsets
+    out of the text.
+    '''
+    def __init__(self, blocks, src_len, dst_len, gaps=None):
+        self.src_len = src_len
+        self.dst_len = dst_len
+
+        # keep the columns in separated lists for the binary search
+        self.src_starts = [b[0] for b in blocks]
+        self.dst_starts = [b[1] for b in blocks]
+        self.lengths = [b[2] for b in blocks]
+
+        if gaps is None:
+            gaps = self._gaps_between_blocks()
+        self.gap_starts = [g[0] for g in gaps]
+        self.gap_ends = [g[1] for g in gaps]
+        self.gap_rights = [g[2] for g in gaps]
+        self.gap_lefts = [g[3] for g in gaps]
+
+    def _gaps_between_blocks(self):
+        '''
+        Get the gaps between the blocks, snapped to the nearest blocks
+        '''
+        gaps = []
+        pos = 0
+        left = 0
+        for src_start, dst_start, length in self.blocks:
+            if src_start > pos:
+                gaps.append((pos, src_start, dst_start, left))
+            pos = src_start + length
+            left = dst_start + length
+        if self.src_len > pos:
+            gaps.append((pos, self.src_len, self.dst_len, left))
+        gaps.append((max(pos, self.src_len), float('inf'), self.dst_len, left))
+        return gaps
+
+    @classmethod
+    def identity(cls, length):
+        '''
+        Create a map which doesn't change anything
+        '''
+        blocks = [(0, 0, length)] if length > 0 else []
+        return cls(blocks, length, length)
+
+    @property
+    def blocks(self):
+        return list(zip(self.src_starts, self.dst_starts, self.lengths))
+
+    @property
+    def gaps(self):
+        return list(zip(self.gap_starts, self.gap_ends, self.gap_rights, self.gap_lefts))
+
+    def map_char(self, pos, snap='right'):
+        '''
+        Map the character at `pos` to the new text
+
+        If this character is edited, it's snapped to the nearest
+        copied character in the given direction.
+        When snap is `right`, the returned offset is where the next copied
+        character starts. When snap is `left`, the returned offset is
+        where the previous copied character ends.
+        '''
+        # find the last block which starts before or at this pos
+        i = bisect_right(self.src_starts, pos) - 1
+
+        if i >= 0 and pos < self.src_starts[i] + self.lengths[i]:
+            # great! this char is just copied
+            return self.dst_starts[i] + pos - self.src_starts[i]
+
+        if pos < 0:
+            return self.map_char(0, 'right') if snap == 'right' else 0
+
+        # this char is edited or out of range, so it's in a gap
+        j = bisect_right(self.gap_starts, pos) - 1
+        if snap == 'right':
+            return self.gap_rights[j]
+        else:
+            return self.gap_lefts[j]
+
+    def map_start(self, pos):
+        '''
+        Map the start offset of a span
+
+        The text inserted at `pos` goes before the span.
+        '''
+        return self.map_char(pos, 'right')
+
+    def map_end(self, pos):
+        '''
+        Map the end offset of a span
+
+        The end offset is exclusive, so we map the last char of the span.
+        The text inserted at `pos` goes after the span.
+        '''
+        if pos <= 0:
+            return 0
+        i = bisect_right(self.src_starts, pos - 1) - 1
+        if i >= 0 and pos - 1 < self.src_starts[i] + self.lengths[i]:
+            # the last char is copied, so the end is right after it
+            return self.dst_starts[i] + pos - self.src_starts[i]
+        return self.map_char(pos - 1, 'left')
+
+    def map_span(self, span):
+        '''
+        Map a span [start, end] to the new text
+
+        If the span is completely removed by the edits, return None.
+        A span with negative offsets (e.g., -1~-1 for document-level tags)
+        is returned as is.
+        '''
+        start, end = span[0], span[1]
+        if start < 0 or end < 0:
+            return [start, end]
+
+        new_start = self.map_start(start)
+        new_end = self.map_end(end)
+
+        if new_start >= new_end and start < end:
+            # oh, all chars of this span are edited
+            return None
+
+        return [new_start, max(new_start, new_end)]
+
+    def map_spans(self, spans):
+        '''
+        Map a list of spans in bulk
+
+        The output has the same length as the input,
+        and the removed spans are None.
+        '''
+        return [self.map_span(sp) for sp in spans]
+
+    def compose(self, other):
+        '''
+        Compose this map with another map which is based on the new text
+
+        The returned map is from the source text of this map
+        to the new text of the other map.
+        Mapping by it is the same as mapping by this map and then
+        by the other map.
+        '''
+        if self.dst_len != other.src_len:
+            raise ValueError('cannot compose maps with length %s and %s' % (
+                self.dst_len, other.src_len
+            ))
+
+        # the copied chars of the composed map must be copied in both maps,
+        # so we just need the intersections of the blocks.
+        # as the blocks are sorted, a linear merge is enough.
+        blocks = []
+        i = 0
+        j = 0
+        while i < len(self.lengths) and j < len(other.lengths):
+            # the block i in the middle text
+            a_start = self.dst_starts[i]
+            a_end = a_start + self.lengths[i]
+            # the block j in the middle text
+            b_start = other.src_starts[j]
+            b_end = b_start + other.lengths[j]
+
+            start = max(a_start, b_start)
+            end = min(a_end, b_end)
+            if start < end:
+                blocks.append((
+                    self.src_starts[i] + start - a_start,
+                    other.dst_starts[j] + start - b_start,
+                    end - start
+                ))
+
+            # move the block which ends first
+            if a_end <= b_end:
+                i += 1
+            else:
+                j += 1
+
+        # the edited chars of this map are snapped in the middle text,
+        # and then the other map maps where they are snapped to.
+        gaps = [
+            (start, end, other.map_start(right), other.map_end(left))
+            for start, end, right, left in self.gaps
+        ]
+        # the chars copied by this map but edited by the other map
+        # are snapped like the other map does
+        j = 0
+        for src_start, dst_start, length in self.blocks:
+            dst_end = dst_start + length
+            while j < len(other.gap_starts) and other.gap_ends[j] <= dst_start:
+                j += 1
+            k = j
+            while k < len(other.gap_starts) and other.gap_starts[k] < dst_end:
+                start = max(dst_start, other.gap_starts[k])
+                end = min(dst_end, other.gap_ends[k])
+                gaps.append((
+                    src_start + start - dst_start,
+                    src_start + end - dst_start,
+                    other.gap_rights[k],
+                    other.gap_lefts[k]
+                ))
+                k += 1
+        gaps.sort()
+
+        return OffsetMap(blocks, self.src_len, other.dst_len, gaps)
+
+
+def get_tag_text(text, spans):
+    '''
+    Get the text of a tag by spans
+
+    The non-continuous spans are joined by `...` like MedTator
+    '''
+    return '...'.join([text[sp[0]:sp[1]] for sp in spans])
+
+
+def remap_tags(tags, omap, new_text=None):
+    '''
+    Remap the spans of the given tags by an offset map
+
+    Each tag is a dict in the format of `medtator_kits.parse_xml`.
+    The tags are updated in place and returned as (kept_tags, dropped_tags).
+    A tag is dropped if all of its spans are removed.
+    If `new_text` is given, the `text` attribute of tag is also updated.
+    '''
+    kept_tags = []
+    dropped_tags = []
+    for tag in tags:
+        if 'spans' not in tag:
+            # this is a relation or document-level tag
+            kept_tags.append(tag)
+            continue
+
+        spans = [sp for sp in omap.map_spans(tag['spans']) if sp is not None]
+        if len(spans) == 0:
+            dropped_tags.append(tag)
+            continue
+
+        tag['spans'] = spans
+        if new_text is not None and spans[0][0] >= 0:
+            tag['text'] = get_tag_text(new_text, spans)
+        kept_tags.append(tag)
+
+    return kept_tags, dropped_tags
@@ -0,0 +1,204 @@
+'''
+Annotation Schema Toolkits
+
+This module is for loading the annotation schema of MedTator.
+The schema can be a DTD, YAML, or JSON file, such as the ones in `sample/`.
+For more information about the schema, you can check MedTator Wiki:
+https://github.com/OHNLP/MedTator/wiki/Annotation-Schema
+
+All formats are converted to the same dict format:
+
+```python
+{
+    "name": "COVID_VAX_AE",
+    "etags": [{
+        "name": "AE",
+        "id_prefix": "A",
+        "description": "",
+        "attrs": [{
+            "name": "certainty",
+            "vtype": "list",
+            "values": ["positive", "negated", "possible"],
+            "default_value": "positive"
+        }]
+    }],
+    "rtags": [...],
+    # tag name -> tag definition
+    "tag_dict": {...}
+}
+```
+
+For the YAML schema, PyYAML is needed.
+'''
+
+import os
+import re
+import json
+import argparse
+
+REGEX_DTD_ENTITY_NAME = re.compile(r'<!ENTITY\s+name\s+"([^"]+)"\s*>')
+REGEX_DTD_ELEMENT = re.compile(r'<!ELEMENT\s+(\S+)\s+(.*?)\s*>')
+REGEX_DTD_ATTLIST = re.compile(r'<!ATTLIST\s+(\S+)\s+(\S+)\s+(.*?)\s*>')
+REGEX_DTD_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+
+
+def parse_dtd(text):
+    '''
+    Parse the text of a DTD file
+    '''
+    text = REGEX_DTD_COMMENT.sub('', text)
+
+    m = REGEX_DTD_ENTITY_NAME.search(text)
+    schema = {
+        "name": m.group(1) if m else '',
+        "etags": [],
+        "rtags": []
+    }
+
+    tag_dict = {}
+    for m in REGEX_DTD_ELEMENT.finditer(text):
+        tag = {
+            "name": m.group(1),
+            "description": "",
+            "attrs": []
+        }
+        # #PCDATA makes an entity concept
+        # No #PCDATA makes a relation concept
+        if '#PCDATA' in m.group(2):
+            schema['etags'].append(tag)
+        else:
+            schema['rtags'].append(tag)
+        tag_dict[tag['name']] = tag
+
+    for m in REGEX_DTD_ATTLIST.finditer(text):
+        tag_name, attr_name, rest = m.group(1), m.group(2), m.group(3)
+        if tag_name not in tag_dict:
+            continue
+        if attr_name in ['spans', 'id']:
+            # these are not the attrs defined by users
+            continue
+
+        attr = {
+            "name": attr_name,
+            "vtype": "text",
+            "values": [],
+            "default_value": ""
+        }
+
+        m_prefix = re.search(r'prefix="([^"]+)"', rest)
+        if 'IDREF' in rest:
+            # for relation, the prefix is the name of this attr
+            attr['vtype'] = 'idref'
+            if m_prefix:
+                attr['name'] = m_prefix.group(1)
+        else:
+            m_values = re.search(r'\(([^)]*)\)', rest)
+            if m_values:
+                attr['vtype'] = 'list'
+                attr['values'] = [v.strip() for v in m_values.group(1).split('|')]
+
+            m_default = re.search(r'"([^"]*)"\s*$', rest)
+            if m_default:
+                attr['default_value'] = m_default.group(1)
+
+        tag_dict[tag_name]['attrs'].append(attr)
+
+    return schema
+
+
+def _normalize(schema):
+    '''
+    Normalize the schema loaded from YAML or JSON
+    '''
+    ret = {
+        "name": schema.get('name', ''),
+        "etags": [],
+        "rtags": []
+    }
+    for el in ['etags', 'rtags']:
+        for tag in schema.get(el) or []:
+            attrs = []
+            for attr in tag.get('attrs') or []:
+                attrs.append({
+                    "name": attr['name'],
+                    "vtype": attr.get('vtype', 'text'),
+                    "values": list(attr.get('values') or []),
+                    "default_value": attr.get('default_value', '')
+                })
+            ret[el].append({
+                "name": tag['name'],
+                "description": tag.get('description', ''),
+                "attrs": attrs
+            })
+    return ret
+
+
+def _update_id_prefix(schema):
+    '''
+    Decide the id_prefix of each tag and update the tag_dict
+
+    It's the same as MedTator, starts with the first letter of the name,
+    and uses one more letter if it's already used by other tags.
+    '''
+    id_prefix_dict = {}
+    schema['tag_dict'] = {}
+    for el in ['etags', 'rtags']:
+        for tag in schema[el]:
+            id_prefix = tag['name'][:1].upper()
+            while id_prefix in id_prefix_dict and \
+                  len(id_prefix) < len(tag['name']):
+                id_prefix = tag['name'][:len(id_prefix) + 1]
+
+            tag['id_prefix'] = id_prefix
+            id_prefix_dict[id_prefix] = tag
+            schema['tag_dict'][tag['name']] = tag
+    return schema
+
+
+def load_schema(full_fn):
+    '''
+    Load the schema from a DTD, YAML, or JSON file
+    '''
+    with open(full_fn, encoding='utf8') as f:
+        text = f.read()
+
+    ext = os.path.splitext(full_fn)[1].lower()
+    if ext == '.dtd':
+        schema = parse_dtd(text)
+    elif ext in ['.yaml', '.yml']:
+        import yaml
+        schema = _normalize(yaml.safe_load(text))
+    else:
+        schema = _normalize(json.loads(text))
+
+    return _update_id_prefix(schema)
+
+
+def get_default_attrs(tag_def):
+    '''
+    Get the default values of the attrs of a tag
+    '''
+    return dict([
+        (attr['name'], attr['default_value'])
+        for attr in tag_def['attrs']
+        if attr['vtype'] != 'idref'
+    ])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Annotation Schema Kits')
+    parser.add_argument('path',
+                        help='the path to the schema file (.dtd, .yaml, or .json)')
+
+    # update the args
+    args = parser.parse_args()
+
+    schema = load_schema(args.path)
+    print('* loaded schema %s' % schema['name'])
+    for el in ['etags', 'rtags']:
+        for tag in schema[el]:
+            print('  - %s [%s]: %s' % (
+                tag['name'],
+                tag['id_prefix'],
+                ', '.join([attr['name'] for attr in tag['attrs']])
+            ))
@@ -0,0 +1,31 @@
+'''
+Tests of matcher_kits
+
+```bash
+python -m pytest scripts/test_matcher_kits.py
+```
+'''
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import matcher_kits as mck
+
+
+def test_add_after_build():
+    ac = mck.AhoCorasick(word_boundary=False)
+    ac.add('he')
+    ac.add('she')
+    ac.build()
+    ac.add('x')
+    assert sorted(ac.findall('she x')) == [(0, 3, 'she'), (1, 3, 'he'), (4, 5, 'x')]
+
+
+def test_build_twice():
+    ac = mck.AhoCorasick(word_boundary=False)
+    ac.add('he')
+    ac.add('she')
+    ac.build()
+    ac.build()
+    assert sorted(ac.findall('she')) == [(0, 3, 'she'), (1, 3, 'he')]
@@ -0,0 +1,67 @@
+'''
+Tests of offset_kits
+
+```bash
+python -m pytest scripts/test_offset_kits.py
+```
+'''
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import offset_kits as ofk
+
+
+def random_edits(rng, text):
+    '''
+    Get an EditScript of a few random edits which don't overlap
+    '''
+    es = ofk.EditScript(text)
+    cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(0, 6))))
+    for start, end in zip(cuts[::2], cuts[1::2]):
+        if rng.random() < 0.3:
+            end = start
+        es.replace(start, end, ''.join(rng.choice('abc ') for _ in range(rng.randint(0, 4))))
+    return es
+
+
+def map_step_by_step(omaps, span):
+    for omap in omaps:
+        span = omap.map_span(span)
+        if span is None:
+            return None
+    return span
+
+
+def test_compose_same_as_step_by_step():
+    rng = random.Random(0)
+    for _ in range(300):
+        text = ''.join(rng.choice('abcde ') for _ in range(rng.randint(0, 30)))
+        omaps = []
+        for _ in range(rng.randint(2, 4)):
+            es = random_edits(rng, text)
+            omaps.append(es.offset_map())
+            text = es.apply()
+        composed = omaps[0]
+        for omap in omaps[1:]:
+            composed = composed.compose(omap)
+
+        src_len = omaps[0].src_len
+        for start in range(src_len + 1):
+            for end in range(start, src_len + 1):
+                assert composed.map_span([start, end]) == map_step_by_step(omaps, [start, end]), \
+                    (start, end)
+
+
+def test_compose_keeps_the_edges():
+    # `X` is inserted after `a` and then `a` is deleted,
+    # so the span `ab` starts where `a` was snapped to in each step: at `X`
+    a = ofk.EditScript('abcde').insert(1, 'X')
+    b = ofk.EditScript(a.apply()).delete(0, 1)
+    assert b.apply() == 'Xbcde'
+    omap = a.offset_map().compose(b.offset_map())
+    assert omap.map_span([0, 2]) == b.offset_map().map_span(a.offset_map().map_span([0, 2])) == [0, 2]
+    assert omap.map_span([0, 1]) is None
+    assert omap.map_span([2, 5]) == [2, 5]